@@ -0,0 +1,122 @@
+"""
+Per-worker cache of verified API keys, keyed by prefix.
+
+A request whose prefix is cached only does a constant-time compare of the secret
+against the one that was verified, so it costs no hashing and no query. Entries
+last API_KEY_CACHE_TTL seconds. Saving or deleting a key, or changing its
+owner or empresa, drops the entries of this worker at once and bumps a version
+stamp in the default cache (as jwt_blacklist.revocation does), so every other
+worker drops its entries on its next request: one cache read per request.
+"""
+import copy
+import hmac
+import threading
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from jwt_blacklist.revocation import bump_version
+from .models import ApiKey, Empresa, User
+
+VERSION_KEY = 'accounts:api_keys:version'
+
+# Fields of the owner and the empresa that _load() checks
+OWNER_FIELDS = {'is_active', 'activo'}
+
+
+class ApiKeyCache:
+
+    def __init__(self):
+        self._entries = {}  # prefix -> (secret, api_key, principal, cached until)
+        self._version = None
+        self._lock = threading.Lock()
+
+    def authenticate(self, prefix, secret):
+        """
+        Return (principal user, api key) for a valid key, or None.
+        The principal is a fresh copy of the key's owner carrying the key's role and empresa.
+        """
+        version = cache.get(VERSION_KEY)
+        if version != self._version:
+            # A key, owner or empresa changed in some worker
+            with self._lock:
+                self._entries.clear()
+                self._version = version
+
+        entry = self._entries.get(prefix)
+        if entry is None or entry[3] < time.monotonic():
+            entry = self._load(prefix, secret)
+            if entry is None:
+                return None
+
+        cached_secret, api_key, principal, _ = entry
+        if not hmac.compare_digest(cached_secret, secret):
+            return None
+        if api_key.expira_en is not None and api_key.expira_en <= timezone.now():
+            self.invalidate(prefix)
+            return None
+        return copy.copy(principal), api_key
+
+    def _load(self, prefix, secret):
+        api_key = ApiKey.objects.select_related(
+            'role', 'empresa', 'creado_por'
+        ).filter(prefix=prefix, activo=True).first()
+        if api_key is None or not hmac.compare_digest(api_key.hashed_secret, ApiKey.hash_secret(secret)):
+            return None
+
+        owner = api_key.creado_por
+        if not owner.is_active or not owner.activo or not api_key.empresa.activo:
+            return None
+
+        principal = copy.copy(owner)
+        principal.role = api_key.role
+        principal.empresa = api_key.empresa
+        principal.api_key = api_key
+
+        entry = (secret, api_key, principal, time.monotonic() + settings.API_KEY_CACHE_TTL)
+        with self._lock:
+            self._entries[prefix] = entry
+        return entry
+
+    def invalidate(self, prefix=None):
+        with self._lock:
+            if prefix is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(prefix, None)
+
+
+api_key_cache = ApiKeyCache()
+
+
+def invalidate_everywhere(prefixes):
+    for prefix in prefixes:
+        api_key_cache.invalidate(prefix)
+    # Other workers reload the key once the change is committed
+    transaction.on_commit(partial(bump_version, VERSION_KEY))
+
+
+def api_key_changed(sender, instance, **kwargs):
+    invalidate_everywhere([instance.prefix])
+
+
+def owner_changed(sender, instance, update_fields=None, **kwargs):
+    """Keys stop working when their owner or empresa is deactivated or deleted"""
+    if update_fields is not None and not OWNER_FIELDS.intersection(update_fields):
+        return
+    owner = 'creado_por' if sender is User else 'empresa'
+    prefixes = list(ApiKey.objects.filter(**{owner: instance}).values_list('prefix', flat=True))
+    if prefixes:
+        invalidate_everywhere(prefixes)
+
+
+def connect_signals():
+    post_save.connect(api_key_changed, sender=ApiKey, dispatch_uid='api_key_cache_save')
+    post_delete.connect(api_key_changed, sender=ApiKey, dispatch_uid='api_key_cache_delete')
+    for model in (User, Empresa):
+        post_save.connect(owner_changed, sender=model, dispatch_uid=f'api_key_cache_{model.__name__}_save')
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from . import api_keys, cache, signals
+        # Token versions are bumped before the user cache entries are dropped
+        signals.connect_signals()
+        cache.connect_signals()
+        api_keys.connect_signals()
@@ -1,6 +1,12 @@
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from django.contrib.auth import get_user_model
+from .api_keys import api_key_cache
+from .cache import get_cached_user
+from .last_seen import last_seen
+from jwt_blacklist.revocation import revoked_tokens
 
 User = get_user_model()
 
@@ -24,19 +30,29 @@ class CookieJWTAuthentication(JWTAuthentication):
 
         try:
             validated_token = self.get_validated_token(raw_token)
+            # In-memory check, no query (see jwt_blacklist.revocation)
+            if revoked_tokens.is_revoked(validated_token.get('jti')):
+                raise InvalidToken('Token has been revoked')
             user = self.get_user(validated_token)
             
             # Check if user is still active
             if not user.activo:
                 return None
-                
+
+            last_seen.touch(user.pk)
             return (user, validated_token)
         except TokenError:
             return None
+        except InvalidToken:
+            # A stale cookie must not lock the browser out of the refresh endpoint
+            if request.COOKIES.get('access_token') is not None:
+                return None
+            raise
 
     def get_user(self, validated_token):
         """
-        Override to use UUID instead of integer user ID
+        Override to use UUID instead of integer user ID, and load the user
+        (with role and empresa) from the user cache
         """
         try:
             user_id = validated_token['user_id']
@@ -44,11 +60,45 @@ class CookieJWTAuthentication(JWTAuthentication):
             raise InvalidToken('Token contained no recognizable user identification')
 
         try:
-            user = User.objects.get(id=user_id)
+            user = get_cached_user(user_id)
         except User.DoesNotExist:
             raise InvalidToken('User not found')
 
         if not user.is_active:
             raise InvalidToken('User is inactive')
 
-        return user
\ No newline at end of file
+        # Role or empresa changed since the token was issued: its permission claims are stale
+        token_version = validated_token.get('tv')
+        if token_version is not None and token_version != user.token_version:
+            raise InvalidToken('Token permissions are outdated')
+
+        return user
+
+class ApiKeyAuthentication(BaseAuthentication):
+    """
+    API key authentication for machine clients: ``Authorization: Api-Key <prefix>.<secret>``.
+    Verified keys are cached per worker (see accounts.api_keys).
+    """
+    keyword = 'Api-Key'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed('Invalid API key header')
+
+        try:
+            prefix, _, secret = auth[1].decode().partition('.')
+        except UnicodeError:
+            raise AuthenticationFailed('Invalid API key header')
+        if not prefix or not secret:
+            raise AuthenticationFailed('Invalid API key')
+
+        result = api_key_cache.authenticate(prefix, secret)
+        if result is None:
+            raise AuthenticationFailed('Invalid or inactive API key')
+        return result
+
+    def authenticate_header(self, request):
+        return self.keyword
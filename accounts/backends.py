@@ -3,19 +3,27 @@ from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
 
 class EmailBackend(ModelBackend):
-    def authenticate(self, request, email=None, password=None, **kwargs):
-        print(f"📢 EmailBackend activado - Email recibido: {email}")
+    """
+    Authenticate by email with exactly one password hash per attempt.
+
+    It is the only configured backend, so a failed attempt doesn't fall through
+    to ModelBackend and hash a second time. The admin login form passes the
+    email as ``username``.
+    """
+
+    def authenticate(self, request, email=None, password=None, username=None, **kwargs):
+        email = email or username
+        if email is None or password is None:
+            return None
+
         UserModel = get_user_model()
         try:
-            user = UserModel.objects.get(email=email)
+            user = UserModel.objects.select_related('role', 'empresa').get(email=email)
         except UserModel.DoesNotExist:
-            print("❌ Usuario no encontrado")
+            # Hash anyway, so unknown emails take as long as wrong passwords
+            UserModel().set_password(password)
             return None
 
         if user.check_password(password) and self.user_can_authenticate(user):
-            print("✅ Usuario autenticado")
             return user
-
-        print("❌ Contraseña inválida o usuario inactivo")
         return None
-
@@ -0,0 +1,92 @@
+"""
+Cache of authenticated users keyed by user id, with role and empresa, so
+authentication and the role/company checks that follow cost no queries while the
+entry is warm.
+
+Only the fields those checks read are cached (CACHED_FIELDS): no password hash,
+no last access time. Users are rebuilt from them with the other fields deferred,
+so reading one of those loads it from the database.
+
+Entries live in the default cache for USER_CACHE_TTL seconds and are dropped
+whenever the user, their role or their empresa is saved or deleted. Code that
+changes cached fields with queryset.update() calls invalidate_users() itself.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+from .models import Empresa, Role, User
+
+
+def get_cache_key(user_id):
+    return f'accounts:user:{user_id}'
+
+
+# Attribute names cached per model
+CACHED_FIELDS = {
+    User: (
+        'id', 'username', 'email', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser',
+        'activo', 'empresa_id', 'role_id', 'token_version',
+    ),
+    Role: ('id', 'nombre'),
+    Empresa: ('id', 'nombre', 'activo'),
+}
+
+
+def _dump(instance):
+    if instance is None:
+        return None
+    return {name: getattr(instance, name) for name in CACHED_FIELDS[type(instance)]}
+
+
+def _load(model, values):
+    """Instance of ``model`` from cached values, with the other fields deferred"""
+    if values is None:
+        return None
+    fields = [field for field in model._meta.concrete_fields if field.attname in values]
+    return model.from_db(
+        'default', [field.attname for field in fields], [values[field.attname] for field in fields]
+    )
+
+
+def get_cached_user(user_id):
+    """
+    Return the user with role and empresa loaded. Raises User.DoesNotExist.
+    """
+    key = get_cache_key(user_id)
+    data = cache.get(key)
+    if data is None:
+        user = User.objects.select_related('role', 'empresa').get(pk=user_id)
+        cache.set(
+            key,
+            {'user': _dump(user), 'role': _dump(user.role), 'empresa': _dump(user.empresa)},
+            settings.USER_CACHE_TTL
+        )
+        return user
+
+    user = _load(User, data['user'])
+    user.role = _load(Role, data['role'])
+    user.empresa = _load(Empresa, data['empresa'])
+    return user
+
+
+def invalidate_users(user_ids):
+    cache.delete_many([get_cache_key(user_id) for user_id in user_ids])
+
+
+def user_changed(sender, instance, **kwargs):
+    invalidate_users([instance.pk])
+
+
+def role_changed(sender, instance, **kwargs):
+    invalidate_users(User.objects.filter(role=instance).values_list('pk', flat=True))
+
+
+def empresa_changed(sender, instance, **kwargs):
+    invalidate_users(User.objects.filter(empresa=instance).values_list('pk', flat=True))
+
+
+def connect_signals():
+    for model, receiver in ((User, user_changed), (Role, role_changed), (Empresa, empresa_changed)):
+        post_save.connect(receiver, sender=model, dispatch_uid=f'user_cache_{model.__name__}_save')
+        post_delete.connect(receiver, sender=model, dispatch_uid=f'user_cache_{model.__name__}_delete')
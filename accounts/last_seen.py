@@ -0,0 +1,100 @@
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # A user's ultimo_acceso is written at most once per GRANULARITY seconds (per worker)
+    'GRANULARITY': 300,
+    # Pending times are written every FLUSH_INTERVAL seconds as one UPDATE
+    'FLUSH_INTERVAL': 60.0,
+    'BATCH_SIZE': 500,
+}
+
+
+def get_tracker_setting(name):
+    return getattr(settings, 'LAST_SEEN_TRACKER', {}).get(name, DEFAULTS[name])
+
+
+class LastSeenTracker:
+    """
+    Coalesces ultimo_acceso writes.
+
+    ``touch()`` only records the time in memory, and ignores users already
+    recorded within GRANULARITY seconds. A background thread writes the pending
+    times every FLUSH_INTERVAL seconds as a single bulk UPDATE ... CASE, so busy
+    API users cost one row update per interval instead of one per request.
+    Whatever is pending is flushed at process exit.
+    """
+
+    def __init__(self):
+        self.pending = {}  # user id -> last seen datetime
+        self.recorded = {}  # user id -> monotonic time the pending value was taken
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+        atexit.register(self.flush)
+
+    def touch(self, user_id, when=None):
+        now = time.monotonic()
+        with self.lock:
+            last = self.recorded.get(user_id)
+            if last is not None and now - last < get_tracker_setting('GRANULARITY'):
+                return False
+            self.recorded[user_id] = now
+            self.pending[user_id] = when or timezone.now()
+        self.ensure_thread()
+        return True
+
+    def flush(self):
+        now = time.monotonic()
+        granularity = get_tracker_setting('GRANULARITY')
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.recorded = {user_id: at for user_id, at in self.recorded.items() if now - at < granularity}
+        if not pending:
+            return
+
+        items = list(pending.items())
+        batch_size = get_tracker_setting('BATCH_SIZE')
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            try:
+                User.objects.filter(pk__in=[user_id for user_id, _ in batch]).update(
+                    ultimo_acceso=Case(
+                        *[When(pk=user_id, then=Value(seen)) for user_id, seen in batch],
+                        output_field=DateTimeField(),
+                    )
+                )
+            except Exception:
+                logger.exception("Failed to write last access of %d users", len(batch))
+
+    def ensure_thread(self):
+        # Threads do not survive a fork, so forked workers start their own flusher
+        if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self.run, name='last-seen-tracker', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(get_tracker_setting('FLUSH_INTERVAL'))
+            close_old_connections()
+            self.flush()
+
+
+last_seen = LastSeenTracker()
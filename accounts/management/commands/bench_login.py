@@ -0,0 +1,65 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from accounts.models import User
+from accounts.views import AuthView
+from panel.audit import audit_writer
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure login throughput through AuthView for a valid login, a wrong password "
+        "and an unknown email. The three should take about the same time: one password hash each"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', help='Existing account to log in as (default: a temporary user)')
+        parser.add_argument('--password', help='Password of --email')
+        parser.add_argument('--requests', type=int, default=20, help='Logins per scenario')
+
+    def handle(self, *args, **options):
+        temporary_user = None
+        email, password = options['email'], options['password']
+        if not email:
+            password = uuid.uuid4().hex
+            email = f'bench-login-{uuid.uuid4().hex[:8]}@example.invalid'
+            temporary_user = User.objects.create_user(username=email, email=email, password=password)
+
+        view = AuthView.as_view()
+        factory = APIRequestFactory()
+        scenarios = [
+            ('valid login', email, password, 200),
+            ('wrong password', email, password + 'x', 401),
+            ('unknown email', f'nobody-{uuid.uuid4().hex[:8]}@example.invalid', password, 401),
+        ]
+        try:
+            for name, login_email, login_password, expected_status in scenarios:
+                data = {'action': 'login', 'email': login_email, 'password': login_password}
+                # Warm-up, also checks the scenario behaves as expected
+                response = view(factory.post('/api/v1/auth/auth/', data, format='json'))
+                if response.status_code != expected_status:
+                    self.stderr.write(f"{name}: expected {expected_status}, got {response.status_code}")
+                    continue
+
+                with CaptureQueriesContext(connection) as queries:
+                    view(factory.post('/api/v1/auth/auth/', data, format='json'))
+
+                started = time.perf_counter()
+                for _ in range(options['requests']):
+                    view(factory.post('/api/v1/auth/auth/', data, format='json'))
+                elapsed = time.perf_counter() - started
+
+                self.stdout.write(
+                    f"{name:15} {options['requests'] / elapsed:8.1f} logins/s  "
+                    f"{elapsed * 1000 / options['requests']:7.1f} ms/login  "
+                    f"{len(queries)} queries on the request path"
+                )
+        finally:
+            audit_writer.flush()
+            if temporary_user is not None:
+                temporary_user.delete()
@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+import hashlib
+import secrets
 import uuid
 
 class Empresa(models.Model):
@@ -58,6 +60,9 @@ class User(AbstractUser):
     email = models.EmailField(unique=True)
     activo = models.BooleanField(default=True)
     ultimo_acceso = models.DateTimeField(null=True, blank=True)
+    # Embedded in tokens as the 'tv' claim and bumped whenever a field the permission
+    # claims depend on changes, so tokens carrying stale claims are rejected
+    token_version = models.PositiveIntegerField(default=0, editable=False)
     
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
@@ -67,9 +72,35 @@ class User(AbstractUser):
         verbose_name_plural = "Usuarios"
         ordering = ['email']
 
+    # Attributes the permission claims are computed from
+    CLAIM_ATTRIBUTES = ('role_id', 'empresa_id', 'activo', 'is_active')
+
     def __str__(self):
         return f"{self.email} ({self.empresa.nombre if self.empresa else 'Sin empresa'})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_claim_values = instance._get_claim_values()
+        return instance
+
+    def _get_claim_values(self):
+        # Read from __dict__ so deferred fields are not loaded
+        return {name: self.__dict__[name] for name in self.CLAIM_ATTRIBUTES if name in self.__dict__}
+
+    def save(self, *args, **kwargs):
+        if getattr(self, 'api_key', None) is not None:
+            # API key principals carry the key's role and empresa (see ApiKeyAuthentication)
+            raise ValueError("Cannot save a user authenticated through an API key")
+        loaded = getattr(self, '_loaded_claim_values', None)
+        if loaded is not None and any(self.__dict__.get(name) != value for name, value in loaded.items()):
+            self.token_version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'token_version'}
+        super().save(*args, **kwargs)
+        self._loaded_claim_values = self._get_claim_values()
+
     @property
     def is_super_admin(self):
         return self.role and self.role.nombre == 'super_admin'
@@ -90,4 +121,43 @@ class User(AbstractUser):
         """Check if user has access to a specific company"""
         if self.is_super_admin:
             return True
-        return str(self.empresa.id) == str(empresa_id) if self.empresa else False
\ No newline at end of file
+        return self.empresa_id is not None and str(self.empresa_id) == str(empresa_id)
+
+class ApiKey(models.Model):
+    """
+    API key for machine clients, scoped to an empresa and a role.
+
+    The key is shown once, as ``<prefix>.<secret>``; only the prefix and a
+    SHA-256 of the secret are stored. Requests act as ``creado_por`` with the
+    key's role and empresa.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    nombre = models.CharField(max_length=100)
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name='api_keys')
+    role = models.ForeignKey(Role, on_delete=models.PROTECT, related_name='api_keys')
+    creado_por = models.ForeignKey(User, on_delete=models.CASCADE, related_name='api_keys')
+    prefix = models.CharField(max_length=16, unique=True, editable=False)
+    hashed_secret = models.CharField(max_length=64, editable=False)
+    activo = models.BooleanField(default=True)
+    expira_en = models.DateTimeField(null=True, blank=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "API Key"
+        verbose_name_plural = "API Keys"
+        ordering = ['-creado_en']
+
+    def __str__(self):
+        return f"{self.nombre} ({self.prefix})"
+
+    @staticmethod
+    def hash_secret(secret):
+        return hashlib.sha256(secret.encode()).hexdigest()
+
+    @classmethod
+    def generate(cls, **kwargs):
+        """Create a key and return (api_key, full key string); the string cannot be recovered later"""
+        prefix = secrets.token_hex(4)
+        secret = secrets.token_urlsafe(32)
+        api_key = cls.objects.create(prefix=prefix, hashed_secret=cls.hash_secret(secret), **kwargs)
+        return api_key, f"{prefix}.{secret}"
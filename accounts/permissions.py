@@ -1,37 +1,82 @@
 from rest_framework import permissions
 
+# Permission bits embedded in tokens as the 'perm' claim
+SUPER_ADMIN = 1 << 0
+COMPANY_ADMIN = 1 << 1
+EDIT_CONFIG = 1 << 2
+READ_ONLY = 1 << 3
+
+ROLE_PERMISSIONS = {
+    'super_admin': SUPER_ADMIN | EDIT_CONFIG,
+    'company_admin': COMPANY_ADMIN | EDIT_CONFIG,
+    'config_user': EDIT_CONFIG,
+    'read_only': READ_ONLY,
+}
+
+def get_permission_bits(user):
+    """Permission bitmask of a user, from their role"""
+    if user.role_id is None:
+        return 0
+    return ROLE_PERMISSIONS.get(user.role.nombre, 0)
+
+def add_permission_claims(token, user):
+    """
+    Embed the permission bitmask ('perm'), the empresa id ('emp') and the
+    user's token version ('tv') in a token. Access tokens derived from a
+    refresh token afterwards inherit them.
+    """
+    token['perm'] = get_permission_bits(user)
+    token['emp'] = str(user.empresa_id) if user.empresa_id else None
+    token['tv'] = user.token_version
+    return token
+
+def get_request_claims(request):
+    """
+    (permission bits, empresa id) of the request, read from the token claims.
+    Requests authenticated without claims (older tokens, sessions, tests) fall
+    back to the user's role and empresa.
+    """
+    auth = request.auth
+    if auth is not None and hasattr(auth, 'get') and auth.get('perm') is not None:
+        return auth['perm'], auth.get('emp')
+    user = request.user
+    if not user or not user.is_authenticated:
+        return 0, None
+    return get_permission_bits(user), str(user.empresa_id) if user.empresa_id else None
+
+def request_has_any(request, bits):
+    return bool(get_request_claims(request)[0] & bits)
+
+def request_has_company_access(request, empresa_id):
+    """Whether the request may access objects of ``empresa_id``"""
+    perm, empresa = get_request_claims(request)
+    if perm & SUPER_ADMIN:
+        return True
+    return empresa is not None and empresa_id is not None and empresa == str(empresa_id)
+
+def is_authenticated(request):
+    return bool(request.user and request.user.is_authenticated)
+
 class IsSuperAdmin(permissions.BasePermission):
     """
     Permission class for super admin users only
     """
     def has_permission(self, request, view):
-        return (
-            request.user and 
-            request.user.is_authenticated and 
-            request.user.is_super_admin
-        )
+        return is_authenticated(request) and request_has_any(request, SUPER_ADMIN)
 
 class IsCompanyAdminOrSuperAdmin(permissions.BasePermission):
     """
     Permission class for company admins and super admins
     """
     def has_permission(self, request, view):
-        return (
-            request.user and 
-            request.user.is_authenticated and 
-            (request.user.is_super_admin or request.user.is_company_admin)
-        )
+        return is_authenticated(request) and request_has_any(request, SUPER_ADMIN | COMPANY_ADMIN)
 
 class CanEditConfig(permissions.BasePermission):
     """
     Permission class for users who can edit configuration
     """
     def has_permission(self, request, view):
-        return (
-            request.user and 
-            request.user.is_authenticated and 
-            request.user.can_edit_config
-        )
+        return is_authenticated(request) and request_has_any(request, EDIT_CONFIG)
 
 class IsReadOnlyOrHigher(permissions.BasePermission):
     """
@@ -39,9 +84,8 @@ class IsReadOnlyOrHigher(permissions.BasePermission):
     """
     def has_permission(self, request, view):
         return (
-            request.user and 
-            request.user.is_authenticated and 
-            not request.user.is_read_only or 
+            is_authenticated(request) and
+            not request_has_any(request, READ_ONLY) or
             request.method in permissions.SAFE_METHODS
         )
 
@@ -50,17 +94,23 @@ class HasCompanyAccess(permissions.BasePermission):
     Permission class to check company access
     """
     def has_object_permission(self, request, view, obj):
-        user = request.user
-        
-        if user.is_super_admin:
+        if request_has_any(request, SUPER_ADMIN):
             return True
-        
+
         # Get the company from the object
-        if hasattr(obj, 'empresa'):
-            empresa_id = obj.empresa.id
+        if hasattr(obj, 'empresa_id'):
+            empresa_id = obj.empresa_id
         elif hasattr(obj, 'id') and hasattr(obj, 'usuarios'):  # This is a company object
             empresa_id = obj.id
         else:
             return False
-        
-        return user.has_company_access(empresa_id)
\ No newline at end of file
+
+        return request_has_company_access(request, empresa_id)
+
+class IsNotApiKey(permissions.BasePermission):
+    """
+    Denies requests authenticated with an API key, for endpoints that manage
+    accounts or credentials
+    """
+    def has_permission(self, request, view):
+        return getattr(request.user, 'api_key', None) is None
@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
-from .models import Empresa, Role
+from .models import Empresa, Role, ApiKey
 
 User = get_user_model()
 
@@ -119,3 +119,43 @@ class UserProfileSerializer(serializers.ModelSerializer):
         else:
             return "user"
 
+class ApiKeySerializer(serializers.ModelSerializer):
+    role_nombre = serializers.CharField(source='role.nombre', read_only=True)
+    empresa = serializers.PrimaryKeyRelatedField(queryset=Empresa.objects.all(), required=False)
+
+    class Meta:
+        model = ApiKey
+        fields = [
+            'id', 'nombre', 'prefix', 'empresa', 'role', 'role_nombre',
+            'creado_por', 'activo', 'expira_en', 'creado_en'
+        ]
+        read_only_fields = ['id', 'prefix', 'creado_por', 'creado_en']
+
+    def validate_role(self, value):
+        user = self.context['request'].user
+        if value.nombre == 'super_admin' and not user.is_super_admin:
+            raise serializers.ValidationError("No puedes crear claves con rol de super admin")
+        return value
+
+    def validate(self, attrs):
+        user = self.context['request'].user
+        if self.instance is None and not attrs.get('empresa'):
+            if not user.empresa_id:
+                raise serializers.ValidationError({'empresa': "Este campo es requerido"})
+            attrs['empresa'] = user.empresa
+        empresa = attrs.get('empresa')
+        if empresa and not user.has_company_access(empresa.id):
+            raise serializers.ValidationError({'empresa': "No tienes acceso a esta empresa"})
+        return attrs
+
+    def create(self, validated_data):
+        api_key, key = ApiKey.generate(**validated_data)
+        # Only time the full key is available
+        api_key.key = key
+        return api_key
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if hasattr(instance, 'key'):
+            data['key'] = instance.key
+        return data
@@ -0,0 +1,19 @@
+from django.db.models import F
+from django.db.models.signals import post_save
+
+from .cache import invalidate_users
+from .models import Role, User
+
+
+def bump_role_token_versions(sender, instance, created, **kwargs):
+    """Tokens of the role's users carry claims computed from the old role"""
+    if not created:
+        users = User.objects.filter(role=instance)
+        user_ids = list(users.values_list('pk', flat=True))
+        users.update(token_version=F('token_version') + 1)
+        # update() sends no signals: drop the cached users, which hold the old token_version
+        invalidate_users(user_ids)
+
+
+def connect_signals():
+    post_save.connect(bump_role_token_versions, sender=Role, dispatch_uid='bump_role_token_versions')
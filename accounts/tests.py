@@ -1,3 +1,198 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
-# Create your tests here.
+from jwt_blacklist.models import BlacklistedToken
+from .api_keys import ApiKeyCache
+from .last_seen import last_seen
+from .models import ApiKey, Empresa, Role, User
+from .permissions import COMPANY_ADMIN, EDIT_CONFIG, add_permission_claims
+
+AUTH_URL = '/api/v1/auth/auth/'
+PROFILE_URL = '/api/v1/auth/profile/'
+
+
+@override_settings(AUDIT_LOG_WRITER={'MODE': 'sync'})
+class AccountsTestCase(TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Acme')
+        cls.role = Role.objects.create(nombre='company_admin')
+        cls.read_only = Role.objects.create(nombre='read_only')
+        cls.user = User.objects.create_user(
+            username='admin', email='admin@acme.com', password='secret', empresa=cls.empresa, role=cls.role
+        )
+
+    def setUp(self):
+        # Cached users outlive the rolled back rows of earlier tests
+        cache.clear()
+
+    def tearDown(self):
+        # Write the pending last access times while the test database exists
+        last_seen.flush()
+
+    def issue_tokens(self, user=None):
+        refresh = add_permission_claims(RefreshToken.for_user(user or self.user), user or self.user)
+        return refresh, refresh.access_token
+
+
+class ApiKeyAuthenticationTests(AccountsTestCase):
+    """accounts.authentication.ApiKeyAuthentication"""
+
+    def setUp(self):
+        super().setUp()
+        self.api_key, self.key = ApiKey.generate(
+            nombre='ci', empresa=self.empresa, role=self.read_only, creado_por=self.user
+        )
+
+    def test_valid_key_acts_as_its_owner(self):
+        response = self.client.get(PROFILE_URL, HTTP_AUTHORIZATION=f'Api-Key {self.key}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['email'], 'admin@acme.com')
+
+    def test_key_role_replaces_the_owner_role(self):
+        # The owner is a company admin; a read only key cannot edit configuration
+        response = self.client.post(
+            '/api/v1/panel/dominios/bulk_tag/', {'domain_ids': [], 'tag_ids': []},
+            format='json', HTTP_AUTHORIZATION=f'Api-Key {self.key}'
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_wrong_secret_is_rejected(self):
+        prefix = self.key.partition('.')[0]
+        response = self.client.get(PROFILE_URL, HTTP_AUTHORIZATION=f'Api-Key {prefix}.wrong')
+        self.assertEqual(response.status_code, 401)
+
+    def test_deactivated_key_is_rejected(self):
+        self.assertEqual(self.client.get(PROFILE_URL, HTTP_AUTHORIZATION=f'Api-Key {self.key}').status_code, 200)
+        self.api_key.activo = False
+        self.api_key.save()
+
+        self.assertEqual(self.client.get(PROFILE_URL, HTTP_AUTHORIZATION=f'Api-Key {self.key}').status_code, 401)
+
+    def test_key_cannot_manage_keys(self):
+        response = self.client.get('/api/v1/auth/api-keys/', HTTP_AUTHORIZATION=f'Api-Key {self.key}')
+        self.assertEqual(response.status_code, 403)
+
+    def test_key_cannot_manage_users(self):
+        header = {'HTTP_AUTHORIZATION': f'Api-Key {self.key}'}
+        other = User.objects.create_user(
+            username='other', email='other@acme.com', password='secret', empresa=self.empresa, role=self.read_only
+        )
+        self.api_key.role = self.role
+        self.api_key.save()
+
+        self.assertEqual(self.client.get('/api/v1/auth/users/', **header).status_code, 200)
+        new_user = {'username': 'new', 'email': 'new@acme.com', 'password': 'Secret-123', 'password_confirm': 'Secret-123'}
+        self.assertEqual(self.client.post('/api/v1/auth/register/', new_user, **header).status_code, 403)
+        self.assertEqual(self.client.post('/api/v1/auth/users/', new_user, **header).status_code, 403)
+        url = f'/api/v1/auth/users/{other.pk}/'
+        self.assertEqual(self.client.patch(url, {'role': str(self.role.pk)}, **header).status_code, 403)
+        self.assertEqual(self.client.delete(url, **header).status_code, 403)
+        other.refresh_from_db()
+        self.assertEqual(other.role, self.read_only)
+
+    def test_changes_reach_other_workers(self):
+        prefix, _, secret = self.key.partition('.')
+        worker = ApiKeyCache()
+        self.assertIsNotNone(worker.authenticate(prefix, secret))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.empresa.activo = False
+            self.empresa.save()
+        self.assertIsNone(worker.authenticate(prefix, secret))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.empresa.activo = True
+            self.empresa.save()
+        self.assertIsNotNone(worker.authenticate(prefix, secret))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.activo = False
+            self.user.save(update_fields=['activo'])
+        self.assertIsNone(worker.authenticate(prefix, secret))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.activo = True
+            self.user.save()
+            self.api_key.delete()
+        self.assertIsNone(worker.authenticate(prefix, secret))
+
+    def test_unrelated_user_saves_keep_cached_keys(self):
+        prefix, _, secret = self.key.partition('.')
+        worker = ApiKeyCache()
+        worker.authenticate(prefix, secret)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.user.save(update_fields=['last_login'])
+        self.assertEqual(callbacks, [])
+
+    def test_logout_with_a_key(self):
+        response = self.client.post(AUTH_URL, {'action': 'logout'}, HTTP_AUTHORIZATION=f'Api-Key {self.key}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class JWTAuthenticationTests(AccountsTestCase):
+    """Token claims, logout and refresh with accounts.authentication.CookieJWTAuthentication"""
+
+    def get_profile(self, access):
+        return self.client.get(PROFILE_URL, HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def test_tokens_carry_permission_claims(self):
+        _, access = self.issue_tokens()
+
+        self.assertEqual(access['perm'], COMPANY_ADMIN | EDIT_CONFIG)
+        self.assertEqual(access['emp'], str(self.empresa.pk))
+        self.assertEqual(access['tv'], self.user.token_version)
+        self.assertEqual(self.get_profile(access).status_code, 200)
+
+    def test_role_change_rejects_issued_tokens(self):
+        _, access = self.issue_tokens()
+        self.assertEqual(self.get_profile(access).status_code, 200)
+
+        user = User.objects.get(pk=self.user.pk)
+        user.role = self.read_only
+        user.save()
+
+        self.assertEqual(self.get_profile(access).status_code, 401)
+        _, access = self.issue_tokens(user)
+        self.assertEqual(self.get_profile(access).status_code, 200)
+
+    def test_role_update_rejects_tokens_of_its_users(self):
+        _, access = self.issue_tokens()
+        self.assertEqual(self.get_profile(access).status_code, 200)
+
+        self.role.descripcion = 'Administra su empresa'
+        self.role.save()
+
+        self.assertEqual(self.get_profile(access).status_code, 401)
+
+    def test_logout_revokes_both_tokens(self):
+        refresh, access = self.issue_tokens()
+        self.client.cookies['refresh_token'] = str(refresh)
+
+        response = self.client.post(AUTH_URL, {'action': 'logout'}, HTTP_AUTHORIZATION=f'Bearer {access}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_profile(access).status_code, 401)
+        self.client.cookies['refresh_token'] = str(refresh)
+        self.assertEqual(self.client.post(AUTH_URL, {'action': 'refresh'}).status_code, 401)
+
+    def test_refresh_rotates_and_rejects_reuse(self):
+        refresh, _ = self.issue_tokens()
+        self.client.cookies['refresh_token'] = str(refresh)
+
+        response = self.client.post(AUTH_URL, {'action': 'refresh'})
+
+        self.assertEqual(response.status_code, 200)
+        access = AccessToken(response.cookies['access_token'].value)
+        self.assertEqual(access['tv'], self.user.token_version)
+        self.assertNotEqual(response.cookies['refresh_token'].value, str(refresh))
+        self.client.cookies['refresh_token'] = str(refresh)
+        self.assertEqual(self.client.post(AUTH_URL, {'action': 'refresh'}).status_code, 401)
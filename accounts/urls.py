@@ -2,13 +2,14 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     AuthView, RegisterView, ProfileView, 
-    EmpresaViewSet, RoleViewSet, UserViewSet
+    EmpresaViewSet, RoleViewSet, UserViewSet, ApiKeyViewSet
 )
 
 router = DefaultRouter()
 router.register(r'empresas', EmpresaViewSet, basename='empresa')
 router.register(r'roles', RoleViewSet, basename='role')
 router.register(r'users', UserViewSet, basename='user')
+router.register(r'api-keys', ApiKeyViewSet, basename='api-key')
 
 urlpatterns = [
     path('auth/', AuthView.as_view(), name='auth'),
@@ -1,19 +1,24 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, viewsets, permissions
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.tokens import RefreshToken, Token
 from rest_framework_simplejwt.exceptions import TokenError
 from django.contrib.auth import authenticate
 from django.contrib.auth import get_user_model
 from django.conf import settings
-from datetime import datetime
 from .serializers import (
     UserRegistrationSerializer, UserSerializer, UserProfileSerializer,
-    EmpresaSerializer, RoleSerializer
+    EmpresaSerializer, RoleSerializer, ApiKeySerializer
 )
-from .models import Empresa, Role
-from panel.utils import log_audit_event, get_client_ip
-from .permissions import IsSuperAdmin, IsCompanyAdminOrSuperAdmin
+from .models import Empresa, Role, ApiKey
+from panel.models import AuditLog
+from panel.utils import (
+    log_audit_event, get_client_ip, save_with_changes, get_model_snapshot, run_in_background
+)
+from .permissions import IsSuperAdmin, IsCompanyAdminOrSuperAdmin, IsNotApiKey, add_permission_claims
+from .cache import get_cached_user
+from .last_seen import last_seen
+from jwt_blacklist.revocation import record_outstanding, revoke_token, revoked_tokens
 
 User = get_user_model()
 
@@ -52,14 +57,16 @@ class AuthView(APIView):
                 status=status.HTTP_401_UNAUTHORIZED
             )
 
-        # Update last access
-        user.ultimo_acceso = datetime.now()
-        user.save(update_fields=['ultimo_acceso'])
-
         # Generate tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = add_permission_claims(RefreshToken.for_user(user), user)
         access_token = refresh.access_token
 
+        # Side-effect writes don't hold up the response: last access goes to the
+        # last-seen tracker, the outstanding token row to a background thread and
+        # the audit entry to the audit writer
+        last_seen.touch(user.pk)
+        run_in_background(record_outstanding, refresh, user)
+
         # Create response
         response = Response({
             'message': 'Login exitoso',
@@ -96,16 +103,21 @@ class AuthView(APIView):
         return response
 
     def logout(self, request):
+        user = request.user if request.user.is_authenticated else None
         try:
             refresh_token = request.COOKIES.get('refresh_token')
             if refresh_token:
-                token = RefreshToken(refresh_token)
-                token.blacklist()
+                revoke_token(RefreshToken(refresh_token), user)
         except TokenError:
             pass
 
+        # Revoke the access token too, so it stops working before it expires
+        # (API key requests have no token to revoke)
+        if user is not None and isinstance(request.auth, Token):
+            revoke_token(request.auth, user)
+
         # Log audit event if user is authenticated
-        if hasattr(request, 'user') and request.user.is_authenticated:
+        if user is not None:
             log_audit_event(
                 user=request.user,
                 action='logout',
@@ -133,12 +145,42 @@ class AuthView(APIView):
                 )
 
             refresh = RefreshToken(refresh_token)
+            if revoked_tokens.is_revoked(refresh['jti']):
+                raise TokenError('Token is blacklisted')
+
+            try:
+                user = get_cached_user(refresh['user_id'])
+            except (KeyError, User.DoesNotExist):
+                raise TokenError('User not found')
+            if not user.is_active or not user.activo:
+                raise TokenError('User is inactive')
+
+            rotate = settings.SIMPLE_JWT.get('ROTATE_REFRESH_TOKENS', False)
+            if rotate and settings.SIMPLE_JWT.get('BLACKLIST_AFTER_ROTATION', False):
+                revoke_token(refresh, user)
+
+            # Recompute the permission claims, so role or empresa changes take effect
+            add_permission_claims(refresh, user)
             access_token = refresh.access_token
 
             response = Response({
                 'message': 'Token renovado exitosamente'
             }, status=status.HTTP_200_OK)
 
+            if rotate:
+                refresh.set_jti()
+                refresh.set_exp()
+                refresh.set_iat()
+                record_outstanding(refresh, user)
+                response.set_cookie(
+                    'refresh_token',
+                    str(refresh),
+                    max_age=settings.SIMPLE_JWT['REFRESH_TOKEN_LIFETIME'].total_seconds(),
+                    httponly=True,
+                    secure=settings.SIMPLE_JWT.get('AUTH_COOKIE_SECURE', False),
+                    samesite=settings.SIMPLE_JWT.get('AUTH_COOKIE_SAMESITE', 'Lax')
+                )
+
             # Set new access token cookie
             response.set_cookie(
                 'access_token',
@@ -158,7 +200,7 @@ class AuthView(APIView):
             )
 
 class RegisterView(APIView):
-    permission_classes = [IsCompanyAdminOrSuperAdmin]
+    permission_classes = [IsCompanyAdminOrSuperAdmin, IsNotApiKey]
 
     def post(self, request):
         serializer = UserRegistrationSerializer(data=request.data)
@@ -197,26 +239,29 @@ class ProfileView(APIView):
         return Response(serializer.data)
 
     def put(self, request):
+        if getattr(request.user, 'api_key', None) is not None:
+            return Response(
+                {'error': 'Las claves API no pueden modificar el perfil'},
+                status=status.HTTP_403_FORBIDDEN
+            )
         serializer = UserProfileSerializer(
             request.user, 
             data=request.data, 
             partial=True
         )
         if serializer.is_valid():
-            old_data = UserProfileSerializer(request.user).data
-            user = serializer.save()
-            new_data = UserProfileSerializer(user).data
+            user, changes = save_with_changes(serializer)
             
             log_audit_event(
                 user=request.user,
                 action='update',
                 content_object=user,
-                changes={'old': old_data, 'new': new_data},
+                changes=changes,
                 ip_address=get_client_ip(request),
                 user_agent=request.META.get('HTTP_USER_AGENT', '')
             )
             
-            return Response(new_data)
+            return Response(serializer.data)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -252,9 +297,9 @@ class UserViewSet(viewsets.ModelViewSet):
 
     def get_permissions(self):
         if self.action in ['create']:
-            permission_classes = [IsCompanyAdminOrSuperAdmin]
+            permission_classes = [IsCompanyAdminOrSuperAdmin, IsNotApiKey]
         elif self.action in ['update', 'partial_update', 'destroy']:
-            permission_classes = [IsCompanyAdminOrSuperAdmin]
+            permission_classes = [IsCompanyAdminOrSuperAdmin, IsNotApiKey]
         else:
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
@@ -286,24 +331,69 @@ class UserViewSet(viewsets.ModelViewSet):
         )
 
     def perform_update(self, serializer):
-        old_instance = self.get_object()
-        
         # Validate company access for non-super admins
         if not self.request.user.is_super_admin:
-            if not self.request.user.has_company_access(old_instance.empresa.id):
+            if not self.request.user.has_company_access(serializer.instance.empresa_id):
                 raise permissions.PermissionDenied(
                     'No tienes permisos para editar este usuario'
                 )
 
-        old_values = UserSerializer(old_instance).data
-        user = serializer.save()
-        new_values = UserSerializer(user).data
+        user, changes = save_with_changes(serializer)
         
         log_audit_event(
             user=self.request.user,
             action='update',
             content_object=user,
-            changes={'old': old_values, 'new': new_values},
+            changes=changes,
+            ip_address=get_client_ip(self.request),
+            user_agent=self.request.META.get('HTTP_USER_AGENT', '')
+        )
+
+class ApiKeyViewSet(viewsets.ModelViewSet):
+    """
+    API keys of the user's empresa. The full key is only returned by create.
+    """
+    queryset = ApiKey.objects.select_related('empresa', 'role', 'creado_por')
+    serializer_class = ApiKeySerializer
+    permission_classes = [IsCompanyAdminOrSuperAdmin, IsNotApiKey]
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.is_super_admin:
+            return self.queryset
+        elif user.empresa_id:
+            return self.queryset.filter(empresa_id=user.empresa_id)
+        return ApiKey.objects.none()
+
+    def perform_create(self, serializer):
+        api_key = serializer.save(creado_por=self.request.user)
+        log_audit_event(
+            user=self.request.user,
+            action='create',
+            content_object=api_key,
+            changes=AuditLog.diff_values({}, get_model_snapshot(api_key)),
+            ip_address=get_client_ip(self.request),
+            user_agent=self.request.META.get('HTTP_USER_AGENT', '')
+        )
+
+    def perform_update(self, serializer):
+        api_key, changes = save_with_changes(serializer)
+        log_audit_event(
+            user=self.request.user,
+            action='update',
+            content_object=api_key,
+            changes=changes,
+            ip_address=get_client_ip(self.request),
+            user_agent=self.request.META.get('HTTP_USER_AGENT', '')
+        )
+
+    def perform_destroy(self, instance):
+        log_audit_event(
+            user=self.request.user,
+            action='delete',
+            content_object=instance,
+            changes=AuditLog.diff_values(get_model_snapshot(instance), {}),
             ip_address=get_client_ip(self.request),
             user_agent=self.request.META.get('HTTP_USER_AGENT', '')
-        )
\ No newline at end of file
+        )
+        instance.delete()
@@ -95,6 +95,9 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD', default='postgres'),
         'HOST': config('DB_HOST', default='localhost'),
         'PORT': config('DB_PORT', default='5432'),
+        # Persistent connections, so the query thread pool reuses its connections
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -144,6 +147,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'accounts.authentication.CookieJWTAuthentication',
+        'accounts.authentication.ApiKeyAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -156,21 +160,88 @@ REST_FRAMEWORK = {
         'rest_framework.filters.OrderingFilter',
     ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'core.throttling.FixedWindowRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
-        'anon': '100/hour',
-        'user': '1000/hour'
+        'anon': config('THROTTLE_RATE_ANON', default='100/hour'),
+        'user': config('THROTTLE_RATE_USER', default='1000/hour'),
+        'empresa': config('THROTTLE_RATE_EMPRESA', default='10000/hour'),
+        # Per empresa, for the actions listed in each view's throttle_scopes
+        'check_dns': config('THROTTLE_RATE_CHECK_DNS', default='30/minute'),
+        'bulk': config('THROTTLE_RATE_BULK', default='20/minute'),
     },
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'core.renderers.ORJSONRenderer',
     ],
 }
 
+# Cache shared by all workers: throttle counters, cached users and revocation versions.
+# Without REDIS_CACHE_URL each process has its own in-memory cache.
+REDIS_CACHE_URL = config('REDIS_CACHE_URL', default='')
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Thread pool used to run independent queries in parallel (e.g. the dashboard)
+PARALLEL_QUERY_WORKERS = config('PARALLEL_QUERY_WORKERS', default=4, cast=int)
+# Threads for side effects deferred off the request (see panel.utils.run_in_background)
+BACKGROUND_TASK_WORKERS = config('BACKGROUND_TASK_WORKERS', default=2, cast=int)
+
+# Audit log writer (see panel/audit.py)
+AUDIT_LOG_WRITER = {
+    'MODE': config('AUDIT_LOG_MODE', default='buffered'),
+    'BATCH_SIZE': config('AUDIT_LOG_BATCH_SIZE', default=100, cast=int),
+    'FLUSH_INTERVAL': config('AUDIT_LOG_FLUSH_INTERVAL', default=1.0, cast=float),
+}
+
+# Audit log archival (see panel/archive.py and the archive_audit_logs command)
+AUDIT_LOG_RETENTION_MONTHS = config('AUDIT_LOG_RETENTION_MONTHS', default=12, cast=int)
+AUDIT_LOG_ARCHIVE_DIR = config('AUDIT_LOG_ARCHIVE_DIR', default=str(BASE_DIR / 'archive' / 'auditlog'))
+
+# Point-in-time domain lookups (see panel/history.py and the checkpoint_domains command)
+DOMAIN_CHECKPOINT_INTERVAL_HOURS = config('DOMAIN_CHECKPOINT_INTERVAL_HOURS', default=24, cast=int)
+
+# Bulk DNS record writes (see panel/bulk.py): rows per INSERT/UPDATE and records per request
+DNS_BULK_BATCH_SIZE = config('DNS_BULK_BATCH_SIZE', default=1000, cast=int)
+DNS_BULK_MAX_RECORDS = config('DNS_BULK_MAX_RECORDS', default=10000, cast=int)
+# Records accepted from one zone file import (see panel/zonefile.py)
+DNS_ZONE_MAX_RECORDS = config('DNS_ZONE_MAX_RECORDS', default=100000, cast=int)
+# Rows accepted from one domain import file (see panel/domain_import.py)
+DOMAIN_IMPORT_MAX_ROWS = config('DOMAIN_IMPORT_MAX_ROWS', default=50000, cast=int)
+
+# Bulk domain updates (see panel/jobs.py): larger requests run as background jobs, in
+# chunks committed one at a time, through `manage.py run_bulk_jobs --loop` (run it as a
+# service); a running job idle for BULK_JOB_STALE_SECONDS is resumed. BULK_JOBS_IN_PROCESS
+# runs them on a thread of the web process instead, which dies with the worker: on by
+# default only with DEBUG.
+BULK_UPDATE_SYNC_LIMIT = config('BULK_UPDATE_SYNC_LIMIT', default=500, cast=int)
+BULK_JOB_CHUNK_SIZE = config('BULK_JOB_CHUNK_SIZE', default=500, cast=int)
+BULK_JOBS_IN_PROCESS = config('BULK_JOBS_IN_PROCESS', default=DEBUG, cast=bool)
+BULK_JOB_STALE_SECONDS = config('BULK_JOB_STALE_SECONDS', default=300, cast=int)
+
+# Admin changelists on large tables (see panel/admin.py)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = config('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=100000, cast=int)
+ADMIN_FILTER_CHOICES_TTL = config('ADMIN_FILTER_CHOICES_TTL', default=600, cast=int)
+
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
+# Seconds an authenticated user (with role and empresa) stays in the cache (see accounts/cache.py)
+USER_CACHE_TTL = config('USER_CACHE_TTL', default=60, cast=int)
+
+# Seconds a verified API key stays in each worker's memory (see accounts/api_keys.py)
+API_KEY_CACHE_TTL = config('API_KEY_CACHE_TTL', default=300, cast=int)
+
 # Swagger Settings
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
@@ -197,9 +268,20 @@ SIMPLE_JWT = {
     'AUTH_COOKIE_HTTP_ONLY': True,
     'AUTH_COOKIE_PATH': '/',
     'AUTH_COOKIE_SAMESITE': 'Lax',
-    'UPDATE_LAST_LOGIN': True,
+    # Access times are tracked in ultimo_acceso by accounts.last_seen instead
+    'UPDATE_LAST_LOGIN': False,
+}
+
+# Coalesced ultimo_acceso writes (see accounts/last_seen.py)
+LAST_SEEN_TRACKER = {
+    'GRANULARITY': config('LAST_SEEN_GRANULARITY', default=300, cast=int),
+    'FLUSH_INTERVAL': config('LAST_SEEN_FLUSH_INTERVAL', default=60.0, cast=float),
 }
 
+# Seconds after which a worker re-reads the token blacklist in the background even if the
+# cache version stamp did not change (see jwt_blacklist/revocation.py)
+JWT_REVOCATION_SYNC_INTERVAL = config('JWT_REVOCATION_SYNC_INTERVAL', default=30, cast=int)
+
 # Celery Configuration
 CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default='redis://localhost:6379/0')
@@ -229,9 +311,9 @@ if not DEBUG:
     SESSION_COOKIE_SECURE = False  # Set to True in production
 
 # Custom authentication backend
+# EmailBackend extends ModelBackend; a second backend would hash failed passwords twice
 AUTHENTICATION_BACKENDS = [
     'accounts.backends.EmailBackend',
-    'django.contrib.auth.backends.ModelBackend',
 ]
 
 # CORS Settings for cookies
@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from django.test import SimpleTestCase, TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from accounts.models import Empresa, Role, User
+from .throttling import FixedWindowRateThrottle, get_redis_client
+
+NOW = 7230.0  # 30 seconds into a minute window and into an hour window
+
+
+class FixedWindowRateThrottleTests(TestCase):
+    """core.throttling.FixedWindowRateThrottle on the local memory cache"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Acme')
+        cls.user = User.objects.create_user(
+            username='admin', email='admin@acme.com', password='secret', empresa=cls.empresa,
+            role=Role.objects.create(nombre='company_admin'),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.view = SimpleNamespace(action='check_dns', throttle_scopes={'check_dns': 'check_dns'})
+
+    def make_request(self):
+        request = Request(APIRequestFactory().get('/'))
+        request.user = self.user
+        request.auth = None
+        return request
+
+    def throttle(self, rates):
+        throttle = FixedWindowRateThrottle()
+        with mock.patch.object(FixedWindowRateThrottle, 'THROTTLE_RATES', rates), \
+                mock.patch.object(FixedWindowRateThrottle, 'timer', return_value=NOW):
+            allowed = throttle.allow_request(self.make_request(), self.view)
+        return throttle, allowed
+
+    def test_requests_count_against_user_empresa_and_action(self):
+        rates = {'user': '5/minute', 'empresa': '5/minute', 'check_dns': '5/hour'}
+        for _ in range(2):
+            self.assertTrue(self.throttle(rates)[1])
+
+        self.assertEqual(cache.get(f'throttle:user:{self.user.pk}:120'), 2)
+        self.assertEqual(cache.get(f'throttle:empresa:{self.empresa.pk}:120'), 2)
+        self.assertEqual(cache.get(f'throttle:check_dns:{self.empresa.pk}:2'), 2)
+
+    def test_scopes_without_a_rate_are_not_counted(self):
+        self.assertTrue(self.throttle({'user': '5/minute'})[1])
+
+        self.assertEqual(cache.get(f'throttle:user:{self.user.pk}:120'), 1)
+        self.assertIsNone(cache.get(f'throttle:empresa:{self.empresa.pk}:120'))
+
+    def test_wait_runs_to_the_end_of_the_latest_exceeded_window(self):
+        rates = {'user': '1/minute', 'empresa': '10/minute', 'check_dns': '1/hour'}
+        self.assertTrue(self.throttle(rates)[1])
+
+        throttle, allowed = self.throttle(rates)
+        self.assertFalse(allowed)
+        # The hour window of check_dns ends after the minute window of user
+        self.assertEqual(throttle.wait(), 3600 - 30)
+
+
+class RedisClientTests(SimpleTestCase):
+    def test_other_backends_use_the_generic_path(self):
+        self.assertIsNone(get_redis_client(cache, 'key'))
+
+    def test_falls_back_when_the_client_is_not_found(self):
+        redis_cache = RedisCache('redis://localhost:6379/0', {})
+        redis_cache.__dict__['_cache'] = object()
+
+        with self.assertLogs('core.throttling', 'WARNING'):
+            self.assertIsNone(get_redis_client(redis_cache, 'key'))
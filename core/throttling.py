@@ -0,0 +1,130 @@
+"""
+Fixed-window rate limiting on the shared cache.
+
+DRF's SimpleRateThrottle keeps a list of request timestamps per client and rewrites it
+on every request (get, trim, set), which is racy across workers and allocates a list per
+request. Here each limit gets one integer counter per window, keyed by the window
+number, and a request is an atomic increment of the counters of every limit that
+applies to it (user, empresa, action) in a single cache round-trip: one pipeline of
+INCR + EXPIRE per counter on Redis. Other backends take one incr() per counter, plus
+an add() for the first request of a window. Counts are only shared between workers
+when the default cache is shared (see CACHES in settings).
+
+A fixed window allows up to twice the rate across a window boundary; in exchange it
+needs no per-request history.
+"""
+import logging
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.throttling import SimpleRateThrottle
+
+from accounts.permissions import get_request_claims
+
+logger = logging.getLogger(__name__)
+
+
+def get_redis_client(cache, key):
+    """
+    Write client of Django's RedisCache for ``key``, or None for other backends.
+    The client is not public API: when it moves, counters fall back to the
+    generic incr()/add() path instead of failing requests.
+    """
+    if not isinstance(cache, RedisCache):
+        return None
+    try:
+        return cache._cache.get_client(key, write=True)
+    except AttributeError:
+        logger.warning("RedisCache has no client to pipeline throttle counters on, using incr()")
+        return None
+
+
+class FixedWindowRateThrottle(SimpleRateThrottle):
+    """
+    Checks every limit that applies to a request at once, with rates from
+    DEFAULT_THROTTLE_RATES:
+
+    - ``anon``: unauthenticated requests, per IP address
+    - ``user``: authenticated requests, per user (per key for API key clients)
+    - ``empresa``: the combined requests of all users and API keys of an empresa
+    - tighter limits for expensive actions, per empresa (per user without one).
+      Views map their actions to a rate scope in ``throttle_scopes``, e.g.
+      ``{'check_dns': 'check_dns'}``; actions without a scope have no extra limit.
+
+    Scopes without a rate are not limited.
+    """
+    cache_alias = 'default'
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def __init__(self):
+        # Rates are resolved per scope in allow_request
+        pass
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def get_scopes(self, request, view):
+        """(scope, ident) pairs of the limits that apply to the request"""
+        if not request.user or not request.user.is_authenticated:
+            return [('anon', self.get_ident(request))]
+
+        api_key = getattr(request.user, 'api_key', None)
+        scopes = [('user', f'key:{api_key.pk}' if api_key is not None else request.user.pk)]
+        empresa = get_request_claims(request)[1]
+        if empresa is not None:
+            scopes.append(('empresa', empresa))
+        action_scope = getattr(view, 'throttle_scopes', {}).get(getattr(view, 'action', None))
+        if action_scope is not None:
+            scopes.append((action_scope, empresa or request.user.pk))
+        return scopes
+
+    def allow_request(self, request, view):
+        self.now = self.timer()
+        counters = []  # (key, num_requests, duration, window end)
+        for scope, ident in self.get_scopes(request, view):
+            rate = self.THROTTLE_RATES.get(scope)
+            if rate is None:
+                continue
+            num_requests, duration = self.parse_rate(rate)
+            window = int(self.now // duration)
+            key = self.cache_format % {'scope': scope, 'ident': ident}
+            counters.append((f'{key}:{window}', num_requests, duration, (window + 1) * duration))
+        if not counters:
+            return True
+
+        counts = self.increment_many([(key, duration) for key, _, duration, _ in counters])
+        exceeded = [end for (_, num_requests, _, end), count in zip(counters, counts) if count > num_requests]
+        self.window_end = max(exceeded, default=None)
+        return not exceeded
+
+    def increment_many(self, counters):
+        """Atomically increment the (key, timeout) window counters and return the new counts"""
+        cache = self.cache
+        keys = [(cache.make_and_validate_key(key), timeout) for key, timeout in counters]
+        client = get_redis_client(cache, keys[0][0])
+        if client is not None:
+            pipe = client.pipeline(transaction=False)
+            for key, timeout in keys:
+                pipe.incr(key)
+                pipe.expire(key, timeout)
+            return pipe.execute()[::2]
+
+        return [self.increment(key, timeout) for key, timeout in counters]
+
+    def increment(self, key, timeout):
+        cache = self.cache
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # First request of the window
+            if cache.add(key, 1, timeout):
+                return 1
+            return cache.incr(key)
+
+    def wait(self):
+        return max(self.window_end - self.now, 0)
+
+    def timer(self):
+        return time.time()
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from jwt_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired outstanding tokens and their blacklist entries in small batches, "
+        "so no delete holds locks for long. With --loop keeps running and purges every --interval seconds"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tokens deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds to sleep between batches')
+        parser.add_argument('--loop', action='store_true', help='Run continuously')
+        parser.add_argument('--interval', type=int, default=3600, help='Seconds between purges with --loop')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        while True:
+            self.purge(options['batch_size'], options['pause'])
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def purge(self, batch_size, pause):
+        cutoff = timezone.now()
+        # Served by the expires_at index; each batch is bounded by primary keys
+        expired = OutstandingToken.objects.filter(expires_at__lt=cutoff).order_by('expires_at')
+
+        deleted = 0
+        started = time.monotonic()
+        while True:
+            ids = list(expired.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                BlacklistedToken.objects.filter(token_id__in=ids).delete()
+                OutstandingToken.objects.filter(pk__in=ids).delete()
+            deleted += len(ids)
+            if len(ids) < batch_size:
+                break
+            time.sleep(pause)
+
+        elapsed = time.monotonic() - started
+        rate = deleted / elapsed if elapsed > 0 else 0
+        self.stdout.write(f"{timezone.now():%Y-%m-%d %H:%M:%S} purged {deleted} expired tokens "
+                          f"in {elapsed:.2f}s ({rate:.0f} rows/s)")
+        return deleted
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-19 03:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jwt_blacklist', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outstandingtoken',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
@@ -11,7 +11,7 @@ class OutstandingToken(models.Model):
     jti = models.CharField(unique=True, max_length=255)
     token = models.TextField()
     created_at = models.DateTimeField(null=True, blank=True)
-    expires_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
 
     class Meta:
         ordering = ("user",)
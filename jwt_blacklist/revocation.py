@@ -0,0 +1,127 @@
+"""
+Token revocation backed by the OutstandingToken/BlacklistedToken tables.
+
+Every worker keeps the jtis of revoked, not yet expired tokens in memory
+(``revoked_tokens``). Revoking bumps a version stamp in the default cache. When
+a worker sees a new stamp it re-reads the rows blacklisted since its last sync on
+a background thread, so checking a token costs a cache read and a set lookup and
+no database query; only the first check in a worker loads the set inline.
+Revocations made in the same worker apply at once; other workers pick them up
+as soon as their sync finishes.
+
+JWT_REVOCATION_SYNC_INTERVAL also schedules a background sync, as a backstop for
+caches that are not shared between workers (locmem) or that lost the stamp.
+
+The live set only holds tokens revoked within their lifetime, which is small,
+so a plain set is used instead of a probabilistic filter: no false positives.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .models import BlacklistedToken, OutstandingToken
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'jwt_blacklist:version'
+
+# Rows are read back from slightly before the last sync, so a blacklist entry
+# committed late with an earlier timestamp is not missed
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+def record_outstanding(token, user=None):
+    """Get or create the OutstandingToken row of a token"""
+    outstanding, _ = OutstandingToken.objects.get_or_create(
+        jti=token['jti'],
+        defaults={
+            'user': user,
+            'token': str(token),
+            'created_at': datetime_from_epoch(token['iat']) if 'iat' in token else timezone.now(),
+            'expires_at': datetime_from_epoch(token['exp']),
+        }
+    )
+    return outstanding
+
+
+def revoke_token(token, user=None):
+    """Blacklist a token and tell every worker about it"""
+    outstanding = record_outstanding(token, user)
+    BlacklistedToken.objects.get_or_create(token=outstanding)
+    revoked_tokens.add(token['jti'], token['exp'])
+    transaction.on_commit(bump_version)
+
+
+def bump_version(key=VERSION_KEY):
+    """Change the version stamp at ``key`` in the shared cache, which workers poll"""
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+
+
+class RevokedTokens:
+    """Per-worker set of revoked jtis, synced incrementally from the database"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._expires = {}  # jti -> exp (epoch seconds)
+        self._version = None
+        self._synced_at = None
+        self._next_sync = 0.0
+        self._syncing = False
+
+    def add(self, jti, exp):
+        with self._lock:
+            self._expires[jti] = exp
+
+    def is_revoked(self, jti):
+        version = cache.get(VERSION_KEY)
+        if self._synced_at is None:
+            self.sync(version)
+        elif version != self._version or time.monotonic() >= self._next_sync:
+            self.sync_in_background(version)
+        return jti in self._expires
+
+    def sync_in_background(self, version=None):
+        with self._lock:
+            if self._syncing:
+                return
+            self._syncing = True
+        threading.Thread(target=self._background_sync, args=(version,), name='jwt-revocation-sync', daemon=True).start()
+
+    def _background_sync(self, version):
+        try:
+            self.sync(version)
+        except Exception:
+            logger.exception("Token blacklist sync failed")
+        finally:
+            self._syncing = False
+            connection.close()
+
+    def sync(self, version=None):
+        with self._lock:
+            started_at = timezone.now()
+            blacklisted = BlacklistedToken.objects.filter(token__expires_at__gt=started_at)
+            if self._synced_at is not None:
+                blacklisted = blacklisted.filter(blacklisted_at__gte=self._synced_at - SYNC_OVERLAP)
+            for jti, expires_at in blacklisted.values_list('token__jti', 'token__expires_at'):
+                self._expires[jti] = expires_at.timestamp()
+
+            now = time.time()
+            self._expires = {jti: exp for jti, exp in self._expires.items() if exp > now}
+            self._version = version
+            self._synced_at = started_at
+            self._next_sync = time.monotonic() + settings.JWT_REVOCATION_SYNC_INTERVAL
+
+
+revoked_tokens = RevokedTokens()
@@ -1,3 +1,54 @@
+from datetime import timedelta
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from .models import BlacklistedToken, OutstandingToken
+from .revocation import VERSION_KEY, RevokedTokens, revoke_token, revoked_tokens
+
+
+class RevocationTests(TestCase):
+    """jwt_blacklist.revocation: the per-worker set of revoked jtis"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='admin', email='admin@acme.com', password='secret')
+
+    def blacklist(self, jti, expires_at):
+        outstanding = OutstandingToken.objects.create(user=self.user, jti=jti, token='', expires_at=expires_at)
+        return BlacklistedToken.objects.create(token=outstanding)
+
+    def test_revoke_applies_at_once_and_bumps_the_version_on_commit(self):
+        token = RefreshToken.for_user(self.user)
+        version = cache.get(VERSION_KEY)
+        # A new version would have the worker's set resynced in the background by later tests
+        self.addCleanup(cache.set, VERSION_KEY, version, None)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            revoke_token(token, self.user)
+            self.assertTrue(revoked_tokens.is_revoked(token['jti']))
+
+        self.assertTrue(BlacklistedToken.objects.filter(token__jti=token['jti']).exists())
+        self.assertNotEqual(cache.get(VERSION_KEY), version)
+
+    def test_sync_loads_live_blacklisted_tokens(self):
+        self.blacklist('live', timezone.now() + timedelta(hours=1))
+        self.blacklist('expired', timezone.now() - timedelta(hours=1))
+
+        tokens = RevokedTokens()
+        self.assertTrue(tokens.is_revoked('live'))
+        self.assertFalse(tokens.is_revoked('expired'))
+        self.assertFalse(tokens.is_revoked('other'))
+
+    def test_sync_picks_up_tokens_blacklisted_since_the_last_one(self):
+        tokens = RevokedTokens()
+        tokens.sync()
+        self.assertFalse(tokens.is_revoked('late'))
+
+        self.blacklist('late', timezone.now() + timedelta(hours=1))
+        tokens.sync()
 
-# Create your tests here.
+        self.assertTrue(tokens.is_revoked('late'))
@@ -0,0 +1,223 @@
+"""
+Monthly partitions of the audit log table and their archival to gzip'd JSONL.
+
+On PostgreSQL ``panel_auditlog`` is partitioned by month on ``timestamp`` (see
+migration 0004), so archiving a month streams one partition to disk and drops it.
+On other databases the same months are archived and deleted in batches.
+"""
+import gzip
+import os
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+import orjson
+from django.conf import settings
+from django.db import connection, transaction
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import AuditLog
+
+TABLE = AuditLog._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+ARCHIVE_COLUMNS = {
+    'id': 'id',
+    'timestamp': 'timestamp',
+    'action': 'action',
+    'user': 'user_id',
+    'user_email': 'user__email',
+    'empresa': 'empresa_id',
+    'content_type': 'content_type__model',
+    'object_id': 'object_id',
+    'object_repr': 'object_repr',
+    'changes': 'changes',
+    'ip_address': 'ip_address',
+    'user_agent': 'user_agent',
+}
+
+
+def month_start(year, month):
+    return datetime(year, month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(date, months):
+    index = date.year * 12 + date.month - 1 + months
+    return month_start(index // 12, index % 12 + 1)
+
+
+def partition_name(start):
+    return f'{TABLE}_y{start.year:04d}m{start.month:02d}'
+
+
+def get_archive_dir():
+    return Path(getattr(settings, 'AUDIT_LOG_ARCHIVE_DIR', settings.BASE_DIR / 'archive' / 'auditlog'))
+
+
+def archive_path(start):
+    return get_archive_dir() / f'auditlog-{start.year:04d}-{start.month:02d}.jsonl.gz'
+
+
+def is_partitioned(using_connection=connection):
+    if using_connection.vendor != 'postgresql':
+        return False
+    with using_connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def create_partition(cursor, start):
+    """
+    Create the partition of the month starting at ``start``, unless it exists.
+
+    If the partition job lapsed, rows of that month already sit in the default
+    partition, and PostgreSQL refuses to create a partition whose range overlaps
+    them: the default partition is detached, the rows are moved to the new
+    partition and it is attached again. Run inside a transaction.
+    """
+    name = partition_name(start)
+    end = add_months(start, 1)
+    cursor.execute("SELECT to_regclass(%s), to_regclass(%s)", [name, DEFAULT_PARTITION])
+    partition, default = cursor.fetchone()
+    if partition is not None:
+        return
+
+    in_range = '"timestamp" >= %s AND "timestamp" < %s'
+    stranded = False
+    if default is not None:
+        cursor.execute(f'SELECT EXISTS (SELECT 1 FROM "{DEFAULT_PARTITION}" WHERE {in_range})', [start, end])
+        stranded = cursor.fetchone()[0]
+
+    if stranded:
+        cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{DEFAULT_PARTITION}"')
+    cursor.execute(
+        f'CREATE TABLE "{name}" PARTITION OF "{TABLE}" FOR VALUES FROM (%s) TO (%s)',
+        [start, end]
+    )
+    if stranded:
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{DEFAULT_PARTITION}" WHERE {in_range}', [start, end])
+        cursor.execute(f'DELETE FROM "{DEFAULT_PARTITION}" WHERE {in_range}', [start, end])
+        cursor.execute(f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{DEFAULT_PARTITION}" DEFAULT')
+
+
+def ensure_partitions(months_ahead=3, now=None):
+    """
+    Create the partitions for the current month and the next ``months_ahead`` months
+    """
+    if not is_partitioned():
+        return []
+    current = now or datetime.now(dt_timezone.utc)
+    start = month_start(current.year, current.month)
+    months = [add_months(start, offset) for offset in range(months_ahead + 1)]
+    with transaction.atomic(), connection.cursor() as cursor:
+        for month in months:
+            create_partition(cursor, month)
+    return [partition_name(month) for month in months]
+
+
+def get_archivable_months(retention_months, now=None):
+    """
+    Months that hold entries older than the retention horizon, oldest first
+    """
+    current = now or datetime.now(dt_timezone.utc)
+    horizon = add_months(month_start(current.year, current.month), -retention_months)
+    months = AuditLog.objects.filter(timestamp__lt=horizon).datetimes('timestamp', 'month', tzinfo=dt_timezone.utc)
+    return list(months)
+
+
+def archive_month(start, chunk_size=5000, delete_batch_size=5000):
+    """
+    Stream one month of audit entries to gzip'd JSONL, then drop them from the database.
+
+    Rows are read through a server-side cursor (``iterator()`` on PostgreSQL), so
+    memory stays flat. The file is written under a temporary name and renamed once
+    complete; months that already have an archive file are appended to a new file
+    rather than overwritten. Returns (path, rows archived).
+    """
+    end = add_months(start, 1)
+    queryset = AuditLog.objects.filter(timestamp__gte=start, timestamp__lt=end).order_by('timestamp')
+
+    path = archive_path(start)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        suffix = datetime.now(dt_timezone.utc).strftime('%Y%m%d%H%M%S')
+        path = path.with_name(path.name.replace('.jsonl.gz', f'-{suffix}.jsonl.gz'))
+    tmp_path = path.with_name(path.name + '.tmp')
+
+    default = JSONEncoder().default
+    count = 0
+    with transaction.atomic(), gzip.open(tmp_path, 'wb') as archive:
+        rows = queryset.values(*ARCHIVE_COLUMNS.values()).iterator(chunk_size=chunk_size)
+        for row in rows:
+            entry = {column: row[lookup] for column, lookup in ARCHIVE_COLUMNS.items()}
+            archive.write(orjson.dumps(entry, default=default, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_UTC_Z))
+            count += 1
+
+    if count == 0:
+        tmp_path.unlink()
+        return None, 0
+    os.replace(tmp_path, path)
+
+    drop_month(start, delete_batch_size)
+    return path, count
+
+
+def drop_month(start, delete_batch_size=5000):
+    name = partition_name(start)
+    if is_partitioned():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", [name])
+            if cursor.fetchone()[0] is not None:
+                cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+                cursor.execute(f'DROP TABLE "{name}"')
+                return
+
+    # Not partitioned (or the rows sit in the default partition): delete in batches
+    end = add_months(start, 1)
+    queryset = AuditLog.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    while True:
+        ids = list(queryset.values_list('pk', flat=True)[:delete_batch_size])
+        if not ids:
+            return
+        AuditLog.objects.filter(pk__in=ids).delete()
+
+
+def list_archived_months():
+    """
+    Archived months as 'YYYY-MM' strings, newest first
+    """
+    months = {path.name[len('auditlog-'):len('auditlog-YYYY-MM')] for path in get_archive_dir().glob('auditlog-*.jsonl.gz')}
+    return sorted(months, reverse=True)
+
+
+def iter_archived_entries(month, empresa=None, user=None, action=None, content_type=None, object_id=None, search=None):
+    """
+    Read the archived entries of ``month`` ('YYYY-MM') straight from the gzip'd
+    JSONL files, yielding the ones that match every filter given. ``search`` is
+    a case-insensitive substring match on object_repr, user_email and changes.
+    """
+    search = search.lower() if search else None
+    for path in sorted(get_archive_dir().glob(f'auditlog-{month}*.jsonl.gz')):
+        with gzip.open(path, 'rb') as archive:
+            for line in archive:
+                entry = orjson.loads(line)
+                if empresa and entry['empresa'] != str(empresa):
+                    continue
+                if user and entry['user'] != str(user):
+                    continue
+                if action and entry['action'] != action:
+                    continue
+                if content_type and entry['content_type'] != content_type:
+                    continue
+                if object_id and entry['object_id'] != str(object_id):
+                    continue
+                if search:
+                    haystack = ' '.join([
+                        entry['object_repr'] or '', entry['user_email'] or '', orjson.dumps(entry['changes']).decode()
+                    ]).lower()
+                    if search not in haystack:
+                        continue
+                yield entry
@@ -0,0 +1,109 @@
+import atexit
+import logging
+import os
+import threading
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # 'sync': one INSERT per event, in the request
+    # 'buffered': a background thread flushes every BATCH_SIZE events or FLUSH_INTERVAL seconds
+    # 'on_commit': like 'buffered', but entries only join the batch once the
+    #              surrounding transaction commits
+    'MODE': 'buffered',
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 1.0,
+}
+
+
+def get_writer_setting(name):
+    return getattr(settings, 'AUDIT_LOG_WRITER', {}).get(name, DEFAULTS[name])
+
+
+class AuditLogWriter:
+    """
+    Collects AuditLog rows in memory and writes them with bulk_create.
+
+    In 'buffered' mode writes happen on a background thread, so audit logging no
+    longer adds a round-trip to mutating requests. In 'on_commit' mode each entry
+    is handed to the batch by its own on_commit hook, so entries only land with
+    the data they describe: Django drops the hook, and the entry with it, when
+    the transaction or savepoint the entry was written in rolls back. Whatever is
+    still buffered is flushed at process exit.
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.pid = None
+        atexit.register(self.flush)
+
+    def write(self, entry):
+        mode = get_writer_setting('MODE')
+        if mode == 'sync':
+            entry.save(force_insert=True)
+            return
+        if mode == 'on_commit':
+            # Runs right away outside a transaction
+            transaction.on_commit(partial(self.enqueue, entry))
+        else:
+            self.enqueue(entry)
+
+    def enqueue(self, entry):
+        with self.lock:
+            self.buffer.append(entry)
+            full = len(self.buffer) >= get_writer_setting('BATCH_SIZE')
+
+        self.ensure_thread()
+        if full:
+            self.wakeup.set()
+
+    def flush(self):
+        with self.lock:
+            entries, self.buffer = self.buffer, []
+        self.write_entries(entries)
+
+    def write_entries(self, entries):
+        if not entries:
+            return
+
+        try:
+            AuditLog.objects.bulk_create(entries, batch_size=get_writer_setting('BATCH_SIZE'))
+        except Exception:
+            # Don't lose the whole batch to one bad entry
+            logger.exception("Bulk write of %d audit log entries failed, retrying one by one", len(entries))
+            for entry in entries:
+                try:
+                    entry.save(force_insert=True)
+                except Exception:
+                    logger.exception("Failed to write audit log entry: %s %s", entry.action, entry.object_repr)
+
+    def ensure_thread(self):
+        # Threads do not survive a fork, so workers forked from a preloaded
+        # master start their own flusher
+        if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self.run, name='audit-log-writer', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(get_writer_setting('FLUSH_INTERVAL'))
+            self.wakeup.clear()
+            close_old_connections()
+            self.flush()
+
+
+audit_writer = AuditLogWriter()
@@ -0,0 +1,93 @@
+"""
+Set-based bulk writes of DNS records.
+
+Records are validated once by the caller, then written in a single transaction:
+one query finds the rows that already exist for the domain, new rows go through
+``bulk_create`` and conflicting rows through ``bulk_update``, in chunks of
+DNS_BULK_BATCH_SIZE. Conflicts are on the (dominio, tipo, nombre) unique constraint.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Dominio, DNSRecord
+
+ON_CONFLICT_CHOICES = ('fail', 'skip', 'update')
+
+# Fields overwritten when a record already exists and on_conflict='update'
+UPSERT_FIELDS = ['valor', 'ttl', 'prioridad', 'estado', 'error_message', 'selector', 'policy']
+
+
+class BulkConflictError(Exception):
+    """Records that already exist, as [{'index', 'tipo', 'nombre'}, ...]"""
+
+    def __init__(self, conflicts):
+        super().__init__(f"{len(conflicts)} records already exist")
+        self.conflicts = conflicts
+
+
+def get_existing_records(dominio):
+    """{(tipo, nombre): pk} of the records of ``dominio``"""
+    return {
+        (tipo, nombre): pk
+        for pk, tipo, nombre in DNSRecord.objects.filter(dominio=dominio).values_list('pk', 'tipo', 'nombre')
+    }
+
+
+def bulk_upsert_dns_records(dominio, records, user=None, on_conflict='fail', batch_size=None, existing=None):
+    """
+    Write validated record dicts for ``dominio`` atomically.
+
+    ``on_conflict`` decides what happens with records whose (tipo, nombre) already
+    exists: 'fail' raises BulkConflictError and writes nothing, 'skip' leaves the
+    existing row untouched and 'update' overwrites the UPSERT_FIELDS sent in the payload.
+    Returns (created records, updated records, skipped count).
+
+    Callers writing many chunks to one domain can pass ``existing``, a
+    {(tipo, nombre): pk} map of the domain's records, instead of having it queried
+    on every call; created records are added to it.
+    """
+    if on_conflict not in ON_CONFLICT_CHOICES:
+        raise ValueError(f"on_conflict must be one of {', '.join(ON_CONFLICT_CHOICES)}")
+    batch_size = batch_size or settings.DNS_BULK_BATCH_SIZE
+
+    with transaction.atomic():
+        # Serializes concurrent bulk writes to the same domain
+        Dominio.objects.select_for_update().filter(pk=dominio.pk).exists()
+
+        if existing is None:
+            existing = get_existing_records(dominio)
+
+        now = timezone.now()
+        to_create, to_update, conflicts = [], [], []
+        # Records only overwrite the fields they were sent with, so updates are
+        # grouped by field set, one bulk_update per group
+        update_groups = {}
+        for index, data in enumerate(records):
+            pk = existing.get((data['tipo'], data['nombre']))
+            if pk is None:
+                to_create.append(DNSRecord(dominio=dominio, creado_por=user, **data))
+            elif on_conflict == 'fail':
+                conflicts.append({'index': index, 'tipo': data['tipo'], 'nombre': data['nombre']})
+            elif on_conflict == 'update':
+                record = DNSRecord(pk=pk, dominio=dominio, **data)
+                # bulk_update() skips auto_now
+                record.actualizado_en = record.ultima_comprobacion = now
+                to_update.append(record)
+                fields = frozenset(field for field in UPSERT_FIELDS if field in data)
+                update_groups.setdefault(fields, []).append(record)
+
+        if conflicts:
+            raise BulkConflictError(conflicts)
+
+        DNSRecord.objects.bulk_create(to_create, batch_size=batch_size)
+        existing.update(((record.tipo, record.nombre), record.pk) for record in to_create)
+        for fields, group in update_groups.items():
+            DNSRecord.objects.bulk_update(
+                group,
+                sorted(fields | {'actualizado_en', 'ultima_comprobacion'}),
+                batch_size=batch_size
+            )
+
+    skipped = len(records) - len(to_create) - len(to_update)
+    return to_create, to_update, skipped
@@ -0,0 +1,204 @@
+"""
+Bulk domain onboarding from CSV or NDJSON files.
+
+Rows are read from the upload as a stream and handled in chunks of
+DNS_BULK_BATCH_SIZE, all in one transaction: each chunk is validated in one pass
+(no queries), its tag names are resolved against the empresa's tags loaded once at
+the start, missing tags are created with one bulk insert, and domains and their tag
+links are written with bulk_create / bulk_update. Any invalid row rolls the whole
+import back.
+
+The file format is the one produced by the domain export: a ``nombre`` column plus
+any of IMPORT_FIELDS, and ``tags`` as a ';'-separated list (CSV) or a list of names
+(NDJSON). Other columns are ignored. Imported tags are added to a domain's tags.
+"""
+import csv
+import io
+
+import orjson
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .bulk import BulkConflictError, ON_CONFLICT_CHOICES
+from .history import take_checkpoints
+from .models import Dominio, Tag
+from .serializers import DominioImportSerializer
+from .utils import chunked
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+# Domain fields that can be set from an import file, besides nombre
+IMPORT_FIELDS = [
+    'activo', 'status', 'compliance_level', 'dmarc_policy', 'dns_provider', 'dns_provider_zone_id',
+    'notification_email', 'notify_on_changes', 'notify_on_expiration', 'expiration_date',
+]
+
+# Errors reported before the import gives up
+MAX_IMPORT_ERRORS = 100
+
+
+class DomainImportError(Exception):
+    """Invalid import file, with the errors found as [{'row', 'error'}, ...]"""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} errors in import file")
+        self.errors = errors
+
+
+def _split_tags(value):
+    if isinstance(value, str):
+        return [name.strip() for name in value.split(';') if name.strip()]
+    return value
+
+
+def iter_csv_rows(binary_file):
+    """
+    Yield (row number, row dict) from a CSV file. Empty cells are left out: new
+    domains get the field's default and existing ones keep their value.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline=''))
+    for number, row in enumerate(reader, start=2):
+        row = {key: value for key, value in row.items() if key and value not in (None, '')}
+        if 'tags' in row:
+            row['tags'] = _split_tags(row['tags'])
+        yield number, row
+
+
+def iter_ndjson_rows(binary_file):
+    """Yield (line number, row dict) from a newline-delimited JSON file"""
+    for number, line in enumerate(binary_file, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            raise DomainImportError([{'row': number, 'error': "JSON inválido"}])
+        if not isinstance(row, dict):
+            raise DomainImportError([{'row': number, 'error': "Se esperaba un objeto JSON"}])
+        if 'tags' in row:
+            row['tags'] = _split_tags(row['tags'])
+        yield number, row
+
+
+def iter_rows(binary_file, import_format):
+    if import_format == 'csv':
+        return iter_csv_rows(binary_file)
+    return iter_ndjson_rows(binary_file)
+
+
+def resolve_tags(empresa, names, tags):
+    """
+    Add the pks of ``names`` to ``tags`` ({nombre: pk} of the empresa's tags),
+    creating the tags that do not exist yet. Returns the number of tags created.
+    """
+    missing = [name for name in names if name not in tags]
+    if not missing:
+        return 0
+    Tag.objects.bulk_create([Tag(nombre=name, empresa=empresa) for name in missing], ignore_conflicts=True)
+    # ignore_conflicts leaves the pk of tags created concurrently unknown, so read them back
+    tags.update(Tag.objects.filter(empresa=empresa, nombre__in=missing).values_list('nombre', 'pk'))
+    return len(missing)
+
+
+def import_domains(empresa, rows, user=None, on_conflict='fail', batch_size=None):
+    """
+    Create or update the domains of ``rows`` ((row number, dict) pairs) in ``empresa``.
+
+    ``on_conflict`` handles names that already exist in the empresa, as in the DNS
+    record bulk path: 'fail' raises BulkConflictError, 'skip' leaves the domain as is
+    (its tags are still added) and 'update' overwrites the fields each row provides.
+    Raises DomainImportError when rows are invalid; nothing is written then.
+    Returns a summary dict of counts.
+    """
+    if on_conflict not in ON_CONFLICT_CHOICES:
+        raise ValueError(f"on_conflict must be one of {', '.join(ON_CONFLICT_CHOICES)}")
+    batch_size = batch_size or settings.DNS_BULK_BATCH_SIZE
+    through = Dominio.tags.through
+    summary = {'created': 0, 'updated': 0, 'skipped': 0, 'duplicates': 0, 'tags_created': 0, 'tag_links': 0}
+    errors = []
+    conflicts = []
+    seen = set()
+    total = 0
+
+    with transaction.atomic():
+        existing = dict(Dominio.objects.filter(empresa=empresa).values_list('nombre', 'pk'))
+        tags = dict(Tag.objects.filter(empresa=empresa).values_list('nombre', 'pk'))
+
+        for chunk in chunked(rows, batch_size):
+            total += len(chunk)
+            if total > settings.DOMAIN_IMPORT_MAX_ROWS:
+                raise DomainImportError([{
+                    'row': chunk[0][0], 'error': f"More than {settings.DOMAIN_IMPORT_MAX_ROWS} domains"
+                }])
+
+            serializer = DominioImportSerializer(data=[row for _, row in chunk], many=True)
+            if not serializer.is_valid():
+                for (number, _), row_errors in zip(chunk, serializer.errors):
+                    if row_errors:
+                        errors.append({'row': number, 'error': row_errors})
+                if len(errors) >= MAX_IMPORT_ERRORS:
+                    raise DomainImportError(errors[:MAX_IMPORT_ERRORS])
+                continue
+            if errors:
+                # Keep validating to report every error, but stop writing
+                continue
+
+            now = timezone.now()
+            to_create, to_update, links = [], [], []
+            # Rows only overwrite the fields they provide, so updates are grouped
+            # by field set, one bulk_update per group
+            update_groups = {}
+            tag_names = {name for data in serializer.validated_data for name in data.get('tags', ())}
+            summary['tags_created'] += resolve_tags(empresa, tag_names, tags)
+
+            for (number, _), data in zip(chunk, serializer.validated_data):
+                nombre = data['nombre']
+                if nombre in seen:
+                    summary['duplicates'] += 1
+                    continue
+                seen.add(nombre)
+                row_tags = data.pop('tags', ())
+
+                pk = existing.get(nombre)
+                if pk is None:
+                    dominio = Dominio(empresa=empresa, **data)
+                    to_create.append(dominio)
+                elif on_conflict == 'fail':
+                    if len(conflicts) < MAX_IMPORT_ERRORS:
+                        conflicts.append({'row': number, 'nombre': nombre})
+                    continue
+                elif on_conflict == 'update':
+                    dominio = Dominio(pk=pk, empresa=empresa, **data)
+                    # bulk_update() skips auto_now
+                    dominio.actualizado_en = now
+                    to_update.append(dominio)
+                    fields = frozenset(field for field in IMPORT_FIELDS if field in data)
+                    update_groups.setdefault(fields, []).append(dominio)
+                else:
+                    dominio = Dominio(pk=pk, empresa=empresa, nombre=nombre)
+                    summary['skipped'] += 1
+                links.extend(through(dominio_id=dominio.pk, tag_id=tags[name]) for name in row_tags)
+
+            if conflicts:
+                # Keep looking for conflicts to report, but stop writing
+                continue
+
+            Dominio.objects.bulk_create(to_create, batch_size=batch_size)
+            existing.update((dominio.nombre, dominio.pk) for dominio in to_create)
+            for fields, group in update_groups.items():
+                Dominio.objects.bulk_update(group, sorted(fields | {'actualizado_en'}), batch_size=batch_size)
+            through.objects.bulk_create(links, batch_size=batch_size, ignore_conflicts=True)
+            # Point-in-time history of the new and changed domains starts here
+            take_checkpoints(Dominio.objects.filter(pk__in=[d.pk for d in to_create + to_update]))
+
+            summary['created'] += len(to_create)
+            summary['updated'] += len(to_update)
+            summary['tag_links'] += len(links)
+
+        if errors:
+            raise DomainImportError(errors)
+        if conflicts:
+            raise BulkConflictError(conflicts)
+
+    return summary
@@ -0,0 +1,51 @@
+import operator
+from functools import reduce
+
+from django.db.models import Q
+from django.db.models.constants import LOOKUP_SEP
+from rest_framework import filters
+
+
+class TrigramSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter whose conditions can be served by the pg_trgm GIN indexes.
+
+    On PostgreSQL Django compiles ``icontains`` to ``UPPER(col::text) LIKE UPPER(...)``,
+    which the ``UPPER(col::text) gin_trgm_ops`` indexes created in migration 0002
+    match directly. Lookups that cross a relation (e.g. ``dominio__nombre``) are
+    rewritten as ``IN (subquery)`` on the related table, so every branch of the OR
+    stays on an indexed column and no DISTINCT is needed. On SQLite the same
+    queries simply run as scans.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_fields = self.get_search_fields(view, request)
+        search_terms = self.get_search_terms(request)
+
+        if not search_fields or not search_terms:
+            return queryset
+
+        model = queryset.model
+        conditions = []
+        for search_term in search_terms:
+            queries = [
+                self.construct_condition(model, str(search_field), search_term)
+                for search_field in search_fields
+            ]
+            conditions.append(reduce(operator.or_, queries))
+        return queryset.filter(reduce(operator.and_, conditions))
+
+    def construct_condition(self, model, search_field, search_term):
+        orm_lookup = self.construct_search(search_field)
+        relation_name, _, related_lookup = orm_lookup.partition(LOOKUP_SEP)
+        relation = model._meta.get_field(relation_name)
+        if not relation.is_relation or LOOKUP_SEP not in related_lookup:
+            return Q(**{orm_lookup: search_term})
+
+        if relation.many_to_one or relation.one_to_one:
+            related = relation.related_model._default_manager.filter(**{related_lookup: search_term})
+            return Q(**{f'{relation_name}__in': related.values('pk')})
+
+        # Many-valued relations: match on the primary key to avoid duplicate rows
+        matches = model._default_manager.filter(**{orm_lookup: search_term})
+        return Q(pk__in=matches.values('pk'))
@@ -0,0 +1,233 @@
+"""
+Point-in-time reconstruction of a domain and its DNS records.
+
+A DominioCheckpoint holds a full snapshot; the audit log holds field-level diffs
+(create events carry the initial values, delete events the final ones). The state
+at any instant is the nearest earlier checkpoint plus the diffs logged after it,
+so a lookup replays at most one checkpoint interval of events. Tags added or
+removed in bulk are replayed from the single bulk_operation entry of the request.
+"""
+import copy
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Exists, Max, OuterRef, Q
+from django.utils import timezone
+
+from .models import AuditLog, Dominio, DominioCheckpoint, DNSRecord
+from .utils import chunked, get_model_snapshot
+
+
+def get_checkpoint_data(dominio, registros=None, tag_ids=None):
+    """
+    Snapshot of ``dominio`` in the shape replayed by reconstruct_domain.
+    ``registros`` and ``tag_ids`` can be passed in when already loaded.
+    """
+    state = get_model_snapshot(dominio)
+    if tag_ids is None:
+        tag_ids = dominio.tags.values_list('pk', flat=True)
+    state['tags'] = sorted(str(pk) for pk in tag_ids)
+
+    if registros is None:
+        registros = dominio.registros.all()
+    return {
+        'dominio': state,
+        'registros': {str(record.pk): get_model_snapshot(record) for record in registros},
+    }
+
+
+def take_checkpoints(dominios, batch_size=500):
+    """
+    Checkpoint the given domains (a queryset or iterable), loading records and
+    tags once per batch. Returns the number of checkpoints created.
+    """
+    through = Dominio.tags.through
+    created = 0
+    for batch in chunked(dominios, batch_size):
+        ids = [dominio.pk for dominio in batch]
+        registros = {}
+        for record in DNSRecord.objects.filter(dominio_id__in=ids).order_by():
+            registros.setdefault(record.dominio_id, []).append(record)
+        tag_ids = {}
+        for dominio_id, tag_id in through.objects.filter(dominio_id__in=ids).values_list('dominio_id', 'tag_id'):
+            tag_ids.setdefault(dominio_id, []).append(tag_id)
+
+        now = timezone.now()
+        DominioCheckpoint.objects.bulk_create([
+            DominioCheckpoint(
+                dominio=dominio,
+                creado_en=now,
+                data=get_checkpoint_data(dominio, registros.get(dominio.pk, []), tag_ids.get(dominio.pk, [])),
+            )
+            for dominio in batch
+        ])
+        created += len(batch)
+    return created
+
+
+def take_checkpoint(dominio):
+    return DominioCheckpoint.objects.create(dominio=dominio, data=get_checkpoint_data(dominio))
+
+
+def get_changed_domain_ids(checkpoints, batch_size=500):
+    """
+    Ids of the domains with audit events after their checkpoint, given their
+    latest checkpoints as {dominio id: checkpoint}. Record events are matched
+    through the domain's current records plus the ones in its checkpoint, which
+    covers records deleted or moved out since.
+    """
+    if not checkpoints:
+        return set()
+    since = min(checkpoint.creado_en for checkpoint in checkpoints.values())
+    owners = {}  # audit object id -> ids of the domains it belongs to
+    for dominio_id, checkpoint in checkpoints.items():
+        owners.setdefault(str(dominio_id), set()).add(dominio_id)
+        for record_id in checkpoint.data['registros']:
+            owners.setdefault(record_id, set()).add(dominio_id)
+    records = DNSRecord.objects.filter(dominio_id__in=list(checkpoints)).values_list('pk', 'dominio_id')
+    for record_id, dominio_id in records:
+        owners.setdefault(str(record_id), set()).add(dominio_id)
+
+    changed = set()
+    content_types = list(ContentType.objects.get_for_models(Dominio, DNSRecord).values())
+    for object_ids in chunked(owners, batch_size):
+        latest_events = AuditLog.objects.filter(
+            content_type__in=content_types, object_id__in=object_ids, timestamp__gt=since
+        ).order_by().values('object_id').annotate(latest=Max('timestamp')).values_list('object_id', 'latest')
+        for object_id, latest in latest_events:
+            changed.update(
+                dominio_id for dominio_id in owners[object_id] if latest > checkpoints[dominio_id].creado_en
+            )
+
+    tag_operations = AuditLog.objects.filter(
+        action='bulk_operation', timestamp__gt=since, changes__operation__in=['bulk_tag', 'bulk_untag']
+    ).values_list('timestamp', 'changes__domain_ids')
+    by_id = {str(dominio_id): dominio_id for dominio_id in checkpoints}
+    for timestamp, domain_ids in tag_operations:
+        for pk in domain_ids:
+            dominio_id = by_id.get(pk)
+            if dominio_id is not None and timestamp > checkpoints[dominio_id].creado_en:
+                changed.add(dominio_id)
+    return changed
+
+
+def prune_checkpoints(horizon, batch_size=5000):
+    """
+    Delete the checkpoints older than ``horizon`` that a later checkpoint, also
+    older than ``horizon``, supersedes. Lookups from ``horizon`` on still find
+    their starting checkpoint. Returns the number of checkpoints deleted.
+    """
+    superseded = DominioCheckpoint.objects.filter(creado_en__lt=horizon).filter(Exists(
+        DominioCheckpoint.objects.filter(
+            dominio=OuterRef('dominio'), creado_en__gt=OuterRef('creado_en'), creado_en__lte=horizon
+        )
+    ))
+    deleted = 0
+    while True:
+        ids = list(superseded.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += DominioCheckpoint.objects.filter(pk__in=ids).delete()[0]
+
+
+def reconstruct_domain(dominio, as_of):
+    """
+    State of ``dominio`` and its records at ``as_of``, as
+    {'checkpoint': datetime, 'dominio': {...}, 'registros': [{...}, ...]},
+    or None when there is no checkpoint at or before ``as_of``.
+    """
+    checkpoint = dominio.checkpoints.filter(creado_en__lte=as_of).order_by('-creado_en').first()
+    if checkpoint is None:
+        return None
+
+    state = copy.deepcopy(checkpoint.data)
+    window = Q(timestamp__gt=checkpoint.creado_en, timestamp__lte=as_of)
+    dominio_type = ContentType.objects.get_for_model(Dominio)
+    record_type = ContentType.objects.get_for_model(DNSRecord)
+    dominio_id = str(dominio.pk)
+
+    # Records created, deleted or moved between domains in the window carry the
+    # domain in their diff. Scoped to the empresa (super admin events have none),
+    # so the empresa/timestamp index narrows the rows the JSON filter looks at.
+    moves = AuditLog.objects.filter(
+        window,
+        Q(empresa_id=dominio.empresa_id) | Q(empresa__isnull=True),
+        Q(changes__dominio__new=dominio_id) | Q(changes__dominio__old=dominio_id),
+        content_type=record_type,
+        action__in=['create', 'update', 'delete'],
+    ).values_list('object_id', 'action', 'timestamp', 'changes__dominio__old', 'changes__dominio__new')
+    registros = state['registros']
+    record_ids = set(registros)
+    moved_in = {}  # record id -> (source dominio id, time of its first move in)
+    for object_id, action, timestamp, old_dominio, new_dominio in moves:
+        record_ids.add(object_id)
+        if action == 'update' and new_dominio == dominio_id and object_id not in registros:
+            if object_id not in moved_in or timestamp < moved_in[object_id][1]:
+                moved_in[object_id] = (old_dominio, timestamp)
+
+    # A record moved in from another domain starts from the source domain's last
+    # checkpoint before the move (records written in bulk have no create diff),
+    # or from its whole history when there is none. Moves are rare: one query each.
+    moved_in_events = Q()
+    for object_id, (source_id, moved_at) in moved_in.items():
+        seed = DominioCheckpoint.objects.filter(
+            dominio_id=source_id, creado_en__lte=moved_at
+        ).order_by('-creado_en').values_list('creado_en', f'data__registros__{object_id}').first()
+        since = Q()
+        if seed is not None and seed[1] is not None:
+            registros[object_id] = seed[1]
+            since = Q(timestamp__gt=seed[0])
+        moved_in_events |= Q(since, object_id=object_id, timestamp__lte=as_of)
+
+    record_events = AuditLog.objects.filter(
+        Q(window, object_id__in=record_ids - set(moved_in)) | moved_in_events,
+        content_type=record_type,
+        action__in=['create', 'update', 'delete'],
+    ).values('timestamp', 'action', 'object_id', 'changes')
+    dominio_updates = AuditLog.objects.filter(
+        window, content_type=dominio_type, object_id=dominio_id, action='update'
+    ).values('timestamp', 'action', 'object_id', 'changes')
+    # bulk_tag/bulk_untag log the ids of every domain they touched in one entry;
+    # these are rare enough to match the domain in Python on every backend
+    tag_operations = [
+        event for event in AuditLog.objects.filter(
+            window,
+            Q(empresa_id=dominio.empresa_id) | Q(empresa__isnull=True),
+            action='bulk_operation',
+            changes__operation__in=['bulk_tag', 'bulk_untag'],
+        ).values('timestamp', 'action', 'object_id', 'changes')
+        if dominio_id in event['changes'].get('domain_ids', [])
+    ]
+
+    # Create diffs leave out fields that start as None
+    blank_record = dict.fromkeys(get_model_snapshot(DNSRecord()))
+    events = [*record_events, *dominio_updates, *tag_operations]
+    events.sort(key=lambda event: event['timestamp'])
+    for event in events:
+        if event['action'] == 'bulk_operation':
+            tags = set(state['dominio']['tags'])
+            if event['changes']['operation'] == 'bulk_tag':
+                tags.update(event['changes']['tag_ids'])
+            else:
+                tags.difference_update(event['changes']['tag_ids'])
+            state['dominio']['tags'] = sorted(tags)
+            continue
+        new_values = {field: change['new'] for field, change in event['changes'].items()}
+        object_id = event['object_id']
+        if object_id == dominio_id:
+            state['dominio'].update(new_values)
+        elif event['action'] == 'create':
+            registros[object_id] = {**blank_record, 'id': object_id, **new_values}
+        elif event['action'] == 'delete':
+            registros.pop(object_id, None)
+        else:
+            registros.setdefault(object_id, {**blank_record, 'id': object_id}).update(new_values)
+    # Records replayed from other domains, or moved out of this one
+    state['registros'] = {
+        object_id: record for object_id, record in registros.items() if record.get('dominio') == dominio_id
+    }
+
+    return {
+        'checkpoint': checkpoint.creado_en,
+        'dominio': state['dominio'],
+        'registros': sorted(state['registros'].values(), key=lambda record: (record.get('tipo') or '', record.get('nombre') or '')),
+    }
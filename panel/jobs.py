@@ -0,0 +1,129 @@
+"""
+Bulk domain updates in chunks, synchronously or as background jobs.
+
+Each chunk of BULK_JOB_CHUNK_SIZE domains is updated and checkpointed in its own
+transaction, so locks are held for one chunk at a time and actualizado_en is set
+explicitly (queryset.update() skips auto_now). Large requests become a BulkJob run
+by ``manage.py run_bulk_jobs``, or on a background thread of the web process with
+BULK_JOBS_IN_PROCESS (the default only with DEBUG). The job row records progress
+after every chunk, and a job whose runner died is picked up again from the last
+committed chunk.
+
+A runner owns a job through the ``iniciado_en`` it claimed it with. If it stalls
+long enough for another runner to take the job over, its next progress update
+matches no row, and it rolls back its current chunk and stops.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .history import take_checkpoints
+from .models import BulkJob, Dominio
+from .utils import chunked, log_audit_event, run_in_background
+
+logger = logging.getLogger(__name__)
+
+
+class JobTakenOver(Exception):
+    """Another runner claimed the job since this one did"""
+
+
+def update_domains(domain_ids, updates, empresa_id=None, chunk_size=None, on_chunk=None):
+    """
+    Apply ``updates`` to the domains of ``domain_ids``, one transaction per chunk.
+    ``on_chunk(count)`` runs inside each chunk's transaction. Returns the number of
+    domains updated.
+    """
+    chunk_size = chunk_size or settings.BULK_JOB_CHUNK_SIZE
+    updated = 0
+    for chunk in chunked(domain_ids, chunk_size):
+        with transaction.atomic():
+            queryset = Dominio.objects.filter(pk__in=chunk)
+            if empresa_id is not None:
+                queryset = queryset.filter(empresa_id=empresa_id)
+            count = queryset.update(**updates, actualizado_en=timezone.now())
+            # queryset.update() leaves no per-domain diffs to replay, so checkpoint instead
+            take_checkpoints(Dominio.objects.filter(pk__in=chunk))
+            if on_chunk is not None:
+                on_chunk(len(chunk))
+        updated += count
+    return updated
+
+
+def create_bulk_update_job(user, domain_ids, updates):
+    """Queue a bulk update job; ``updates`` must be JSON-ready"""
+    job = BulkJob.objects.create(
+        empresa_id=None if user.is_super_admin else user.empresa_id,
+        creado_por=user,
+        operation='bulk_update',
+        params={'updates': updates},
+        object_ids=[str(pk) for pk in domain_ids],
+        total=len(domain_ids),
+    )
+    if settings.BULK_JOBS_IN_PROCESS:
+        transaction.on_commit(lambda: run_in_background(run_job, job.pk))
+    return job
+
+
+def _claim_job(job_id):
+    """
+    Mark the job running if it is pending or stale. Returns the claim time, which
+    identifies this runner, or None when another runner has the job.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.BULK_JOB_STALE_SECONDS)
+    claimed = BulkJob.objects.filter(
+        Q(status='pending') | Q(status='running', actualizado_en__lt=stale),
+        pk=job_id,
+    ).update(status='running', iniciado_en=now, actualizado_en=now)
+    return now if claimed == 1 else None
+
+
+def run_job(job_id):
+    """Run (or resume) a job. Returns False if it was not runnable."""
+    claimed_at = _claim_job(job_id)
+    if claimed_at is None:
+        return False
+    job = BulkJob.objects.select_related('creado_por').get(pk=job_id)
+    owned = BulkJob.objects.filter(pk=job.pk, status='running', iniciado_en=claimed_at)
+
+    def on_chunk(count):
+        if not owned.update(processed=F('processed') + count, actualizado_en=timezone.now()):
+            # Rolls back the chunk: the runner that took over applies it
+            raise JobTakenOver(job.pk)
+
+    try:
+        update_domains(
+            job.object_ids[job.processed:], job.params['updates'],
+            empresa_id=job.empresa_id, on_chunk=on_chunk
+        )
+    except JobTakenOver:
+        logger.warning("Bulk job %s was taken over by another runner", job.pk)
+        return True
+    except Exception as exc:
+        logger.exception("Bulk job %s failed", job.pk)
+        owned.update(status='failed', error=str(exc), finalizado_en=timezone.now())
+        return True
+
+    if not owned.update(status='completed', finalizado_en=timezone.now()):
+        logger.warning("Bulk job %s was taken over by another runner", job.pk)
+        return True
+    log_audit_event(
+        user=job.creado_por,
+        action='bulk_operation',
+        content_object=job,
+        changes={'operation': 'bulk_update_completed', 'count': job.total},
+    )
+    return True
+
+
+def get_runnable_jobs():
+    """Pending jobs and running jobs whose runner stopped reporting progress, oldest first"""
+    stale = timezone.now() - timedelta(seconds=settings.BULK_JOB_STALE_SECONDS)
+    return BulkJob.objects.filter(
+        Q(status='pending') | Q(status='running', actualizado_en__lt=stale)
+    ).order_by('creado_en').values_list('pk', flat=True)
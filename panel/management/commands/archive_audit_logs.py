@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from panel.archive import archive_month, ensure_partitions, get_archivable_months
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive audit log months older than AUDIT_LOG_RETENTION_MONTHS to gzip'd JSONL "
+        "in AUDIT_LOG_ARCHIVE_DIR, drop them from the database and create upcoming partitions. "
+        "Meant to run from cron, e.g. daily"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-months', type=int, default=settings.AUDIT_LOG_RETENTION_MONTHS,
+                            help='Months to keep in the database, counting the current one as 0')
+        parser.add_argument('--months-ahead', type=int, default=3,
+                            help='Future monthly partitions to create (PostgreSQL only)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows fetched per cursor round-trip')
+        parser.add_argument('--dry-run', action='store_true', help='List the months that would be archived')
+
+    def handle(self, *args, **options):
+        if options['retention_months'] < 1:
+            raise CommandError('--retention-months must be at least 1')
+
+        if not options['dry_run']:
+            partitions = ensure_partitions(options['months_ahead'])
+            if partitions:
+                self.stdout.write(f"Partitions ready up to {partitions[-1]}")
+
+        months = get_archivable_months(options['retention_months'])
+        if not months:
+            self.stdout.write('Nothing to archive')
+            return
+
+        for month in months:
+            label = month.strftime('%Y-%m')
+            if options['dry_run']:
+                self.stdout.write(f"Would archive {label}")
+                continue
+            path, count = archive_month(month, chunk_size=options['chunk_size'],
+                                        delete_batch_size=options['chunk_size'])
+            if count:
+                self.stdout.write(self.style.SUCCESS(f"Archived {count} entries from {label} to {path}"))
+            else:
+                self.stdout.write(f"No entries in {label}")
@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from core.renderers import ORJSONRenderer
+from panel.models import DNSRecord, AuditLog
+from panel.serializers import (
+    DNSRecordSerializer, AuditLogSerializer,
+    DNSRecordValuesSerializer, AuditLogValuesSerializer
+)
+
+class Command(BaseCommand):
+    help = (
+        "Compare the values() fast path plus ORJSONRenderer against the regular "
+        "serializers plus JSONRenderer: checks the output is byte-identical and times both"
+    )
+
+    targets = {
+        'dns-records': (
+            lambda: DNSRecord.objects.select_related('dominio', 'creado_por').order_by('-creado_en'),
+            DNSRecordSerializer, DNSRecordValuesSerializer,
+        ),
+        'audit-logs': (
+            lambda: AuditLog.objects.select_related('user', 'content_type', 'empresa').order_by('-timestamp'),
+            AuditLogSerializer, AuditLogValuesSerializer,
+        ),
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=list(self.targets), action='append',
+                            help='Endpoint to benchmark (default: all)')
+        parser.add_argument('--rows', type=int, default=1000, help='Rows per page')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per path')
+
+    def handle(self, *args, **options):
+        failed = False
+        for name in options['target'] or list(self.targets):
+            get_queryset, serializer_class, values_serializer_class = self.targets[name]
+            rows = options['rows']
+
+            def regular():
+                data = serializer_class(get_queryset()[:rows], many=True).data
+                return JSONRenderer().render(data)
+
+            def fast():
+                values_serializer = values_serializer_class()
+                data = values_serializer.to_representation(values_serializer.get_queryset(get_queryset())[:rows])
+                return ORJSONRenderer().render(data)
+
+            row_count = get_queryset()[:rows].count()
+            expected, actual = regular(), fast()
+            identical = expected == actual
+            failed = failed or not identical
+
+            regular_time = self.best_of(regular, options['repeat'])
+            fast_time = self.best_of(fast, options['repeat'])
+            self.stdout.write(
+                f"{name}: {row_count} rows, {len(expected)} bytes, "
+                f"identical={identical}, serializer+JSONRenderer={regular_time * 1000:.1f}ms, "
+                f"values+ORJSONRenderer={fast_time * 1000:.1f}ms, "
+                f"speedup={regular_time / fast_time if fast_time else 0:.1f}x"
+            )
+
+        if failed:
+            raise CommandError('Fast path output differs from the regular serializers')
+
+    def best_of(self, func, repeat):
+        timings = []
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
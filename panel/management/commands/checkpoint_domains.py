@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+
+from panel.archive import add_months, month_start
+from panel.history import get_changed_domain_ids, prune_checkpoints, take_checkpoints
+from panel.models import Dominio, DominioCheckpoint
+from panel.utils import chunked
+
+
+class Command(BaseCommand):
+    help = (
+        "Checkpoint every domain that has none, or whose latest checkpoint is older than "
+        "DOMAIN_CHECKPOINT_INTERVAL_HOURS and has audit events after it, so point-in-time "
+        "lookups never replay more than one interval of audit events. With --prune, also "
+        "delete superseded checkpoints from before the audit log retention horizon. Run it from cron"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval-hours', type=int, default=settings.DOMAIN_CHECKPOINT_INTERVAL_HOURS,
+                            help='Maximum age of the latest checkpoint')
+        parser.add_argument('--batch-size', type=int, default=500, help='Domains snapshotted per batch')
+        parser.add_argument('--prune', action='store_true',
+                            help='Delete checkpoints superseded before the retention horizon')
+        parser.add_argument('--retention-months', type=int, default=settings.AUDIT_LOG_RETENTION_MONTHS,
+                            help='Months of audit log kept in the database (see archive_audit_logs)')
+
+    def handle(self, *args, **options):
+        if options['prune'] and options['retention_months'] < 1:
+            raise CommandError('--retention-months must be at least 1')
+
+        cutoff = timezone.now() - timedelta(hours=options['interval_hours'])
+        latest_checkpoint = DominioCheckpoint.objects.filter(
+            dominio=OuterRef('pk')
+        ).order_by('-creado_en')
+        dominios = Dominio.objects.annotate(
+            last_checkpoint=Subquery(latest_checkpoint.values('creado_en')[:1]),
+            last_checkpoint_id=Subquery(latest_checkpoint.values('pk')[:1]),
+        ).filter(
+            Q(last_checkpoint__isnull=True) | Q(last_checkpoint__lt=cutoff)
+        ).order_by()
+
+        # Idle domains are skipped: replaying from their checkpoint is already empty
+        created = 0
+        for batch in chunked(dominios.iterator(chunk_size=options['batch_size']), options['batch_size']):
+            checkpoints = {
+                checkpoint.dominio_id: checkpoint
+                for checkpoint in DominioCheckpoint.objects.filter(
+                    pk__in=[dominio.last_checkpoint_id for dominio in batch if dominio.last_checkpoint_id]
+                )
+            }
+            changed = get_changed_domain_ids(checkpoints)
+            created += take_checkpoints(
+                [dominio for dominio in batch if dominio.pk not in checkpoints or dominio.pk in changed],
+                batch_size=options['batch_size']
+            )
+        self.stdout.write(self.style.SUCCESS(f"Created {created} checkpoints"))
+
+        if options['prune']:
+            now = datetime.now(dt_timezone.utc)
+            horizon = add_months(month_start(now.year, now.month), -options['retention_months'])
+            deleted = prune_checkpoints(horizon)
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} superseded checkpoints"))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from panel.jobs import get_runnable_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Run pending bulk jobs, and resume running jobs whose runner stopped reporting "
+        "progress for BULK_JOB_STALE_SECONDS. With --loop keeps polling every --interval seconds"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Run continuously')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            for job_id in list(get_runnable_jobs()):
+                if run_job(job_id):
+                    self.stdout.write(f"Ran bulk job {job_id}")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
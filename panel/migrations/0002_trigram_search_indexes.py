@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# (index name, table, column) served by TrigramSearchFilter. The expression matches
+# what Django generates for icontains on PostgreSQL: UPPER("col"::text) LIKE UPPER(...)
+TRIGRAM_INDEXES = [
+    ('panel_dominio_nombre_trgm', 'panel_dominio', 'nombre'),
+    ('panel_dnsrecord_nombre_trgm', 'panel_dnsrecord', 'nombre'),
+    ('panel_dnsrecord_valor_trgm', 'panel_dnsrecord', 'valor'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" '
+            f'ON "{table}" USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('panel', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
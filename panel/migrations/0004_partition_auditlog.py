@@ -0,0 +1,135 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import migrations
+
+TABLE = 'panel_auditlog'
+LEGACY_TABLE = 'panel_auditlog_legacy'
+DEFAULT_PARTITION = 'panel_auditlog_default'
+MONTHS_AHEAD = 3
+
+
+def _month_start(year, month):
+    return datetime(year, month, 1, tzinfo=dt_timezone.utc)
+
+
+def _add_months(date, months):
+    index = date.year * 12 + date.month - 1 + months
+    return _month_start(index // 12, index % 12 + 1)
+
+
+def _rename_primary_key(cursor, table, name):
+    """
+    A renamed table keeps its index names, so move the legacy table's primary key
+    out of the way before the new table creates one under the original name
+    """
+    cursor.execute(
+        "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'",
+        [table]
+    )
+    row = cursor.fetchone()
+    if row is not None:
+        cursor.execute(f'ALTER TABLE "{table}" RENAME CONSTRAINT "{row[0]}" TO "{name}"')
+
+
+def partition_auditlog(apps, schema_editor):
+    """
+    Rebuild panel_auditlog as a table partitioned by month on timestamp.
+
+    The primary key becomes (id, timestamp), since a unique constraint on a
+    partitioned table must include the partition key. Indexes and foreign keys
+    are recreated under their original names so later migrations still find them.
+    Existing rows are copied over, which holds a lock on the table for the
+    duration: run it in a maintenance window on large installs.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT IN ("
+            "  SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('p', 'u'))",
+            [TABLE, TABLE]
+        )
+        index_definitions = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE]
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f'SELECT min("timestamp") FROM "{TABLE}"')
+        oldest = cursor.fetchone()[0]
+
+    now = datetime.now(dt_timezone.utc)
+    first = oldest or now
+    month = _month_start(first.year, first.month)
+    last = _add_months(_month_start(now.year, now.month), MONTHS_AHEAD)
+
+    schema_editor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{LEGACY_TABLE}"')
+    with schema_editor.connection.cursor() as cursor:
+        _rename_primary_key(cursor, LEGACY_TABLE, f'{LEGACY_TABLE}_pkey')
+    schema_editor.execute(
+        f'CREATE TABLE "{TABLE}" (LIKE "{LEGACY_TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        f'PARTITION BY RANGE ("timestamp")'
+    )
+    schema_editor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY ("id", "timestamp")')
+    schema_editor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+    while month <= last:
+        schema_editor.execute(
+            f'CREATE TABLE "{TABLE}_y{month.year:04d}m{month.month:02d}" PARTITION OF "{TABLE}" '
+            f'FOR VALUES FROM (%s) TO (%s)',
+            [month, _add_months(month, 1)]
+        )
+        month = _add_months(month, 1)
+
+    schema_editor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{LEGACY_TABLE}"')
+    schema_editor.execute(f'DROP TABLE "{LEGACY_TABLE}"')
+
+    for definition in index_definitions:
+        schema_editor.execute(definition)
+    for name, definition in foreign_keys:
+        schema_editor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}')
+
+
+def unpartition_auditlog(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+            [TABLE, f'{TABLE}_pkey']
+        )
+        index_definitions = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE]
+        )
+        foreign_keys = cursor.fetchall()
+
+    schema_editor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{LEGACY_TABLE}"')
+    with schema_editor.connection.cursor() as cursor:
+        _rename_primary_key(cursor, LEGACY_TABLE, f'{LEGACY_TABLE}_pkey')
+    schema_editor.execute(
+        f'CREATE TABLE "{TABLE}" (LIKE "{LEGACY_TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+    )
+    schema_editor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY ("id")')
+    schema_editor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{LEGACY_TABLE}"')
+    schema_editor.execute(f'DROP TABLE "{LEGACY_TABLE}" CASCADE')
+
+    for definition in index_definitions:
+        schema_editor.execute(definition)
+    for name, definition in foreign_keys:
+        schema_editor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('panel', '0003_auditlog_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_auditlog, unpartition_auditlog),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.23 on 2026-10-19 03:21
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# object_repr weighs most, then the changed field names and values, then the user agent.
+# 'simple' keeps domain names, record values and field names unstemmed.
+CREATE_SEARCH_TRIGGER = """
+CREATE OR REPLACE FUNCTION panel_auditlog_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.object_repr, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce((
+            SELECT string_agg(key, ' ')
+            FROM jsonb_object_keys(CASE WHEN jsonb_typeof(NEW.changes) = 'object' THEN NEW.changes ELSE '{}'::jsonb END) AS key
+        ), '')), 'B') ||
+        setweight(jsonb_to_tsvector('simple', coalesce(NEW.changes, '{}'::jsonb), '["string", "numeric", "boolean"]'), 'B') ||
+        setweight(to_tsvector('simple', coalesce(NEW.user_agent, '')), 'D');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER panel_auditlog_search_vector_update
+    BEFORE INSERT OR UPDATE OF object_repr, changes, user_agent ON panel_auditlog
+    FOR EACH ROW EXECUTE FUNCTION panel_auditlog_search_vector();
+"""
+
+
+def create_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CREATE_SEARCH_TRIGGER)
+    # Backfill: touching object_repr fires the trigger on existing rows
+    schema_editor.execute('UPDATE panel_auditlog SET object_repr = object_repr WHERE search_vector IS NULL')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS panel_auditlog_search_vector_gin ON panel_auditlog USING gin (search_vector)'
+    )
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS panel_auditlog_search_vector_gin')
+    schema_editor.execute('DROP TRIGGER IF EXISTS panel_auditlog_search_vector_update ON panel_auditlog')
+    schema_editor.execute('DROP FUNCTION IF EXISTS panel_auditlog_search_vector()')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('panel', '0005_auditlog_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditlog',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
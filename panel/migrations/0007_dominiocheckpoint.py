@@ -0,0 +1,31 @@
+# Generated by Django 4.2.23 on 2026-10-19 03:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('panel', '0006_auditlog_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DominioCheckpoint',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('creado_en', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('data', models.JSONField()),
+                ('dominio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='panel.dominio')),
+            ],
+            options={
+                'verbose_name': 'Checkpoint de dominio',
+                'verbose_name_plural': 'Checkpoints de dominio',
+                'ordering': ['-creado_en'],
+                'indexes': [models.Index(fields=['dominio', '-creado_en'], name='checkpoint_dominio_ts_idx')],
+            },
+        ),
+    ]
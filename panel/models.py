@@ -1,6 +1,8 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.postgres.search import SearchVectorField
 from accounts.models import User, Empresa
 import uuid
 import json
@@ -22,6 +24,16 @@ class Tag(models.Model):
     def __str__(self):
         return f"{self.nombre} ({self.empresa.nombre})"
 
+class DominioQuerySet(models.QuerySet):
+    def with_dns_record_counts(self):
+        """Annotate the DNS record counts so serializing a page does not run two queries per domain"""
+        return self.annotate(
+            num_dns_records=models.Count('registros', distinct=True),
+            num_valid_dns_records=models.Count(
+                'registros', filter=models.Q(registros__estado='valid'), distinct=True
+            ),
+        )
+
 class Dominio(models.Model):
     COMPLIANCE_CHOICES = [
         ('none', 'None'),
@@ -78,6 +90,8 @@ class Dominio(models.Model):
     notify_on_changes = models.BooleanField(default=True)
     notify_on_expiration = models.BooleanField(default=True)
 
+    objects = DominioQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Dominio"
         verbose_name_plural = "Dominios"
@@ -89,10 +103,14 @@ class Dominio(models.Model):
 
     @property
     def total_dns_records(self):
+        if 'num_dns_records' in self.__dict__:
+            return self.num_dns_records
         return self.registros.count()
 
     @property
     def valid_dns_records(self):
+        if 'num_valid_dns_records' in self.__dict__:
+            return self.num_valid_dns_records
         return self.registros.filter(estado='valid').count()
 
 class DNSRecord(models.Model):
@@ -160,13 +178,14 @@ class AuditLog(models.Model):
     ]
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
-    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, null=True, blank=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, db_index=False)
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, null=True, blank=True, db_index=False)
     action = models.CharField(max_length=20, choices=ACTION_CHOICES)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the event happens, not when the buffered writer inserts it
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     
     # Generic foreign key to track any model
-    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, null=True, blank=True)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, null=True, blank=True, db_index=False)
     object_id = models.CharField(max_length=255, null=True, blank=True)  # Changed to CharField for UUID support
     content_object = GenericForeignKey('content_type', 'object_id')
     
@@ -175,26 +194,114 @@ class AuditLog(models.Model):
     changes = models.JSONField(default=dict, blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True, null=True)
+    # Filled in by a database trigger on PostgreSQL (see migration 0006), always NULL elsewhere
+    search_vector = SearchVectorField(null=True, editable=False)
     
     class Meta:
         verbose_name = "Audit Log"
         verbose_name_plural = "Audit Logs"
         ordering = ['-timestamp']
+        # Match the AuditLogViewSet filters, all ordered by -timestamp. They also cover
+        # the FK lookups, so the FKs themselves are not indexed (db_index=False)
+        indexes = [
+            models.Index(fields=['empresa', '-timestamp'], name='auditlog_empresa_ts_idx'),
+            models.Index(fields=['user', '-timestamp'], name='auditlog_user_ts_idx'),
+            models.Index(fields=['action', '-timestamp'], name='auditlog_action_ts_idx'),
+            models.Index(fields=['content_type', '-timestamp'], name='auditlog_ctype_ts_idx'),
+            models.Index(fields=['content_type', 'object_id', '-timestamp'], name='auditlog_object_history_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user} - {self.action} - {self.object_repr} ({self.timestamp})"
 
     def set_changes(self, old_values, new_values):
         """Helper method to set changes as a dictionary"""
+        self.changes = self.diff_values(old_values, new_values)
+
+    @staticmethod
+    def diff_values(old_values, new_values):
+        """
+        Return {field: {'old': ..., 'new': ...}} for the fields whose value changed.
+        Fields missing on one side count as None, so diffing against {} records
+        the initial (create) or final (delete) values.
+        """
         changes = {}
-        for field, new_value in new_values.items():
+        for field in {**old_values, **new_values}:
             old_value = old_values.get(field)
+            new_value = new_values.get(field)
             if old_value != new_value:
                 changes[field] = {
                     'old': old_value,
                     'new': new_value
                 }
-        self.changes = changes
+        return changes
+
+class DominioCheckpoint(models.Model):
+    """
+    Compact snapshot of a domain and its DNS records at a point in time.
+    Point-in-time lookups start from the nearest checkpoint and replay the audit
+    diffs logged after it (see panel.history).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    dominio = models.ForeignKey(Dominio, on_delete=models.CASCADE, related_name='checkpoints')
+    creado_en = models.DateTimeField(default=timezone.now, editable=False)
+    # {'dominio': {field: value}, 'registros': {record id: {field: value}}}
+    data = models.JSONField()
+
+    class Meta:
+        verbose_name = "Checkpoint de dominio"
+        verbose_name_plural = "Checkpoints de dominio"
+        ordering = ['-creado_en']
+        indexes = [
+            models.Index(fields=['dominio', '-creado_en'], name='checkpoint_dominio_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.dominio_id} @ {self.creado_en}"
+
+class BulkJob(models.Model):
+    """
+    A bulk change run in the background, in chunks committed one at a time.
+    ``processed`` counts the ids done so far, so an interrupted job resumes
+    where it stopped (see panel.jobs).
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    OPERATION_CHOICES = [
+        ('bulk_update', 'Bulk Update'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, null=True, blank=True, related_name='bulk_jobs')
+    creado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    operation = models.CharField(max_length=20, choices=OPERATION_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    params = models.JSONField(default=dict)
+    object_ids = models.JSONField(default=list)
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    iniciado_en = models.DateTimeField(blank=True, null=True)
+    finalizado_en = models.DateTimeField(blank=True, null=True)
+    # Bumped after every chunk; a running job that stops bumping it is considered stale
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Tarea masiva"
+        verbose_name_plural = "Tareas masivas"
+        ordering = ['-creado_en']
+        indexes = [
+            models.Index(fields=['status', 'actualizado_en'], name='bulkjob_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.operation} {self.processed}/{self.total} ({self.status})"
 
 class SystemSetting(models.Model):
     VALUE_TYPE_CHOICES = [
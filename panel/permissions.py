@@ -1,5 +1,8 @@
 from rest_framework import permissions
-from accounts.permissions import HasCompanyAccess
+from accounts.permissions import (
+    HasCompanyAccess, SUPER_ADMIN, EDIT_CONFIG,
+    is_authenticated, request_has_any, request_has_company_access
+)
 
 class CanManageDomain(permissions.BasePermission):
     """
@@ -7,78 +10,73 @@ class CanManageDomain(permissions.BasePermission):
     """
 
     def has_permission(self, request, view):
-        return request.user and request.user.is_authenticated
+        return is_authenticated(request)
 
     def has_object_permission(self, request, view, obj):
-        user = request.user
-        
         # Super admins can access everything
-        if user.is_super_admin:
+        if request_has_any(request, SUPER_ADMIN):
             return True
-        
+
         # Get the domain object
         if hasattr(obj, 'dominio'):
             domain = obj.dominio
-        elif hasattr(obj, 'empresa'):  # This is a domain object
+        elif hasattr(obj, 'empresa_id'):  # This is a domain object
             domain = obj
         else:
             return False
-        
+
         # Check company access
-        if not user.has_company_access(domain.empresa.id):
+        if not request_has_company_access(request, domain.empresa_id):
             return False
-        
+
         # For read operations, any authenticated user with company access can read
         if request.method in permissions.SAFE_METHODS:
             return True
-        
+
         # For write operations, need config permissions or higher
-        return user.can_edit_config
+        return request_has_any(request, EDIT_CONFIG)
 
 class CanManageCompanyData(permissions.BasePermission):
     """
     Permission to manage data within user's company
     """
-    
+
     def has_permission(self, request, view):
-        return request.user and request.user.is_authenticated
+        return is_authenticated(request)
 
     def has_object_permission(self, request, view, obj):
-        user = request.user
-        
-        if user.is_super_admin:
+        if request_has_any(request, SUPER_ADMIN):
             return True
-        
+
         # Get the company from the object
-        if hasattr(obj, 'empresa'):
-            empresa_id = obj.empresa.id
+        if hasattr(obj, 'empresa_id'):
+            empresa_id = obj.empresa_id
         elif hasattr(obj, 'id') and hasattr(obj, 'usuarios'):  # This is a company object
             empresa_id = obj.id
         else:
             return False
-        
+
         # Check company access
-        if not user.has_company_access(empresa_id):
+        if not request_has_company_access(request, empresa_id):
             return False
-        
+
         # For read operations
         if request.method in permissions.SAFE_METHODS:
             return True
-        
+
         # For write operations, need config permissions or higher
-        return user.can_edit_config
+        return request_has_any(request, EDIT_CONFIG)
 
 class IsReadOnlyOrCanEdit(permissions.BasePermission):
     """
     Permission that allows read-only users to read, but requires edit permissions for write operations
     """
-    
+
     def has_permission(self, request, view):
-        user = request.user
-        if not user or not user.is_authenticated:
+        if not is_authenticated(request):
             return False
-        
+
         if request.method in permissions.SAFE_METHODS:
             return True
-        
-        return user.can_edit_config
\ No newline at end of file
+
+        return request_has_any(request, EDIT_CONFIG)
@@ -1,8 +1,50 @@
 from rest_framework import serializers
-from .models import Dominio, DNSRecord, Tag, AuditLog, SystemSetting
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from .bulk import ON_CONFLICT_CHOICES
+from .models import Dominio, DNSRecord, Tag, AuditLog, SystemSetting, BulkJob
 from accounts.models import User, Empresa
 
-class TagSerializer(serializers.ModelSerializer):
+
+def _split_query_param(value):
+    return {name.strip() for name in value.split(',') if name.strip()} if value else set()
+
+
+class SparseFieldsetMixin:
+    """
+    Prune the rendered fields with the ``?fields=`` and ``?expand=`` query params.
+
+    ``fields`` selects a sparse fieldset. Fields listed in ``Meta.expandable_fields``
+    are the expensive ones (nested relations, computed counts): once a sparse
+    fieldset is requested they are only rendered when named in ``fields`` or
+    ``expand``. Without either param the serializer renders every field as usual.
+    """
+
+    @classmethod
+    def get_requested_fields(cls, request):
+        """Return the set of field names to render, or None for all of them"""
+        if request is None or request.method != 'GET':
+            return None
+
+        fields = _split_query_param(request.query_params.get('fields'))
+        expand = _split_query_param(request.query_params.get('expand'))
+        if not fields and not expand:
+            return None
+
+        allowed = set(cls.Meta.fields)
+        expandable = set(getattr(cls.Meta, 'expandable_fields', ()))
+        requested = fields if fields else allowed - expandable
+        return (requested | (expand & expandable)) & allowed
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.get_requested_fields(self.context.get('request'))
+        if requested is not None:
+            for field_name in set(self.fields) - requested:
+                self.fields.pop(field_name)
+
+
+class TagSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ['id', 'nombre', 'color', 'descripcion', 'empresa', 'creado_en']
@@ -19,7 +61,7 @@ class TagSerializer(serializers.ModelSerializer):
                     raise serializers.ValidationError("Usuario debe pertenecer a una empresa")
         return data
 
-class DominioListSerializer(serializers.ModelSerializer):
+class DominioListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Simplified serializer for list views"""
     empresa_nombre = serializers.CharField(source='empresa.nombre', read_only=True)
     tags = TagSerializer(many=True, read_only=True)
@@ -33,8 +75,9 @@ class DominioListSerializer(serializers.ModelSerializer):
             'empresa', 'empresa_nombre', 'tags', 'creado_en', 'actualizado_en',
             'total_dns_records', 'valid_dns_records', 'last_dns_check', 'dns_check_status'
         ]
+        expandable_fields = ['tags', 'total_dns_records', 'valid_dns_records']
 
-class DominioSerializer(serializers.ModelSerializer):
+class DominioSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     empresa_nombre = serializers.CharField(source='empresa.nombre', read_only=True)
     tags = serializers.PrimaryKeyRelatedField(
         queryset=Tag.objects.all(), 
@@ -54,6 +97,7 @@ class DominioSerializer(serializers.ModelSerializer):
             'notify_on_expiration', 'creado_en', 'actualizado_en', 'last_dns_check', 
             'dns_check_status', 'expiration_date', 'total_dns_records', 'valid_dns_records'
         ]
+        expandable_fields = ['tags', 'tags_details', 'total_dns_records', 'valid_dns_records']
         read_only_fields = ['id', 'creado_en', 'actualizado_en', 'empresa', 'last_dns_check', 'dns_check_status']
 
     def validate_nombre(self, value):
@@ -88,7 +132,27 @@ class DominioSerializer(serializers.ModelSerializer):
                         )
         return tags
 
-class DNSRecordSerializer(serializers.ModelSerializer):
+class DominioImportSerializer(serializers.ModelSerializer):
+    """
+    A row of a domain import file (see panel.domain_import). Tags are given by
+    name and the empresa comes from the request, so validating a row runs no queries.
+    """
+    tags = serializers.ListField(
+        child=serializers.CharField(max_length=50),
+        required=False
+    )
+
+    class Meta:
+        model = Dominio
+        fields = [
+            'nombre', 'activo', 'status', 'compliance_level', 'dmarc_policy', 'dns_provider',
+            'dns_provider_zone_id', 'notification_email', 'notify_on_changes', 'notify_on_expiration',
+            'expiration_date', 'tags'
+        ]
+
+    validate_nombre = DominioSerializer.validate_nombre
+
+class DNSRecordSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     dominio_nombre = serializers.CharField(source='dominio.nombre', read_only=True)
     creado_por_username = serializers.CharField(source='creado_por.username', read_only=True)
 
@@ -99,6 +163,7 @@ class DNSRecordSerializer(serializers.ModelSerializer):
             'estado', 'ultima_comprobacion', 'error_message', 'selector', 'policy',
             'creado_en', 'actualizado_en', 'creado_por', 'creado_por_username'
         ]
+        expandable_fields = ['dominio_nombre', 'creado_por_username']
         read_only_fields = ['id', 'ultima_comprobacion', 'creado_en', 'actualizado_en']
 
     def validate(self, data):
@@ -106,7 +171,7 @@ class DNSRecordSerializer(serializers.ModelSerializer):
         tipo = data.get('tipo')
         valor = data.get('valor')
         
-        if tipo == 'MX' and not data.get('prioridad'):
+        if tipo == 'MX' and data.get('prioridad') is None:
             raise serializers.ValidationError("Los registros MX requieren prioridad")
         
         if tipo == 'DKIM' and not data.get('selector'):
@@ -129,7 +194,7 @@ class DNSRecordSerializer(serializers.ModelSerializer):
         
         return data
 
-class AuditLogSerializer(serializers.ModelSerializer):
+class AuditLogSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user_username = serializers.CharField(source='user.username', read_only=True)
     user_email = serializers.CharField(source='user.email', read_only=True)
     empresa_nombre = serializers.CharField(source='empresa.nombre', read_only=True)
@@ -142,8 +207,64 @@ class AuditLogSerializer(serializers.ModelSerializer):
             'action', 'timestamp', 'content_type', 'content_type_name', 'object_id', 
             'object_repr', 'changes', 'ip_address', 'user_agent'
         ]
+        expandable_fields = ['user_username', 'user_email', 'empresa_nombre', 'content_type_name', 'changes']
         read_only_fields = ['timestamp']
 
+class ValuesSerializer:
+    """
+    Read-only fast path that renders ``.values()`` rows exactly like ``Meta.serializer_class``.
+
+    The column layout is derived once from the model serializer (including any sparse
+    fieldset in the request), so list pages skip model instantiation and per-field
+    attribute lookups. Only model columns and forward relations are supported.
+    """
+    converted_field_types = (
+        serializers.DateTimeField, serializers.DateField, serializers.TimeField,
+        serializers.DecimalField, serializers.UUIDField,
+    )
+
+    def __init__(self, context=None):
+        self.context = context or {}
+        serializer = self.Meta.serializer_class(context=self.context)
+        self.columns = []
+        for field_name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or isinstance(field, (serializers.SerializerMethodField, serializers.BaseSerializer)):
+                raise ImproperlyConfigured(
+                    f"{self.__class__.__name__} cannot render '{field_name}' from values() rows"
+                )
+            convert = field.to_representation if isinstance(field, self.converted_field_types) else None
+            # DRF omits a dotted field when an intermediate relation is null
+            omit_if_null = len(field.source_attrs) > 1 and not field.allow_null
+            self.columns.append((field_name, '__'.join(field.source_attrs), convert, omit_if_null))
+
+    def get_queryset(self, queryset):
+        return queryset.prefetch_related(None).values(*[lookup for _, lookup, _, _ in self.columns])
+
+    def to_representation(self, rows):
+        data = []
+        for row in rows:
+            item = {}
+            for field_name, lookup, convert, omit_if_null in self.columns:
+                value = row[lookup]
+                if value is None:
+                    if omit_if_null:
+                        continue
+                elif convert is not None:
+                    value = convert(value)
+                item[field_name] = value
+            data.append(item)
+        return data
+
+class DNSRecordValuesSerializer(ValuesSerializer):
+    class Meta:
+        serializer_class = DNSRecordSerializer
+
+class AuditLogValuesSerializer(ValuesSerializer):
+    class Meta:
+        serializer_class = AuditLogSerializer
+
 class SystemSettingSerializer(serializers.ModelSerializer):
     updated_by_username = serializers.CharField(source='updated_by.username', read_only=True)
     display_value = serializers.SerializerMethodField()
@@ -169,6 +290,22 @@ class SystemSettingSerializer(serializers.ModelSerializer):
             data['value'] = "***HIDDEN***"
         return data
 
+class BulkJobSerializer(serializers.ModelSerializer):
+    creado_por_email = serializers.EmailField(source='creado_por.email', read_only=True, default=None)
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = BulkJob
+        fields = [
+            'id', 'operation', 'status', 'params', 'total', 'processed', 'progress', 'error',
+            'creado_por', 'creado_por_email', 'creado_en', 'iniciado_en', 'finalizado_en', 'actualizado_en'
+        ]
+        read_only_fields = fields
+
+    def get_progress(self, obj):
+        """Percentage of ids processed"""
+        return round(100 * obj.processed / obj.total, 1) if obj.total else 100.0
+
 # Bulk operation serializers
 class BulkDomainUpdateSerializer(serializers.Serializer):
     domain_ids = serializers.ListField(
@@ -176,12 +313,65 @@ class BulkDomainUpdateSerializer(serializers.Serializer):
         min_length=1
     )
     updates = serializers.DictField()
+    run_async = serializers.BooleanField(required=False, default=False)
+
+    def validate_domain_ids(self, value):
+        # Duplicates would make the access check count fail
+        return list(dict.fromkeys(value))
+
+    def validate_updates(self, value):
+        """Only the plain domain fields an import may set, validated as in an import"""
+        allowed = set(DominioImportSerializer.Meta.fields) - {'nombre', 'tags'}
+        unknown = set(value) - allowed
+        if unknown:
+            raise serializers.ValidationError(f"Campos no permitidos: {', '.join(sorted(unknown))}")
+        if not value:
+            raise serializers.ValidationError("Se requiere al menos un campo")
+
+        serializer = DominioImportSerializer(data=value, partial=True)
+        if not serializer.is_valid():
+            raise serializers.ValidationError(serializer.errors)
+        return serializer.validated_data
+
+class BulkDomainTagSerializer(serializers.Serializer):
+    domain_ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        min_length=1
+    )
+    tag_ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        min_length=1
+    )
+
+    def validate_domain_ids(self, value):
+        return list(dict.fromkeys(value))
+
+    def validate_tag_ids(self, value):
+        return list(dict.fromkeys(value))
+
+class BulkDNSRecordSerializer(DNSRecordSerializer):
+    """
+    A record of a bulk request. The domain and author come from the request, so
+    validating a record runs no queries.
+    """
+
+    class Meta(DNSRecordSerializer.Meta):
+        fields = ['tipo', 'nombre', 'valor', 'ttl', 'prioridad', 'estado', 'error_message', 'selector', 'policy']
+        expandable_fields = []
 
 class BulkDNSRecordCreateSerializer(serializers.Serializer):
     domain_id = serializers.UUIDField()
-    records = DNSRecordSerializer(many=True)
+    records = BulkDNSRecordSerializer(many=True, allow_empty=False, max_length=settings.DNS_BULK_MAX_RECORDS)
+    on_conflict = serializers.ChoiceField(choices=ON_CONFLICT_CHOICES, default='fail')
 
-    def validate_domain_id(self, value):
-        if not Dominio.objects.filter(id=value).exists():
-            raise serializers.ValidationError("Dominio no encontrado")
+    def validate_records(self, value):
+        seen = set()
+        errors = {}
+        for index, record in enumerate(value):
+            key = (record['tipo'], record['nombre'])
+            if key in seen:
+                errors[index] = "Registro duplicado en la solicitud"
+            seen.add(key)
+        if errors:
+            raise serializers.ValidationError(errors)
         return value
\ No newline at end of file
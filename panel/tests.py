@@ -1,3 +1,516 @@
-from django.test import TestCase
+import io
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import Empresa, Role, User
+from . import archive, jobs, zonefile
+from .audit import audit_writer
+from .bulk import BulkConflictError, bulk_upsert_dns_records
+from .domain_import import import_domains, iter_csv_rows
+from .history import prune_checkpoints, take_checkpoint, take_checkpoints
+from .models import AuditLog, BulkJob, Dominio, DominioCheckpoint, DNSRecord, Tag
+from .utils import log_audit_event
+from .zonefile import ZoneImportError, export_zone, import_zone
+
+
+@override_settings(AUDIT_LOG_WRITER={'MODE': 'sync'})
+class PanelTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Acme')
+        cls.role = Role.objects.create(nombre='company_admin')
+        cls.user = User.objects.create_user(
+            username='admin', email='admin@acme.com', password='secret', empresa=cls.empresa, role=cls.role
+        )
+        cls.dominio = Dominio.objects.create(nombre='acme.com', empresa=cls.empresa)
+
+
+@override_settings(AUDIT_LOG_WRITER={'MODE': 'on_commit', 'FLUSH_INTERVAL': 3600})
+class AuditWriterTests(PanelTestCase):
+    """panel.audit.AuditLogWriter in 'on_commit' mode"""
+
+    def log(self, label):
+        log_audit_event(user=self.user, action='update', content_object=self.dominio, changes={'label': label})
+
+    def logged(self):
+        return sorted(AuditLog.objects.values_list('changes__label', flat=True))
+
+    def test_entries_wait_for_the_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.log('first')
+            self.assertEqual(audit_writer.buffer, [])
+
+        self.assertEqual(len(audit_writer.buffer), 1)
+        audit_writer.flush()
+        self.assertEqual(self.logged(), ['first'])
+
+    def test_entries_of_rolled_back_savepoints_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.log('outer')
+            with self.assertRaises(ValueError), transaction.atomic():
+                self.log('rolled back')
+                raise ValueError
+            with transaction.atomic():
+                self.log('nested')
+
+        audit_writer.flush()
+        self.assertEqual(self.logged(), ['nested', 'outer'])
+
+
+class DomainHistoryTests(PanelTestCase):
+    """Point-in-time lookups (panel.history) and the checkpoint_domains command"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.record = DNSRecord.objects.create(dominio=self.dominio, tipo='A', nombre='www', valor='192.0.2.1')
+
+    def as_of(self, dominio, when):
+        response = self.client.get(f'/api/v1/panel/dominios/{dominio.pk}/', {'as_of': when.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def checkpoint_domains(self):
+        out = io.StringIO()
+        call_command('checkpoint_domains', interval_hours=0, stdout=out)
+        return out.getvalue()
+
+    def test_replays_the_diffs_logged_after_the_checkpoint(self):
+        take_checkpoint(self.dominio)
+        before = timezone.now()
+        self.client.patch(f'/api/v1/panel/dns-records/{self.record.pk}/', {'valor': '192.0.2.9'}, format='json')
+        self.client.patch(f'/api/v1/panel/dominios/{self.dominio.pk}/', {'dmarc_policy': 'reject'}, format='json')
+
+        then, now = self.as_of(self.dominio, before), self.as_of(self.dominio, timezone.now())
+
+        self.assertEqual(then['dominio']['dmarc_policy'], 'none')
+        self.assertEqual([record['valor'] for record in then['registros']], ['192.0.2.1'])
+        self.assertEqual(now['dominio']['dmarc_policy'], 'reject')
+        self.assertEqual([record['valor'] for record in now['registros']], ['192.0.2.9'])
+
+    def test_lookups_before_the_first_checkpoint_are_not_found(self):
+        before = timezone.now()
+        take_checkpoint(self.dominio)
+        response = self.client.get(f'/api/v1/panel/dominios/{self.dominio.pk}/', {'as_of': before.isoformat()})
+        self.assertEqual(response.status_code, 404)
+
+    def test_record_moved_in_starts_from_the_source_checkpoint(self):
+        # Written in bulk: the record has no create diff to replay
+        otro = Dominio.objects.create(nombre='otro.com', empresa=self.empresa)
+        take_checkpoints(Dominio.objects.all())
+        self.client.patch(f'/api/v1/panel/dns-records/{self.record.pk}/', {'dominio': str(otro.pk)}, format='json')
+
+        now = timezone.now()
+        moved = self.as_of(otro, now)['registros']
+        self.assertEqual([(r['tipo'], r['nombre'], r['valor'], r['ttl']) for r in moved], [('A', 'www', '192.0.2.1', 3600)])
+        self.assertEqual(self.as_of(self.dominio, now)['registros'], [])
+
+    def test_checkpoints_only_domains_with_changes(self):
+        self.assertIn('Created 1 checkpoints', self.checkpoint_domains())
+        self.assertIn('Created 0 checkpoints', self.checkpoint_domains())
+
+        self.client.patch(f'/api/v1/panel/dns-records/{self.record.pk}/', {'ttl': 60}, format='json')
+        self.assertIn('Created 1 checkpoints', self.checkpoint_domains())
+        self.client.delete(f'/api/v1/panel/dns-records/{self.record.pk}/')
+        self.assertIn('Created 1 checkpoints', self.checkpoint_domains())
+        self.assertEqual(DominioCheckpoint.objects.count(), 3)
+
+    def test_prune_keeps_the_checkpoint_lookups_start_from(self):
+        now = timezone.now()
+        horizon = now - timedelta(days=365)
+        for age in (730, 540, 0):
+            DominioCheckpoint.objects.create(dominio=self.dominio, creado_en=now - timedelta(days=age), data={})
+
+        self.assertEqual(prune_checkpoints(horizon), 1)
+        self.assertEqual(
+            sorted((now - checkpoint.creado_en).days for checkpoint in DominioCheckpoint.objects.all()), [0, 540]
+        )
+
+
+class BulkUpsertTests(PanelTestCase):
+    """panel.bulk.bulk_upsert_dns_records on records that already exist"""
+
+    def setUp(self):
+        self.www = DNSRecord.objects.create(dominio=self.dominio, tipo='A', nombre='www', valor='192.0.2.1', ttl=600)
+        self.mail = DNSRecord.objects.create(dominio=self.dominio, tipo='A', nombre='mail', valor='192.0.2.2', ttl=600)
+
+    def test_fail_writes_nothing(self):
+        records = [
+            {'tipo': 'A', 'nombre': 'new', 'valor': '192.0.2.3'},
+            {'tipo': 'A', 'nombre': 'www', 'valor': '192.0.2.9'},
+        ]
+        with self.assertRaises(BulkConflictError) as raised:
+            bulk_upsert_dns_records(self.dominio, records)
+
+        self.assertEqual(raised.exception.conflicts, [{'index': 1, 'tipo': 'A', 'nombre': 'www'}])
+        self.assertFalse(DNSRecord.objects.filter(nombre='new').exists())
+        self.www.refresh_from_db()
+        self.assertEqual(self.www.valor, '192.0.2.1')
+
+    def test_skip_leaves_existing_records(self):
+        records = [
+            {'tipo': 'A', 'nombre': 'new', 'valor': '192.0.2.3'},
+            {'tipo': 'A', 'nombre': 'www', 'valor': '192.0.2.9'},
+        ]
+        created, updated, skipped = bulk_upsert_dns_records(self.dominio, records, on_conflict='skip')
+
+        self.assertEqual((len(created), len(updated), skipped), (1, 0, 1))
+        self.www.refresh_from_db()
+        self.assertEqual(self.www.valor, '192.0.2.1')
+
+    def test_update_only_overwrites_the_fields_sent(self):
+        records = [
+            {'tipo': 'A', 'nombre': 'www', 'valor': '192.0.2.9'},
+            {'tipo': 'A', 'nombre': 'mail', 'valor': '192.0.2.2', 'ttl': 60},
+        ]
+        created, updated, skipped = bulk_upsert_dns_records(self.dominio, records, on_conflict='update')
+
+        self.assertEqual((len(created), len(updated), skipped), (0, 2, 0))
+        self.www.refresh_from_db()
+        self.mail.refresh_from_db()
+        self.assertEqual((self.www.valor, self.www.ttl), ('192.0.2.9', 600))
+        self.assertEqual((self.mail.valor, self.mail.ttl), ('192.0.2.2', 60))
+
+
+class ZoneFileTests(PanelTestCase):
+    """panel.zonefile drives dnspython's zone file reader through a custom sink"""
+
+    zone = (
+        '$ORIGIN acme.com.\n'
+        '$TTL 300\n'
+        '@ IN SOA ns1.acme.com. hostmaster.acme.com. 1 7200 3600 1209600 300\n'
+        '@ IN NS ns1.acme.com.\n'
+        '@ IN MX 0 mail.acme.com.\n'
+        '@ 600 IN TXT "v=spf1 include:_spf.acme.com -all"\n'
+        '_dmarc IN TXT "v=DMARC1; p=reject"\n'
+        'sel._domainkey IN TXT ( "v=DKIM1; k=rsa; "\n'
+        '    "p=MIGfMA0" )\n'
+        'www IN A 192.0.2.1\n'
+        'www IN A 192.0.2.2\n'
+        'v6 IN AAAA 2001:db8::1\n'
+        'blog IN CNAME www\n'
+    )
+
+    def records(self):
+        return {
+            (record.tipo, record.nombre): record
+            for record in DNSRecord.objects.filter(dominio=self.dominio)
+        }
+
+    def test_import(self):
+        summary = import_zone(self.dominio, io.StringIO(self.zone), user=self.user)
+
+        self.assertEqual(summary['created'], 7)
+        self.assertEqual(summary['duplicates'], 1)
+        self.assertEqual(summary['unsupported'], {'SOA': 1, 'NS': 1})
+        records = self.records()
+        self.assertEqual(records[('MX', '@')].prioridad, 0)
+        self.assertEqual(records[('MX', '@')].valor, 'mail.acme.com.')
+        self.assertEqual(records[('SPF', '@')].ttl, 600)
+        self.assertEqual(records[('DMARC', '_dmarc')].policy, 'reject')
+        self.assertEqual(records[('DKIM', 'sel._domainkey')].selector, 'sel')
+        self.assertEqual(records[('DKIM', 'sel._domainkey')].valor, 'v=DKIM1; k=rsa; p=MIGfMA0')
+        self.assertEqual(records[('A', 'www')].valor, '192.0.2.1')
+        self.assertEqual(records[('CNAME', 'blog')].valor, 'www.acme.com.')
+
+    def test_export_round_trip(self):
+        import_zone(self.dominio, io.StringIO(self.zone))
+        before = {key: (r.valor, r.ttl, r.prioridad) for key, r in self.records().items()}
+        exported = b''.join(export_zone(self.dominio)).decode()
+
+        DNSRecord.objects.filter(dominio=self.dominio).delete()
+        import_zone(self.dominio, io.StringIO(exported))
+
+        after = {key: (r.valor, r.ttl, r.prioridad) for key, r in self.records().items()}
+        self.assertEqual(after, before)
+
+    def test_errors_report_the_entry_line(self):
+        zone = '$TTL 300\nwww IN A 192.0.2.1\nbad IN A 999.0.0.1\nok IN A 192.0.2.3\n'
+        with self.assertRaises(ZoneImportError) as raised:
+            import_zone(self.dominio, io.StringIO(zone))
+        self.assertEqual([error['line'] for error in raised.exception.errors], [3])
+        self.assertFalse(DNSRecord.objects.filter(dominio=self.dominio).exists())
+
+    def test_validation_errors_report_the_entry_line(self):
+        zone = '$TTL 300\nwww IN A 192.0.2.1\nempty IN TXT ""\n'
+        with self.assertRaises(ZoneImportError) as raised:
+            import_zone(self.dominio, io.StringIO(zone))
+        self.assertEqual([error['line'] for error in raised.exception.errors], [3])
+
+    def test_unsupported_dnspython_versions_are_refused(self):
+        zonefile.check_dnspython_version('2.4.0')
+        for version in ('2.5.0', '2.3.0', '3.0.0'):
+            with self.assertRaisesMessage(ImproperlyConfigured, f'not {version}'):
+                zonefile.check_dnspython_version(version)
+
+
+class DomainImportTests(PanelTestCase):
+    """panel.domain_import.import_domains from CSV"""
+
+    def rows(self, text):
+        return iter_csv_rows(io.BytesIO(text.encode()))
+
+    def test_import_creates_domains_and_tags(self):
+        summary = import_domains(self.empresa, self.rows(
+            'nombre,status,tags\n'
+            'nuevo.com,active,prod;mail\n'
+            'otro.com,,prod\n'
+            'nuevo.com,inactive,\n'
+        ))
+
+        self.assertEqual((summary['created'], summary['duplicates'], summary['tags_created']), (2, 1, 2))
+        nuevo = Dominio.objects.get(empresa=self.empresa, nombre='nuevo.com')
+        self.assertEqual(nuevo.status, 'active')
+        self.assertEqual(sorted(nuevo.tags.values_list('nombre', flat=True)), ['mail', 'prod'])
+        self.assertEqual(Dominio.objects.get(nombre='otro.com').status, 'pending')
+
+    def test_conflicts_fail_by_default(self):
+        with self.assertRaises(BulkConflictError) as raised:
+            import_domains(self.empresa, self.rows('nombre,status\nnuevo.com,active\nacme.com,active\n'))
+
+        self.assertEqual(raised.exception.conflicts, [{'row': 3, 'nombre': 'acme.com'}])
+        self.assertFalse(Dominio.objects.filter(nombre='nuevo.com').exists())
+
+    def test_update_keeps_the_values_of_empty_cells(self):
+        Dominio.objects.filter(pk=self.dominio.pk).update(status='active', dmarc_policy='reject')
+        other = Dominio.objects.create(nombre='otro.com', empresa=self.empresa, dmarc_policy='reject')
+
+        summary = import_domains(self.empresa, self.rows(
+            'nombre,status,dmarc_policy,tags\n'
+            'acme.com,inactive,,prod\n'
+            'otro.com,,quarantine,\n'
+        ), on_conflict='update')
+
+        self.assertEqual(summary['updated'], 2)
+        self.dominio.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.dominio.status, self.dominio.dmarc_policy), ('inactive', 'reject'))
+        self.assertEqual((other.status, other.dmarc_policy), ('pending', 'quarantine'))
+        self.assertEqual(list(self.dominio.tags.values_list('nombre', flat=True)), ['prod'])
+        self.assertTrue(Tag.objects.filter(empresa=self.empresa, nombre='prod').exists())
+
+
+@override_settings(BULK_JOB_CHUNK_SIZE=2, BULK_JOB_STALE_SECONDS=300)
+class BulkJobTests(PanelTestCase):
+    """panel.jobs.run_job: chunked progress, resuming and claims"""
+
+    def setUp(self):
+        self.dominios = [
+            Dominio.objects.create(nombre=f'd{index}.com', empresa=self.empresa) for index in range(5)
+        ]
+        self.job = BulkJob.objects.create(
+            empresa=self.empresa, creado_por=self.user, operation='bulk_update',
+            params={'updates': {'dmarc_policy': 'reject'}},
+            object_ids=[str(dominio.pk) for dominio in self.dominios], total=5,
+        )
+
+    def policies(self):
+        return [dominio.dmarc_policy for dominio in Dominio.objects.filter(nombre__startswith='d').order_by('nombre')]
+
+    def test_run(self):
+        self.assertTrue(jobs.run_job(self.job.pk))
+
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.processed), ('completed', 5))
+        self.assertEqual(self.policies(), ['reject'] * 5)
+
+    def test_stale_job_resumes_after_the_last_chunk(self):
+        stale = timezone.now() - timedelta(seconds=600)
+        BulkJob.objects.filter(pk=self.job.pk).update(status='running', processed=2, actualizado_en=stale)
+
+        self.assertTrue(jobs.run_job(self.job.pk))
+
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.processed), ('completed', 5))
+        self.assertEqual(self.policies(), ['none', 'none', 'reject', 'reject', 'reject'])
+
+    def test_running_job_is_not_claimed_twice(self):
+        BulkJob.objects.filter(pk=self.job.pk).update(status='running', actualizado_en=timezone.now())
+
+        self.assertFalse(jobs.run_job(self.job.pk))
+        self.assertEqual(self.policies(), ['none'] * 5)
+
+    def test_runner_stops_when_the_job_is_taken_over(self):
+        update_domains = jobs.update_domains
+
+        def taken_over(*args, on_chunk, **kwargs):
+            def claim_then_report(count):
+                # Another runner claims the job while this chunk is in flight
+                BulkJob.objects.filter(pk=self.job.pk).update(iniciado_en=timezone.now() + timedelta(seconds=1))
+                on_chunk(count)
+            return update_domains(*args, on_chunk=claim_then_report, **kwargs)
+
+        with mock.patch.object(jobs, 'update_domains', taken_over), self.assertLogs('panel.jobs', 'WARNING'):
+            self.assertTrue(jobs.run_job(self.job.pk))
+
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.processed), ('running', 0))
+        self.assertEqual(self.policies(), ['none'] * 5)
+
+
+class RecordingCursor:
+    """Stands in for a PostgreSQL cursor: records statements, answers fetchone() in order"""
+    KEYWORDS = ('to_regclass', 'EXISTS', 'DETACH', 'ATTACH', 'CREATE', 'INSERT', 'DELETE')
+
+    def __init__(self, *rows):
+        self.rows = list(rows)
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append(next(keyword for keyword in self.KEYWORDS if keyword in sql))
+
+    def fetchone(self):
+        return self.rows.pop(0)
+
+
+class AuditArchiveTests(PanelTestCase):
+    """panel.archive: monthly archival to gzip'd JSONL and partition upkeep"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(AUDIT_LOG_ARCHIVE_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        january = datetime(2024, 1, 10, tzinfo=dt_timezone.utc)
+        AuditLog.objects.bulk_create([
+            AuditLog(
+                user=self.user, empresa=self.empresa, action='update', timestamp=january + timedelta(minutes=index),
+                object_repr=f'entry {index}', changes={'index': index}
+            )
+            for index in range(25)
+        ] + [
+            AuditLog(user=self.user, empresa=self.empresa, action='delete', timestamp=january, object_repr='gone'),
+            AuditLog(user=self.user, action='update', timestamp=datetime(2024, 2, 1, tzinfo=dt_timezone.utc)),
+        ])
+
+    def test_archive_month_moves_entries_to_the_archive(self):
+        months = archive.get_archivable_months(1, now=datetime(2024, 3, 15, tzinfo=dt_timezone.utc))
+        self.assertEqual(months, [archive.month_start(2024, 1)])
+
+        path, count = archive.archive_month(months[0])
+
+        self.assertEqual(count, 26)
+        self.assertTrue(path.exists())
+        self.assertEqual(AuditLog.objects.count(), 1)
+        self.assertEqual(archive.list_archived_months(), ['2024-01'])
+        entries = list(archive.iter_archived_entries('2024-01', action='delete'))
+        self.assertEqual([entry['object_repr'] for entry in entries], ['gone'])
+        self.assertEqual(entries[0]['user_email'], 'admin@acme.com')
+        # 'entry 2' and 'entry 20' to 'entry 24'
+        self.assertEqual(len(list(archive.iter_archived_entries('2024-01', search='ENTRY 2'))), 6)
+
+    def test_archiving_a_month_again_keeps_the_first_file(self):
+        start = archive.month_start(2024, 1)
+        archive.archive_month(start)
+        AuditLog.objects.create(user=self.user, action='update', timestamp=datetime(2024, 1, 20, tzinfo=dt_timezone.utc))
+
+        archive.archive_month(start)
+
+        self.assertEqual(len(list(archive.iter_archived_entries('2024-01'))), 27)
+
+    def test_archived_view_pages_oldest_first(self):
+        archive.archive_month(archive.month_start(2024, 1))
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(
+            username='root', email='root@acme.com', password='secret', role=Role.objects.create(nombre='super_admin')
+        ))
+        url = '/api/v1/panel/audit-logs/archived/'
+
+        self.assertEqual(client.get(url).data, {'months': ['2024-01']})
+        first = client.get(url, {'month': '2024-01', 'action': 'update'}).data
+        second = client.get(url, {'month': '2024-01', 'action': 'update', 'page': 2}).data
+
+        self.assertEqual([entry['object_repr'] for entry in first['results']], [f'entry {index}' for index in range(20)])
+        self.assertIsNotNone(first['next'])
+        self.assertEqual(len(second['results']), 5)
+        self.assertIsNone(second['next'])
+        self.assertEqual(client.get(url, {'month': '2024-1'}).status_code, 400)
+        self.assertEqual(client.get(url, {'month': '2024-01', 'page': 0}).status_code, 400)
+
+    def test_ensure_partitions_is_a_no_op_without_partitioning(self):
+        self.assertEqual(archive.ensure_partitions(), [])
+
+    def test_create_partition_moves_stranded_default_rows(self):
+        cursor = RecordingCursor((None, 'panel_auditlog_default'), (True,))
+
+        archive.create_partition(cursor, archive.month_start(2024, 1))
+
+        self.assertEqual(
+            cursor.statements, ['to_regclass', 'EXISTS', 'DETACH', 'CREATE', 'INSERT', 'DELETE', 'ATTACH']
+        )
+
+    def test_create_partition_skips_existing_partitions(self):
+        cursor = RecordingCursor(('panel_auditlog_y2024m01', 'panel_auditlog_default'))
+
+        archive.create_partition(cursor, archive.month_start(2024, 1))
+
+        self.assertEqual(cursor.statements, ['to_regclass'])
+
+
+class BulkTagTests(PanelTestCase):
+    """bulk_tag/bulk_untag and their replay in point-in-time lookups"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.otro = Dominio.objects.create(nombre='otro.com', empresa=self.empresa)
+        self.tag = Tag.objects.create(nombre='prod', empresa=self.empresa)
+        self.domain_ids = [str(self.dominio.pk), str(self.otro.pk)]
+
+    def post(self, operation):
+        response = self.client.post(
+            f'/api/v1/panel/dominios/{operation}/',
+            {'domain_ids': self.domain_ids, 'tag_ids': [str(self.tag.pk)]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def tags_as_of(self, when):
+        response = self.client.get(f'/api/v1/panel/dominios/{self.dominio.pk}/', {'as_of': when.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        return response.data['dominio']['tags']
+
+    def test_counts_only_the_links_that_changed(self):
+        self.dominio.tags.add(self.tag)
+
+        self.assertEqual(self.post('bulk_tag')['added_count'], 1)
+        self.assertEqual(self.post('bulk_tag')['added_count'], 0)
+        self.assertEqual(self.post('bulk_untag')['removed_count'], 2)
+        self.assertEqual(self.post('bulk_untag')['removed_count'], 0)
+
+    def test_logs_one_entry_and_takes_no_checkpoints(self):
+        self.post('bulk_tag')
+
+        entry = AuditLog.objects.get(action='bulk_operation')
+        self.assertEqual(entry.changes['operation'], 'bulk_tag')
+        self.assertEqual(sorted(entry.changes['domain_ids']), sorted(self.domain_ids))
+        self.assertFalse(DominioCheckpoint.objects.exists())
+
+    def test_lookups_replay_tag_operations(self):
+        take_checkpoints(Dominio.objects.all())
+        before_tag = timezone.now()
+        self.post('bulk_tag')
+        before_untag = timezone.now()
+        self.post('bulk_untag')
+
+        self.assertEqual(self.tags_as_of(before_tag), [])
+        self.assertEqual(self.tags_as_of(before_untag), [str(self.tag.pk)])
+        self.assertEqual(self.tags_as_of(timezone.now()), [])
+
+    def test_tagged_domains_count_as_changed_for_checkpoints(self):
+        take_checkpoints(Dominio.objects.all())
+        self.post('bulk_tag')
+
+        out = io.StringIO()
+        call_command('checkpoint_domains', interval_hours=0, stdout=out)
+        self.assertIn('Created 2 checkpoints', out.getvalue())
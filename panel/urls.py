@@ -2,7 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     DominioViewSet, DNSRecordViewSet, TagViewSet,
-    AuditLogViewSet, SystemSettingViewSet
+    AuditLogViewSet, SystemSettingViewSet, BulkJobViewSet, DashboardView
 )
 
 router = DefaultRouter()
@@ -10,8 +10,10 @@ router.register(r'tags', TagViewSet, basename='tag')
 router.register(r'dominios', DominioViewSet, basename='dominio')
 router.register(r'dns-records', DNSRecordViewSet, basename='dnsrecord')
 router.register(r'audit-logs', AuditLogViewSet, basename='auditlog')
+router.register(r'bulk-jobs', BulkJobViewSet, basename='bulkjob')
 router.register(r'system-settings', SystemSettingViewSet, basename='systemsetting')
 
 urlpatterns = [
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,5 +1,21 @@
+import csv
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import orjson
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
-from .models import AuditLog
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connections
+from django.db.models import Count, Q
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+from .audit import audit_writer
+from .models import AuditLog, Dominio
+
+logger = logging.getLogger(__name__)
 
 def get_client_ip(request):
     """Get the client IP address from the request"""
@@ -12,30 +28,75 @@ def get_client_ip(request):
 
 def log_audit_event(user, action, content_object=None, changes=None, ip_address=None, user_agent=None):
     """
-    Create an audit log entry
+    Queue an audit log entry on the audit writer (see panel.audit)
     """
-    audit_data = {
-        'user': user,
-        'action': action,
-        'ip_address': ip_address,
-        'user_agent': user_agent,
-        'changes': changes or {}
-    }
-    
-    # Set empresa from user or content_object
-    if user and user.empresa:
-        audit_data['empresa'] = user.empresa
-    elif content_object and hasattr(content_object, 'empresa'):
-        audit_data['empresa'] = content_object.empresa
-    
-    if content_object:
-        audit_data.update({
-            'content_type': ContentType.objects.get_for_model(content_object),
-            'object_id': str(content_object.pk),  # Convert to string for UUID support
-            'object_repr': str(content_object)
-        })
-    
-    AuditLog.objects.create(**audit_data)
+    entry = AuditLog(
+        user=user,
+        action=action,
+        timestamp=timezone.now(),
+        ip_address=ip_address,
+        user_agent=user_agent,
+        changes=changes or {}
+    )
+
+    # Set empresa from user or content_object, without loading either
+    if user and user.empresa_id:
+        entry.empresa_id = user.empresa_id
+    elif content_object is not None and hasattr(content_object, 'empresa_id'):
+        entry.empresa_id = content_object.empresa_id
+
+    if content_object is not None:
+        entry.content_type = ContentType.objects.get_for_model(content_object)
+        entry.object_id = str(content_object.pk)  # Convert to string for UUID support
+        entry.object_repr = str(content_object)[:200]
+
+    audit_writer.write(entry)
+
+# Never copied into audit entries
+AUDIT_EXCLUDED_FIELDS = {'password', 'hashed_secret'}
+
+_json_encoder = DjangoJSONEncoder()
+
+def to_json_value(value):
+    """
+    Convert a model field value to something JSONField can store
+    """
+    if value is None or isinstance(value, (str, int, float, bool, list, dict)):
+        return value
+    return _json_encoder.default(value)
+
+def get_model_snapshot(instance, m2m_fields=()):
+    """
+    JSON-ready values of the instance's concrete fields (plus the given many-to-many
+    fields as sorted primary key lists), for field-level audit diffs.
+    auto_now fields are left out since they change on every save.
+    """
+    deferred = instance.get_deferred_fields()
+    snapshot = {}
+    for field in instance._meta.concrete_fields:
+        if field.name in AUDIT_EXCLUDED_FIELDS or field.attname in deferred or getattr(field, 'auto_now', False):
+            continue
+        snapshot[field.name] = to_json_value(field.value_from_object(instance))
+
+    for field_name in m2m_fields:
+        pks = getattr(instance, field_name).values_list('pk', flat=True)
+        snapshot[field_name] = sorted(str(pk) for pk in pks)
+    return snapshot
+
+def save_with_changes(serializer, **kwargs):
+    """
+    Save an update serializer and return (instance, changes), where changes only
+    holds the model fields whose value changed. Many-to-many fields are only
+    compared when they were part of the update.
+    """
+    instance = serializer.instance
+    m2m_fields = [
+        field.name for field in instance._meta.many_to_many
+        if field.name in serializer.validated_data
+    ]
+    old_values = get_model_snapshot(instance, m2m_fields)
+    instance = serializer.save(**kwargs)
+    return instance, AuditLog.diff_values(old_values, get_model_snapshot(instance, m2m_fields))
 
 def validate_domain_name(domain_name):
     """
@@ -123,7 +184,7 @@ def format_dns_record_for_display(record):
     """
     display_value = record.valor
     
-    if record.tipo == 'MX' and record.prioridad:
+    if record.tipo == 'MX' and record.prioridad is not None:
         display_value = f"{record.prioridad} {record.valor}"
     elif record.tipo == 'DKIM' and len(record.valor) > 50:
         display_value = record.valor[:50] + "..."
@@ -136,27 +197,209 @@ def format_dns_record_for_display(record):
         'status': record.estado
     }
 
-def get_domain_health_score(domain):
+def calculate_health_score(total_records, valid_records, invalid_records, error_records):
     """
-    Calculate a health score for a domain based on its DNS records
+    Health score (0-100) from a domain's DNS record counts
     """
-    records = domain.registros.all()
-    total_records = records.count()
-    
     if total_records == 0:
         return 0
-    
-    valid_records = records.filter(estado='valid').count()
-    invalid_records = records.filter(estado='invalid').count()
-    error_records = records.filter(estado='error').count()
-    
+
     # Calculate score (0-100)
     score = (valid_records / total_records) * 100
-    
+
     # Penalize errors more than invalid records
     error_penalty = (error_records / total_records) * 20
     invalid_penalty = (invalid_records / total_records) * 10
-    
+
     final_score = max(0, score - error_penalty - invalid_penalty)
-    
-    return round(final_score, 1)
\ No newline at end of file
+
+    return round(final_score, 1)
+
+def get_domain_health_score(domain):
+    """
+    Calculate a health score for a domain based on its DNS records
+    """
+    counts = domain.registros.aggregate(
+        total=Count('id'),
+        valid=Count('id', filter=Q(estado='valid')),
+        invalid=Count('id', filter=Q(estado='invalid')),
+        error=Count('id', filter=Q(estado='error')),
+    )
+    return calculate_health_score(counts['total'], counts['valid'], counts['invalid'], counts['error'])
+
+HEALTH_BUCKETS = [
+    # (bucket, minimum score)
+    ('saludable', 80),
+    ('advertencia', 50),
+    ('critico', 0),
+]
+
+def get_health_distribution(queryset):
+    """
+    Count domains per health bucket in a single query
+    """
+    distribution = {bucket: 0 for bucket, _ in HEALTH_BUCKETS}
+    distribution['sin_registros'] = 0
+
+    rows = queryset.order_by().annotate(
+        total=Count('registros'),
+        valid=Count('registros', filter=Q(registros__estado='valid')),
+        invalid=Count('registros', filter=Q(registros__estado='invalid')),
+        error=Count('registros', filter=Q(registros__estado='error')),
+    ).values_list('total', 'valid', 'invalid', 'error')
+
+    for total, valid, invalid, error in rows.iterator():
+        if total == 0:
+            distribution['sin_registros'] += 1
+            continue
+        score = calculate_health_score(total, valid, invalid, error)
+        for bucket, minimum in HEALTH_BUCKETS:
+            if score >= minimum:
+                distribution[bucket] += 1
+                break
+
+    return distribution
+
+def get_domain_stats(queryset):
+    """
+    Domain counts by status, compliance level and DMARC policy in a single query
+    """
+    distributions = [
+        ('por_status', 'status', Dominio.STATUS_CHOICES),
+        ('por_compliance', 'compliance_level', Dominio.COMPLIANCE_CHOICES),
+        ('por_dmarc_policy', 'dmarc_policy', Dominio.DMARC_POLICY_CHOICES),
+    ]
+
+    aggregates = {
+        'total_dominios': Count('id'),
+        'dominios_activos': Count('id', filter=Q(activo=True)),
+    }
+    for key, field, choices in distributions:
+        for value, _ in choices:
+            aggregates[f'{key}_{value}'] = Count('id', filter=Q(**{field: value}))
+
+    counts = queryset.order_by().aggregate(**aggregates)
+
+    stats = {
+        'total_dominios': counts['total_dominios'],
+        'dominios_activos': counts['dominios_activos'],
+    }
+    for key, field, choices in distributions:
+        stats[key] = {value: counts[f'{key}_{value}'] for value, _ in choices}
+    return stats
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _run_with_own_connection(func):
+    # Each pool thread keeps its own connection across tasks, like a request thread
+    # does between requests: drop it only when it is broken or older than CONN_MAX_AGE
+    close_old_connections()
+    try:
+        return func()
+    finally:
+        close_old_connections()
+
+def run_in_parallel(tasks):
+    """
+    Run independent callables on a small shared thread pool, each on its own
+    database connection, and return their results keyed like ``tasks``
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'PARALLEL_QUERY_WORKERS', 4),
+                    thread_name_prefix='panel-query'
+                )
+
+    futures = {key: _executor.submit(_run_with_own_connection, func) for key, func in tasks.items()}
+    return {key: future.result() for key, future in futures.items()}
+
+_background_executor = None
+
+def _run_in_background(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception("Background task %r failed", func)
+    finally:
+        connections.close_all()
+
+def run_in_background(func, *args, **kwargs):
+    """
+    Fire-and-forget ``func(*args, **kwargs)`` on a background thread with its own
+    database connection, for side effects that should not delay the response.
+    Failures are logged, not raised.
+    """
+    global _background_executor
+    if _background_executor is None:
+        _background_executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'BACKGROUND_TASK_WORKERS', 2),
+            thread_name_prefix='panel-background'
+        )
+    _background_executor.submit(_run_in_background, func, args, kwargs)
+
+def chunked(iterable, size):
+    """
+    Yield lists of at most ``size`` items from ``iterable``
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+class Echo:
+    """
+    File-like object whose write() returns the value, for streaming csv.writer output
+    """
+    def write(self, value):
+        return value
+
+def _buffered(lines, buffer_size=64 * 1024):
+    """Join small lines into ~64KB chunks so the response is not written row by row"""
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= buffer_size:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+def stream_csv(rows, columns):
+    """
+    Stream ``rows`` (dicts) as CSV bytes with a header of ``columns``
+    """
+    writer = csv.writer(Echo())
+    encoder = JSONEncoder()
+
+    def format_value(value):
+        if value is None:
+            return ''
+        if isinstance(value, (str, int, float)):
+            return value
+        if isinstance(value, (list, tuple)):
+            return ';'.join(str(item) for item in value)
+        return encoder.default(value)
+
+    def lines():
+        yield writer.writerow(columns).encode()
+        for row in rows:
+            yield writer.writerow([format_value(row[column]) for column in columns]).encode()
+
+    return _buffered(lines())
+
+def stream_ndjson(rows):
+    """
+    Stream ``rows`` (dicts) as newline-delimited JSON bytes
+    """
+    default = JSONEncoder().default
+    option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_APPEND_NEWLINE
+    return _buffered(orjson.dumps(row, default=default, option=option) for row in rows)
@@ -1,21 +1,178 @@
+import io
+import re
+from datetime import datetime, time
+from itertools import islice
+
 from rest_framework import viewsets, permissions, status, filters, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Count
+from django.db import connection, transaction, IntegrityError
+from django.db.models import Q, Count, F
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.core.exceptions import FieldDoesNotExist
 from django.contrib.contenttypes.models import ContentType
-from .models import Dominio, DNSRecord, Tag, AuditLog, SystemSetting
+from .models import Dominio, DNSRecord, Tag, AuditLog, SystemSetting, BulkJob
 from .serializers import (
-    DominioSerializer, DominioListSerializer, DNSRecordSerializer,
+    SparseFieldsetMixin, DominioSerializer, DominioListSerializer, DNSRecordSerializer,
     TagSerializer, AuditLogSerializer, SystemSettingSerializer,
-    BulkDomainUpdateSerializer, BulkDNSRecordCreateSerializer
+    DNSRecordValuesSerializer, AuditLogValuesSerializer,
+    BulkDomainUpdateSerializer, BulkDomainTagSerializer, BulkDNSRecordCreateSerializer, BulkJobSerializer
 )
 from accounts.models import Empresa
+from accounts.serializers import UserProfileSerializer
+from .filters import TrigramSearchFilter
 from .permissions import CanManageDomain, CanManageCompanyData, IsReadOnlyOrCanEdit
-from .utils import log_audit_event, get_client_ip
-from accounts.permissions import IsSuperAdmin
+from .utils import (
+    log_audit_event, get_client_ip, save_with_changes, get_model_snapshot, to_json_value, chunked, stream_csv, stream_ndjson,
+    get_domain_stats, get_health_distribution, run_in_parallel
+)
+from .archive import list_archived_months, iter_archived_entries
+from .bulk import BulkConflictError, bulk_upsert_dns_records, ON_CONFLICT_CHOICES
+from . import domain_import, zonefile
+from .history import reconstruct_domain, take_checkpoint
+from .jobs import create_bulk_update_job, update_domains
+from accounts.permissions import IsSuperAdmin, CanEditConfig
+
+class SparseFieldsetViewMixin:
+    """
+    Trim the queryset to the sparse fieldset requested with ``?fields=``/``?expand=``.
+
+    Only the columns backing rendered fields are loaded, and joins or prefetches
+    are only added for relations that are actually rendered.
+    ``sparse_required_fields`` lists columns that must always be loaded (e.g. the
+    ones object permissions look at).
+    """
+    sparse_required_fields = []
+
+    def get_requested_fields(self):
+        serializer_class = self.get_serializer_class()
+        if not issubclass(serializer_class, SparseFieldsetMixin):
+            return None
+        return serializer_class.get_requested_fields(self.request)
+
+    def trim_queryset(self, queryset):
+        model = queryset.model
+        only = {model._meta.pk.name, *self.sparse_required_fields}
+        select_related = set()
+        prefetch_related = set()
+
+        serializer = self.get_serializer()
+        for field in serializer.fields.values():
+            if field.source == '*':
+                continue
+            try:
+                model_field = model._meta.get_field(field.source_attrs[0])
+            except FieldDoesNotExist:
+                # Properties and annotations are handled by the viewset
+                continue
+
+            if model_field.many_to_many or model_field.one_to_many:
+                prefetch_related.add(model_field.name)
+            elif model_field.is_relation and len(field.source_attrs) > 1:
+                select_related.add(model_field.name)
+                only.update([model_field.name, '__'.join(field.source_attrs[:2])])
+            else:
+                only.add(model_field.name)
+
+        return queryset.select_related(*select_related).prefetch_related(*prefetch_related).only(*only)
+
+class ValuesListMixin:
+    """
+    Opt-in fast path for list actions.
+
+    Viewsets that set ``values_serializer_class`` render list pages from
+    ``.values()`` rows instead of running the model serializer field by field.
+    The output is byte-identical to the regular serializer.
+    """
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        if self.values_serializer_class is None:
+            return super().list(request, *args, **kwargs)
+
+        values_serializer = self.values_serializer_class(context=self.get_serializer_context())
+        queryset = values_serializer.get_queryset(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(values_serializer.to_representation(page))
+        return Response(values_serializer.to_representation(queryset))
+
+class AuditHistoryMixin:
+    """
+    ``history`` action returning the audit trail of one object, newest first.
+
+    The lookup is (content_type, object_id) ordered by timestamp, which the
+    ``auditlog_object_history_idx`` index serves directly, so it reads only the
+    object's own entries however large the tenant's log is.
+    """
+
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """Audit trail of this object"""
+        instance = self.get_object()
+        queryset = AuditLog.objects.filter(
+            content_type=ContentType.objects.get_for_model(instance),
+            object_id=str(instance.pk)
+        ).order_by('-timestamp')
+
+        values_serializer = AuditLogValuesSerializer(context=self.get_serializer_context())
+        queryset = values_serializer.get_queryset(queryset)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(values_serializer.to_representation(page))
+        return Response(values_serializer.to_representation(queryset))
+
+class ExportMixin:
+    """
+    Streaming CSV/NDJSON export of the filtered queryset.
+
+    ``export_columns`` maps output columns to ``values()`` lookups. Rows are read
+    with ``iterator(chunk_size=...)`` (a server-side cursor on PostgreSQL), so
+    memory stays flat whatever the number of rows exported.
+    """
+    export_columns = {}
+    export_chunk_size = 2000
+    export_formats = {
+        'csv': 'text/csv',
+        'ndjson': 'application/x-ndjson',
+    }
+
+    def get_export_columns(self):
+        return list(self.export_columns)
 
-class TagViewSet(viewsets.ModelViewSet):
+    def get_export_rows(self, queryset):
+        lookups = list(self.export_columns.values())
+        for row in queryset.prefetch_related(None).values(*lookups).iterator(chunk_size=self.export_chunk_size):
+            yield {column: row[lookup] for column, lookup in self.export_columns.items()}
+
+    def export_response(self, request, basename):
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in self.export_formats:
+            return Response(
+                {'error': f"export_format must be one of: {', '.join(self.export_formats)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        rows = self.get_export_rows(self.filter_queryset(self.get_queryset()))
+        if export_format == 'csv':
+            content = stream_csv(rows, self.get_export_columns())
+        else:
+            content = stream_ndjson(rows)
+
+        response = StreamingHttpResponse(content, content_type=self.export_formats[export_format])
+        filename = f"{basename}-{timezone.now():%Y%m%d%H%M%S}.{export_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+class TagViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     serializer_class = TagSerializer
     permission_classes = [permissions.IsAuthenticated, CanManageCompanyData]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -25,10 +182,15 @@ class TagViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.is_super_admin:
-            return Tag.objects.all()
+            queryset = Tag.objects.all()
         elif user.empresa:
-            return Tag.objects.filter(empresa=user.empresa)
-        return Tag.objects.none()
+            queryset = Tag.objects.filter(empresa=user.empresa)
+        else:
+            return Tag.objects.none()
+
+        if self.get_requested_fields() is not None:
+            return self.trim_queryset(queryset)
+        return queryset
 
     def perform_create(self, serializer):
         tag = serializer.save()
@@ -40,14 +202,39 @@ class TagViewSet(viewsets.ModelViewSet):
             user_agent=self.request.META.get('HTTP_USER_AGENT', '')
         )
 
-class DominioViewSet(viewsets.ModelViewSet):
+class DominioViewSet(AuditHistoryMixin, ExportMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     serializer_class = DominioSerializer
     permission_classes = [permissions.IsAuthenticated, CanManageDomain]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter, filters.OrderingFilter]
     filterset_fields = ['activo', 'status', 'compliance_level', 'dmarc_policy', 'tags']
     search_fields = ['nombre']
     ordering_fields = ['nombre', 'creado_en', 'actualizado_en', 'last_dns_check']
     ordering = ['-creado_en']
+    sparse_required_fields = ['empresa']
+    throttle_scopes = {
+        'check_dns': 'check_dns',
+        'bulk_update': 'bulk',
+        'import_zone': 'bulk',
+        'import_domains': 'bulk',
+        'bulk_tag': 'bulk',
+        'bulk_untag': 'bulk',
+    }
+    export_columns = {
+        'id': 'id',
+        'nombre': 'nombre',
+        'empresa': 'empresa__nombre',
+        'activo': 'activo',
+        'status': 'status',
+        'compliance_level': 'compliance_level',
+        'dmarc_policy': 'dmarc_policy',
+        'dns_provider': 'dns_provider',
+        'notification_email': 'notification_email',
+        'expiration_date': 'expiration_date',
+        'last_dns_check': 'last_dns_check',
+        'dns_check_status': 'dns_check_status',
+        'creado_en': 'creado_en',
+        'actualizado_en': 'actualizado_en',
+    }
 
     def get_serializer_class(self):
         if self.action == 'list':
@@ -56,13 +243,24 @@ class DominioViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        queryset = Dominio.objects.select_related('empresa').prefetch_related('tags', 'registros')
-        
         if user.is_super_admin:
-            return queryset
+            queryset = Dominio.objects.all()
         elif user.empresa:
-            return queryset.filter(empresa=user.empresa)
-        return Dominio.objects.none()
+            queryset = Dominio.objects.filter(empresa=user.empresa)
+        else:
+            return Dominio.objects.none()
+
+        if self.action not in ('list', 'retrieve'):
+            return queryset.select_related('empresa')
+
+        requested = self.get_requested_fields()
+        if requested is None:
+            return queryset.select_related('empresa').prefetch_related('tags').with_dns_record_counts()
+
+        queryset = self.trim_queryset(queryset)
+        if requested & {'total_dns_records', 'valid_dns_records'}:
+            queryset = queryset.with_dns_record_counts()
+        return queryset
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -70,30 +268,87 @@ class DominioViewSet(viewsets.ModelViewSet):
             raise serializers.ValidationError("El usuario no tiene una empresa asignada")
 
         dominio = serializer.save(empresa=user.empresa)
+        take_checkpoint(dominio)
 
         log_audit_event(
             user=user,
             action='create',
             content_object=dominio,
+            changes=AuditLog.diff_values({}, get_model_snapshot(dominio, ['tags'])),
             ip_address=get_client_ip(self.request),
             user_agent=self.request.META.get('HTTP_USER_AGENT', '')
         )
 
     def perform_update(self, serializer):
-        old_instance = self.get_object()
-        old_values = DominioSerializer(old_instance).data
-        dominio = serializer.save()
-        new_values = DominioSerializer(dominio).data
-        
+        dominio, changes = save_with_changes(serializer)
+
         log_audit_event(
             user=self.request.user,
             action='update',
             content_object=dominio,
-            changes={'old': old_values, 'new': new_values},
+            changes=changes,
             ip_address=get_client_ip(self.request),
             user_agent=self.request.META.get('HTTP_USER_AGENT', '')
         )
 
+    def perform_destroy(self, instance):
+        changes = AuditLog.diff_values(get_model_snapshot(instance, ['tags']), {})
+        log_audit_event(
+            user=self.request.user,
+            action='delete',
+            content_object=instance,
+            changes=changes,
+            ip_address=get_client_ip(self.request),
+            user_agent=self.request.META.get('HTTP_USER_AGENT', '')
+        )
+        instance.delete()
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        With ``?as_of=`` (ISO datetime, or a date meaning the end of that day),
+        return the domain and its DNS records as they were at that moment.
+        """
+        as_of = request.query_params.get('as_of')
+        if not as_of:
+            return super().retrieve(request, *args, **kwargs)
+
+        as_of_datetime = parse_datetime(as_of)
+        if as_of_datetime is None:
+            as_of_date = parse_date(as_of)
+            if as_of_date is None:
+                return Response({'error': 'as_of must be an ISO date or datetime'}, status=status.HTTP_400_BAD_REQUEST)
+            as_of_datetime = datetime.combine(as_of_date, time.max)
+        if timezone.is_naive(as_of_datetime):
+            as_of_datetime = timezone.make_aware(as_of_datetime)
+
+        state = reconstruct_domain(self.get_object(), as_of_datetime)
+        if state is None:
+            return Response({'error': 'No history available at that date'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'as_of': as_of_datetime, **state})
+
+    def get_export_columns(self):
+        return super().get_export_columns() + ['tags']
+
+    def get_export_rows(self, queryset):
+        """Add the tag names, looked up once per chunk of domains"""
+        through = Dominio.tags.through
+        for chunk in chunked(super().get_export_rows(queryset), self.export_chunk_size):
+            tag_names = {}
+            tag_links = through.objects.filter(
+                dominio_id__in=[row['id'] for row in chunk]
+            ).values_list('dominio_id', 'tag__nombre')
+            for dominio_id, tag_nombre in tag_links:
+                tag_names.setdefault(dominio_id, []).append(tag_nombre)
+
+            for row in chunk:
+                row['tags'] = sorted(tag_names.get(row['id'], []))
+                yield row
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream the filtered domains as CSV or NDJSON"""
+        return self.export_response(request, 'dominios')
+
     @action(detail=True, methods=['get'])
     def dns_records(self, request, pk=None):
         """Get all DNS records for a specific domain"""
@@ -120,85 +375,317 @@ class DominioViewSet(viewsets.ModelViewSet):
         
         return Response({'message': 'DNS check initiated'})
 
+    @action(detail=True, methods=['post'])
+    def import_zone(self, request, pk=None):
+        """
+        Import a BIND zone file, uploaded as ``file`` (multipart) or sent as ``zone`` text.
+        ``on_conflict`` (fail/skip/update) handles records that already exist.
+        """
+        dominio = self.get_object()
+        on_conflict = request.data.get('on_conflict', 'fail')
+        if on_conflict not in ON_CONFLICT_CHOICES:
+            return Response(
+                {'error': f"on_conflict must be one of: {', '.join(ON_CONFLICT_CHOICES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        upload = request.FILES.get('file')
+        if upload is not None:
+            zone_file = io.TextIOWrapper(upload.file, encoding='utf-8')
+        elif isinstance(request.data.get('zone'), str):
+            zone_file = io.StringIO(request.data['zone'])
+        else:
+            return Response(
+                {'error': 'Zone file required (file or zone)'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            summary = zonefile.import_zone(dominio, zone_file, user=request.user, on_conflict=on_conflict)
+        except zonefile.ZoneImportError as exc:
+            return Response(
+                {'error': 'Invalid zone file', 'errors': exc.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except UnicodeDecodeError:
+            return Response(
+                {'error': 'Zone file must be UTF-8'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except BulkConflictError as exc:
+            return Response(
+                {'error': 'Some records already exist', 'conflicts': exc.conflicts},
+                status=status.HTTP_409_CONFLICT
+            )
+        except IntegrityError:
+            return Response(
+                {'error': 'Records changed during the operation, retry'},
+                status=status.HTTP_409_CONFLICT
+            )
+        take_checkpoint(dominio)
+
+        log_audit_event(
+            user=self.request.user,
+            action='bulk_operation',
+            content_object=dominio,
+            changes={'operation': 'import_zone', 'on_conflict': on_conflict, **summary},
+            ip_address=get_client_ip(self.request),
+            user_agent=self.request.META.get('HTTP_USER_AGENT', '')
+        )
+
+        return Response(summary)
+
+    @action(detail=True, methods=['get'])
+    def export_zone(self, request, pk=None):
+        """Stream the domain's records as a BIND zone file"""
+        dominio = self.get_object()
+        response = StreamingHttpResponse(zonefile.export_zone(dominio), content_type='text/dns')
+        response['Content-Disposition'] = f'attachment; filename="{dominio.nombre}.zone"'
+        return response
+
+    @action(detail=False, methods=['post'], permission_classes=[CanEditConfig])
+    def import_domains(self, request):
+        """
+        Create domains from a CSV or NDJSON ``file`` in the domain export format.
+        ``on_conflict`` (fail/skip/update) handles names that already exist.
+        Super admins pass ``empresa``; other users import into their own.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'File required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        import_format = request.data.get('import_format') or upload.name.rsplit('.', 1)[-1].lower()
+        if import_format == 'jsonl':
+            import_format = 'ndjson'
+        if import_format not in domain_import.IMPORT_FORMATS:
+            return Response(
+                {'error': f"import_format must be one of: {', '.join(domain_import.IMPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        on_conflict = request.data.get('on_conflict', 'fail')
+        if on_conflict not in ON_CONFLICT_CHOICES:
+            return Response(
+                {'error': f"on_conflict must be one of: {', '.join(ON_CONFLICT_CHOICES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        user = request.user
+        if user.is_super_admin and request.data.get('empresa'):
+            empresa = Empresa.objects.filter(pk=request.data['empresa']).first()
+            if empresa is None:
+                return Response({'error': 'Empresa not found'}, status=status.HTTP_400_BAD_REQUEST)
+        elif user.empresa_id:
+            empresa = user.empresa
+        else:
+            return Response(
+                {'error': 'El usuario no tiene una empresa asignada'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            summary = domain_import.import_domains(
+                empresa, domain_import.iter_rows(upload.file, import_format),
+                user=user, on_conflict=on_conflict
+            )
+        except domain_import.DomainImportError as exc:
+            return Response(
+                {'error': 'Invalid import file', 'errors': exc.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except UnicodeDecodeError:
+            return Response({'error': 'File must be UTF-8'}, status=status.HTTP_400_BAD_REQUEST)
+        except BulkConflictError as exc:
+            return Response(
+                {'error': 'Some domains already exist', 'conflicts': exc.conflicts},
+                status=status.HTTP_409_CONFLICT
+            )
+        except IntegrityError:
+            return Response(
+                {'error': 'Domains changed during the operation, retry'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        log_audit_event(
+            user=user,
+            action='bulk_operation',
+            content_object=empresa,
+            changes={'operation': 'import_domains', 'on_conflict': on_conflict, **summary},
+            ip_address=get_client_ip(request),
+            user_agent=request.META.get('HTTP_USER_AGENT', '')
+        )
+
+        return Response(summary)
+
     @action(detail=False, methods=['post'])
     def bulk_update(self, request):
-        """Bulk update multiple domains"""
+        """
+        Bulk update multiple domains. Up to BULK_UPDATE_SYNC_LIMIT domains are updated
+        in the request; larger sets, or ``run_async``, become a background job
+        (202 with the job, see BulkJobViewSet).
+        """
         serializer = BulkDomainUpdateSerializer(data=request.data)
-        if serializer.is_valid():
-            domain_ids = serializer.validated_data['domain_ids']
-            updates = serializer.validated_data['updates']
-            
-            # Check permissions for all domains
-            domains = self.get_queryset().filter(id__in=domain_ids)
-            if len(domains) != len(domain_ids):
-                return Response(
-                    {'error': 'Some domains not found or access denied'},
-                    status=status.HTTP_403_FORBIDDEN
-                )
-            
-            # Perform bulk update
-            updated_count = domains.update(**updates)
-            
+        serializer.is_valid(raise_exception=True)
+        domain_ids = serializer.validated_data['domain_ids']
+        updates = {field: to_json_value(value) for field, value in serializer.validated_data['updates'].items()}
+
+        # Check permissions for all domains
+        accessible = self.get_queryset().filter(id__in=domain_ids).count()
+        if accessible != len(domain_ids):
+            return Response(
+                {'error': 'Some domains not found or access denied'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        if serializer.validated_data['run_async'] or len(domain_ids) > settings.BULK_UPDATE_SYNC_LIMIT:
+            job = create_bulk_update_job(request.user, domain_ids, updates)
             log_audit_event(
                 user=self.request.user,
                 action='bulk_operation',
-                changes={'operation': 'bulk_update', 'domain_ids': domain_ids, 'updates': updates},
+                content_object=job,
+                changes={'operation': 'bulk_update', 'job': str(job.pk), 'count': job.total, 'updates': updates},
                 ip_address=get_client_ip(self.request),
                 user_agent=self.request.META.get('HTTP_USER_AGENT', '')
             )
-            
-            return Response({'updated_count': updated_count})
-        
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            return Response(BulkJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+        empresa_id = None if request.user.is_super_admin else request.user.empresa_id
+        updated_count = update_domains(domain_ids, updates, empresa_id=empresa_id)
+
+        log_audit_event(
+            user=self.request.user,
+            action='bulk_operation',
+            changes={'operation': 'bulk_update', 'domain_ids': [str(pk) for pk in domain_ids], 'updates': updates},
+            ip_address=get_client_ip(self.request),
+            user_agent=self.request.META.get('HTTP_USER_AGENT', '')
+        )
+
+        return Response({'updated_count': updated_count})
+
+    def get_bulk_tag_targets(self, request):
+        """
+        Validated (domain ids, tag ids) of a bulk tag request, or an error Response.
+        Ownership is checked with one query for the domains and one for the tags:
+        all of them must be visible to the user and belong to the same empresa.
+        """
+        serializer = BulkDomainTagSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        domain_ids = serializer.validated_data['domain_ids']
+        tag_ids = serializer.validated_data['tag_ids']
+
+        domain_empresas = list(
+            self.get_queryset().filter(id__in=domain_ids).order_by().values_list('empresa_id', flat=True)
+        )
+        if len(domain_empresas) != len(domain_ids) or len(set(domain_empresas)) != 1:
+            return Response(
+                {'error': 'Some domains not found, access denied or in different companies'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        tag_empresas = list(Tag.objects.filter(id__in=tag_ids).order_by().values_list('empresa_id', flat=True))
+        if len(tag_empresas) != len(tag_ids) or set(tag_empresas) != set(domain_empresas):
+            return Response(
+                {'error': 'Some tags not found or not in the domains\' company'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return domain_ids, tag_ids
+
+    def log_bulk_tag(self, request, operation, domain_ids, tag_ids, count):
+        # The single entry for all domains; reconstruct_domain replays it per domain
+        log_audit_event(
+            user=request.user,
+            action='bulk_operation',
+            changes={
+                'operation': operation, 'count': count,
+                'domain_ids': [str(pk) for pk in domain_ids], 'tag_ids': [str(pk) for pk in tag_ids]
+            },
+            ip_address=get_client_ip(request),
+            user_agent=request.META.get('HTTP_USER_AGENT', '')
+        )
+
+    @action(detail=False, methods=['post'], permission_classes=[CanEditConfig])
+    def bulk_tag(self, request):
+        """Add ``tag_ids`` to every domain of ``domain_ids``, with one insert per tag"""
+        targets = self.get_bulk_tag_targets(request)
+        if isinstance(targets, Response):
+            return targets
+        domain_ids, tag_ids = targets
+
+        through = Dominio.tags.through
+        links = through.objects.filter(dominio_id__in=domain_ids, tag_id__in=tag_ids)
+        with transaction.atomic():
+            existing = links.count()
+            for tag_id in tag_ids:
+                # No batch_size: a single INSERT ... ON CONFLICT DO NOTHING where the backend allows it
+                through.objects.bulk_create(
+                    [through(dominio_id=dominio_id, tag_id=tag_id) for dominio_id in domain_ids],
+                    ignore_conflicts=True
+                )
+            # ignore_conflicts leaves no count of the rows actually inserted
+            added = links.count() - existing
+            self.log_bulk_tag(request, 'bulk_tag', domain_ids, tag_ids, added)
+
+        return Response({'domains': len(domain_ids), 'tags': len(tag_ids), 'added_count': added})
+
+    @action(detail=False, methods=['post'], permission_classes=[CanEditConfig])
+    def bulk_untag(self, request):
+        """Remove ``tag_ids`` from every domain of ``domain_ids``, with a single delete"""
+        targets = self.get_bulk_tag_targets(request)
+        if isinstance(targets, Response):
+            return targets
+        domain_ids, tag_ids = targets
+
+        with transaction.atomic():
+            removed, _ = Dominio.tags.through.objects.filter(
+                dominio_id__in=domain_ids, tag_id__in=tag_ids
+            ).delete()
+            self.log_bulk_tag(request, 'bulk_untag', domain_ids, tag_ids, removed)
+
+        return Response({'removed_count': removed})
 
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Get domain statistics"""
-        queryset = self.get_queryset()
-        
-        stats = {
-            'total_dominios': queryset.count(),
-            'dominios_activos': queryset.filter(activo=True).count(),
-            'por_status': {},
-            'por_compliance': {},
-            'por_dmarc_policy': {}
-        }
-        
-        # Status distribution
-        for choice in Dominio.STATUS_CHOICES:
-            count = queryset.filter(status=choice[0]).count()
-            stats['por_status'][choice[0]] = count
-        
-        # Compliance distribution
-        for choice in Dominio.COMPLIANCE_CHOICES:
-            count = queryset.filter(compliance_level=choice[0]).count()
-            stats['por_compliance'][choice[0]] = count
-        
-        # DMARC policy distribution
-        for choice in Dominio.DMARC_POLICY_CHOICES:
-            count = queryset.filter(dmarc_policy=choice[0]).count()
-            stats['por_dmarc_policy'][choice[0]] = count
-        
-        return Response(stats)
+        return Response(get_domain_stats(self.get_queryset()))
 
-class DNSRecordViewSet(viewsets.ModelViewSet):
+class DNSRecordViewSet(AuditHistoryMixin, ExportMixin, ValuesListMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     serializer_class = DNSRecordSerializer
+    values_serializer_class = DNSRecordValuesSerializer
     permission_classes = [permissions.IsAuthenticated, CanManageDomain]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter, filters.OrderingFilter]
     filterset_fields = ['tipo', 'estado', 'dominio', 'ttl']
     search_fields = ['nombre', 'valor', 'dominio__nombre']
+    throttle_scopes = {'bulk_create': 'bulk'}
     ordering_fields = ['tipo', 'nombre', 'creado_en', 'ultima_comprobacion']
     ordering = ['-creado_en']
+    sparse_required_fields = ['dominio']
+    export_columns = {
+        'id': 'id',
+        'dominio': 'dominio__nombre',
+        'tipo': 'tipo',
+        'nombre': 'nombre',
+        'valor': 'valor',
+        'ttl': 'ttl',
+        'prioridad': 'prioridad',
+        'estado': 'estado',
+        'selector': 'selector',
+        'policy': 'policy',
+        'ultima_comprobacion': 'ultima_comprobacion',
+        'creado_en': 'creado_en',
+        'actualizado_en': 'actualizado_en',
+    }
 
     def get_queryset(self):
         user = self.request.user
-        queryset = DNSRecord.objects.select_related('dominio', 'creado_por')
-        
         if user.is_super_admin:
-            return queryset
+            queryset = DNSRecord.objects.all()
         elif user.empresa:
-            return queryset.filter(dominio__empresa=user.empresa)
-        return DNSRecord.objects.none()
+            queryset = DNSRecord.objects.filter(dominio__empresa=user.empresa)
+        else:
+            return DNSRecord.objects.none()
+
+        if self.get_requested_fields() is not None:
+            return self.trim_queryset(queryset)
+        return queryset.select_related('dominio', 'creado_por')
 
     def perform_create(self, serializer):
         serializer.save(creado_por=self.request.user)
@@ -207,88 +694,205 @@ class DNSRecordViewSet(viewsets.ModelViewSet):
             user=self.request.user,
             action='create',
             content_object=serializer.instance,
+            changes=AuditLog.diff_values({}, get_model_snapshot(serializer.instance)),
             ip_address=get_client_ip(self.request),
             user_agent=self.request.META.get('HTTP_USER_AGENT', '')
         )
 
     def perform_update(self, serializer):
-        old_instance = self.get_object()
-        old_values = DNSRecordSerializer(old_instance).data
-        record = serializer.save()
-        new_values = DNSRecordSerializer(record).data
-        
+        record, changes = save_with_changes(serializer)
+
         log_audit_event(
             user=self.request.user,
             action='update',
             content_object=record,
-            changes={'old': old_values, 'new': new_values},
+            changes=changes,
             ip_address=get_client_ip(self.request),
             user_agent=self.request.META.get('HTTP_USER_AGENT', '')
         )
 
+    def perform_destroy(self, instance):
+        # The final values include the domain, which point-in-time lookups filter on
+        log_audit_event(
+            user=self.request.user,
+            action='delete',
+            content_object=instance,
+            changes=AuditLog.diff_values(get_model_snapshot(instance), {}),
+            ip_address=get_client_ip(self.request),
+            user_agent=self.request.META.get('HTTP_USER_AGENT', '')
+        )
+        instance.delete()
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream the filtered DNS records as CSV or NDJSON"""
+        return self.export_response(request, 'dns-records')
+
     @action(detail=False, methods=['post'])
     def bulk_create(self, request):
-        """Bulk create DNS records for a domain"""
+        """
+        Bulk create DNS records for a domain, in one transaction.
+        ``on_conflict`` (fail/skip/update) handles records that already exist.
+        """
         serializer = BulkDNSRecordCreateSerializer(data=request.data)
-        if serializer.is_valid():
-            domain_id = serializer.validated_data['domain_id']
-            records_data = serializer.validated_data['records']
-            
-            # Check domain access
-            try:
-                dominio = Dominio.objects.get(id=domain_id)
-                self.check_object_permissions(request, dominio)
-            except Dominio.DoesNotExist:
-                return Response(
-                    {'error': 'Domain not found'},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-            
-            # Create records
-            created_records = []
-            for record_data in records_data:
-                record_data['dominio'] = domain_id
-                record_data['creado_por'] = request.user.id
-                record_serializer = DNSRecordSerializer(data=record_data)
-                if record_serializer.is_valid():
-                    record = record_serializer.save()
-                    created_records.append(record)
-                else:
-                    return Response(record_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-            
-            log_audit_event(
-                user=self.request.user,
-                action='bulk_operation',
-                content_object=dominio,
-                changes={'operation': 'bulk_create_records', 'count': len(created_records)},
-                ip_address=get_client_ip(self.request),
-                user_agent=self.request.META.get('HTTP_USER_AGENT', '')
+        serializer.is_valid(raise_exception=True)
+        domain_id = serializer.validated_data['domain_id']
+        on_conflict = serializer.validated_data['on_conflict']
+
+        # Check domain access
+        try:
+            dominio = Dominio.objects.select_related('empresa').get(id=domain_id)
+        except Dominio.DoesNotExist:
+            return Response(
+                {'error': 'Domain not found'},
+                status=status.HTTP_404_NOT_FOUND
             )
-            
-            return Response({
-                'created_count': len(created_records),
-                'records': DNSRecordSerializer(created_records, many=True).data
-            })
-        
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        self.check_object_permissions(request, dominio)
+
+        try:
+            created, updated, skipped = bulk_upsert_dns_records(
+                dominio, serializer.validated_data['records'], user=request.user, on_conflict=on_conflict
+            )
+        except BulkConflictError as exc:
+            return Response(
+                {'error': 'Some records already exist', 'conflicts': exc.conflicts},
+                status=status.HTTP_409_CONFLICT
+            )
+        except IntegrityError:
+            # A record was created concurrently
+            return Response(
+                {'error': 'Records changed during the operation, retry'},
+                status=status.HTTP_409_CONFLICT
+            )
+        take_checkpoint(dominio)
 
-class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
+        log_audit_event(
+            user=self.request.user,
+            action='bulk_operation',
+            content_object=dominio,
+            changes={
+                'operation': 'bulk_create_records', 'on_conflict': on_conflict,
+                'count': len(created), 'updated': len(updated), 'skipped': skipped
+            },
+            ip_address=get_client_ip(self.request),
+            user_agent=self.request.META.get('HTTP_USER_AGENT', '')
+        )
+
+        return Response({
+            'created_count': len(created),
+            'updated_count': len(updated),
+            'skipped_count': skipped,
+            'records': DNSRecordSerializer(created, many=True).data
+        })
+
+class AuditLogViewSet(ValuesListMixin, SparseFieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = AuditLogSerializer
+    values_serializer_class = AuditLogValuesSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter, filters.OrderingFilter]
     filterset_fields = ['action', 'content_type', 'user', 'empresa']
     search_fields = ['object_repr', 'user__username', 'user__email']
     ordering = ['-timestamp']
 
     def get_queryset(self):
         user = self.request.user
-        queryset = AuditLog.objects.select_related('user', 'content_type', 'empresa')
-        
         if user.is_super_admin:
-            return queryset
+            queryset = AuditLog.objects.all()
         elif user.empresa:
-            return queryset.filter(empresa=user.empresa)
-        return AuditLog.objects.none()
+            queryset = AuditLog.objects.filter(empresa=user.empresa)
+        else:
+            return AuditLog.objects.none()
+
+        if self.get_requested_fields() is not None:
+            return self.trim_queryset(queryset)
+        return queryset.select_related('user', 'content_type', 'empresa')
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Ranked full-text search over object_repr, changed field names and values and user agent.
+        ``?q=`` takes web search syntax ("quoted phrase", or, -word); the regular filters apply.
+        """
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = DjangoFilterBackend().filter_queryset(request, self.get_queryset(), self)
+        if connection.vendor == 'postgresql':
+            query = SearchQuery(text, config='simple', search_type='websearch')
+            queryset = queryset.filter(search_vector=query).annotate(
+                rank=SearchRank(F('search_vector'), query)
+            ).order_by('-rank', '-timestamp')
+        else:
+            queryset = queryset.filter(
+                Q(object_repr__icontains=text) | Q(changes__icontains=text) | Q(user_agent__icontains=text)
+            ).order_by('-timestamp')
+
+        values_serializer = self.values_serializer_class(context=self.get_serializer_context())
+        queryset = values_serializer.get_queryset(queryset)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(values_serializer.to_representation(page))
+        return Response(values_serializer.to_representation(queryset))
+
+    @action(detail=False, methods=['get'], permission_classes=[IsSuperAdmin])
+    def archived(self, request):
+        """
+        Search audit entries archived by archive_audit_logs without restoring them.
+        Without ?month=YYYY-MM lists the archived months.
+        """
+        month = request.query_params.get('month')
+        if not month:
+            return Response({'months': list_archived_months()})
+        if not re.fullmatch(r'\d{4}-\d{2}', month):
+            return Response({'error': 'month must be in YYYY-MM format'}, status=status.HTTP_400_BAD_REQUEST)
+
+        page_size = self.paginator.get_page_size(request)
+        try:
+            page_number = int(request.query_params.get(self.paginator.page_query_param, 1))
+        except ValueError:
+            page_number = 0
+        if page_number < 1:
+            return Response({'error': 'page must be a positive integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Archives are read as a stream in file order (oldest first) and only the
+        # requested page is kept, so there is no total count
+        params = request.query_params
+        entries = iter_archived_entries(
+            month,
+            empresa=params.get('empresa'),
+            user=params.get('user'),
+            action=params.get('action'),
+            content_type=params.get('content_type'),
+            object_id=params.get('object_id'),
+            search=params.get('search'),
+        )
+        offset = (page_number - 1) * page_size
+        page = list(islice(entries, offset, offset + page_size + 1))
+        url = request.build_absolute_uri()
+        return Response({
+            'next': replace_query_param(url, self.paginator.page_query_param, page_number + 1)
+            if len(page) > page_size else None,
+            'previous': replace_query_param(url, self.paginator.page_query_param, page_number - 1)
+            if page_number > 1 else None,
+            'results': page[:page_size],
+        })
+
+class BulkJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Status and progress of the background bulk jobs of the user's empresa"""
+    serializer_class = BulkJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['status', 'operation']
+
+    def get_queryset(self):
+        queryset = BulkJob.objects.select_related('creado_por').defer('object_ids')
+        user = self.request.user
+        if user.is_super_admin:
+            return queryset
+        elif user.empresa_id:
+            return queryset.filter(Q(empresa_id=user.empresa_id) | Q(creado_por=user))
+        return queryset.filter(creado_por=user)
 
 class SystemSettingViewSet(viewsets.ModelViewSet):
     queryset = SystemSetting.objects.all()
@@ -314,4 +918,49 @@ class SystemSettingViewSet(viewsets.ModelViewSet):
             content_object=serializer.instance,
             ip_address=get_client_ip(self.request),
             user_agent=self.request.META.get('HTTP_USER_AGENT', '')
-        )
\ No newline at end of file
+        )
+
+class DashboardView(APIView):
+    """
+    Everything the frontend needs on first paint in one round-trip.
+
+    The independent queries run in parallel on separate connections, so the
+    response costs the latency of the slowest query instead of their sum.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    recent_limit = 10
+
+    def get(self, request):
+        user = request.user
+        dominios = Dominio.objects.all()
+        records = DNSRecord.objects.all()
+        audit_logs = AuditLog.objects.all()
+        if not user.is_super_admin:
+            if user.empresa_id is None:
+                dominios, records, audit_logs = dominios.none(), records.none(), audit_logs.none()
+            else:
+                dominios = dominios.filter(empresa_id=user.empresa_id)
+                records = records.filter(dominio__empresa_id=user.empresa_id)
+                audit_logs = audit_logs.filter(empresa_id=user.empresa_id)
+
+        # No request context: ?fields= applies to the dashboard, not to its nested lists
+        record_serializer = DNSRecordValuesSerializer()
+        audit_serializer = AuditLogValuesSerializer()
+        failing_records = records.filter(estado__in=['invalid', 'error']).order_by('-ultima_comprobacion')
+        recent_audit_logs = audit_logs.order_by('-timestamp')
+
+        results = run_in_parallel({
+            'stats': lambda: get_domain_stats(dominios),
+            'health': lambda: get_health_distribution(dominios),
+            'failing_records': lambda: record_serializer.to_representation(
+                record_serializer.get_queryset(failing_records)[:self.recent_limit]
+            ),
+            'recent_activity': lambda: audit_serializer.to_representation(
+                audit_serializer.get_queryset(recent_audit_logs)[:self.recent_limit]
+            ),
+        })
+
+        return Response({
+            'user': UserProfileSerializer(user).data,
+            **results,
+        })
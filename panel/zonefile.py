@@ -0,0 +1,265 @@
+"""
+BIND zone file (RFC 1035 master file) import and export for a domain.
+
+Import runs dnspython's zone file reader over the uploaded file, but instead of
+building a zone in memory every parsed record is mapped to a DNSRecord dict,
+validated and written through the bulk path (panel.bulk) in chunks of
+DNS_BULK_BATCH_SIZE, all in one transaction. Memory is bounded by a chunk plus the
+(tipo, nombre) keys of the domain.
+
+The panel keeps one record per (dominio, tipo, nombre), so only the first record of
+an RRset with several values is imported; the rest are reported as duplicates.
+Record types the panel does not manage (SOA, NS, SRV, ...) are skipped and counted.
+
+The reader is driven through dnspython internals (the Reader class, the
+transaction it writes to, the tokenizer's entry hooks), which change between
+minor releases, so importing this module fails on dnspython versions it was not
+written against.
+"""
+import dns.exception
+import dns.name
+import dns.rdataclass
+import dns.rdatatype
+import dns.rdtypes.ANY.TXT
+import dns.tokenizer
+import dns.version
+import dns.zonefile
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+from .bulk import bulk_upsert_dns_records, get_existing_records
+from .models import Dominio, DNSRecord
+from .serializers import BulkDNSRecordSerializer
+from .utils import _buffered
+
+# Errors reported before the import gives up
+MAX_IMPORT_ERRORS = 100
+
+TXT_TYPES = ('TXT', 'SPF', 'DKIM', 'DMARC')
+
+# dnspython (major, minor) releases whose zone file reader internals match the
+# _EntryTokenizer and _RecordSink shims below
+SUPPORTED_DNSPYTHON = {(2, 4)}
+
+
+def check_dnspython_version(version=dns.version.version):
+    if tuple(int(part) for part in version.split('.')[:2]) not in SUPPORTED_DNSPYTHON:
+        supported = ', '.join(f'{major}.{minor}.x' for major, minor in sorted(SUPPORTED_DNSPYTHON))
+        raise ImproperlyConfigured(
+            f"panel.zonefile drives dnspython zone file reader internals and supports dnspython "
+            f"{supported}, not {version}. Install the version pinned in requirements.txt."
+        )
+
+
+check_dnspython_version()
+
+
+class ZoneImportError(Exception):
+    """Invalid zone file, with the errors found as [{'line', 'error'}, ...]"""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} errors in zone file")
+        self.errors = errors
+
+
+class _EntryTokenizer(dns.tokenizer.Tokenizer):
+    """
+    Tokenizer that remembers the line the current zone file entry starts on. The
+    reader asks for each entry's first token with want_leading and want_comment,
+    and only reports the record once its last line is consumed.
+    """
+    entry_line = 1
+
+    def get(self, want_leading=False, want_comment=False):
+        token = super().get(want_leading, want_comment)
+        if want_leading and want_comment:
+            self.entry_line = self.line_number
+        return token
+
+
+class _RecordSink:
+    """
+    Stands in for the dnspython transaction the zone file reader writes to:
+    each record is handed to ``callback`` instead of being stored in a zone.
+    """
+
+    def __init__(self, origin, callback):
+        self.origin = origin
+        self.callback = callback
+        # The reader reads the origin from txn.manager
+        self.manager = self
+
+    def origin_information(self):
+        return self.origin, False, self.origin
+
+    def check_put_rdataset(self, check):
+        pass
+
+    def _set_origin(self, origin):
+        pass
+
+    def add(self, name, ttl, rdata):
+        self.callback(name, ttl, rdata)
+
+
+def _txt_value(rdata):
+    return b''.join(rdata.strings).decode()
+
+
+def _tag_value(value, tag):
+    """Value of ``tag`` in a 'k=v; k=v' TXT record (DMARC, DKIM)"""
+    for part in value.split(';'):
+        key, _, tag_value = part.strip().partition('=')
+        if key.strip().lower() == tag:
+            return tag_value.strip()
+    return None
+
+
+def rdata_to_record(nombre, ttl, rdata):
+    """DNSRecord field dict for a parsed record, or None when its type is not managed"""
+    rdtype = rdata.rdtype
+    record = {'nombre': nombre, 'ttl': ttl}
+
+    if rdtype in (dns.rdatatype.A, dns.rdatatype.AAAA):
+        record.update(tipo=dns.rdatatype.to_text(rdtype), valor=rdata.address)
+    elif rdtype == dns.rdatatype.CNAME:
+        record.update(tipo='CNAME', valor=rdata.target.to_text())
+    elif rdtype == dns.rdatatype.MX:
+        record.update(tipo='MX', valor=rdata.exchange.to_text(), prioridad=rdata.preference)
+    elif rdtype in (dns.rdatatype.TXT, dns.rdatatype.SPF):
+        valor = _txt_value(rdata)
+        labels = nombre.split('.')
+        if rdtype == dns.rdatatype.SPF or valor.lower().startswith('v=spf1'):
+            record.update(tipo='SPF', valor=valor)
+        elif labels[0] == '_dmarc':
+            record.update(tipo='DMARC', valor=valor, policy=_tag_value(valor, 'p'))
+        elif len(labels) > 1 and labels[1] == '_domainkey':
+            record.update(tipo='DKIM', valor=valor, selector=labels[0])
+        else:
+            record.update(tipo='TXT', valor=valor)
+    else:
+        return None
+    return record
+
+
+def import_zone(dominio, zone_file, user=None, on_conflict='fail', batch_size=None):
+    """
+    Import the records of ``zone_file`` (a text file object) into ``dominio``.
+
+    Records are written in one transaction: if the file has syntax or validation
+    errors, or on_conflict='fail' meets an existing record, ZoneImportError or
+    BulkConflictError is raised and nothing is written.
+    Returns a summary dict of counts.
+    """
+    batch_size = batch_size or settings.DNS_BULK_BATCH_SIZE
+    origin = dns.name.from_text(dominio.nombre)
+    summary = {'created': 0, 'updated': 0, 'skipped': 0, 'duplicates': 0, 'unsupported': {}}
+    errors = []
+    seen = set()
+    chunk = []  # (line, record)
+
+    def flush():
+        serializer = BulkDNSRecordSerializer(data=[record for _, record in chunk], many=True)
+        if not serializer.is_valid():
+            for (line, _), record_errors in zip(chunk, serializer.errors):
+                if record_errors:
+                    errors.append({'line': line, 'error': record_errors})
+        elif not errors:
+            created, updated, skipped = bulk_upsert_dns_records(
+                dominio, serializer.validated_data, user=user, on_conflict=on_conflict,
+                batch_size=batch_size, existing=existing
+            )
+            summary['created'] += len(created)
+            summary['updated'] += len(updated)
+            summary['skipped'] += skipped
+        chunk.clear()
+        if len(errors) >= MAX_IMPORT_ERRORS:
+            raise ZoneImportError(errors[:MAX_IMPORT_ERRORS])
+
+    def add(name, ttl, rdata):
+        nombre = name.relativize(origin).to_text()
+        try:
+            record = rdata_to_record(nombre, ttl, rdata)
+        except UnicodeDecodeError:
+            errors.append({'line': tokenizer.entry_line, 'error': "TXT record is not valid UTF-8"})
+            return
+        if record is None:
+            rdtype = dns.rdatatype.to_text(rdata.rdtype)
+            summary['unsupported'][rdtype] = summary['unsupported'].get(rdtype, 0) + 1
+            return
+
+        key = (record['tipo'], nombre)
+        if key in seen:
+            summary['duplicates'] += 1
+            return
+        if len(seen) >= settings.DNS_ZONE_MAX_RECORDS:
+            raise ZoneImportError([{
+                'line': tokenizer.entry_line,
+                'error': f"More than {settings.DNS_ZONE_MAX_RECORDS} records"
+            }])
+        seen.add(key)
+
+        chunk.append((tokenizer.entry_line, record))
+        if len(chunk) >= batch_size:
+            flush()
+
+    tokenizer = _EntryTokenizer(zone_file, '<zone>')
+    reader = dns.zonefile.Reader(
+        tokenizer, dns.rdataclass.IN, _RecordSink(origin, add),
+        allow_directives={'$ORIGIN', '$TTL'},
+        default_ttl=DNSRecord._meta.get_field('ttl').default
+    )
+
+    with transaction.atomic():
+        # Serializes concurrent bulk writes to the same domain
+        Dominio.objects.select_for_update().filter(pk=dominio.pk).exists()
+        existing = get_existing_records(dominio)
+
+        try:
+            reader.read()
+        except dns.exception.SyntaxError as exc:
+            errors.append({'line': tokenizer.entry_line, 'error': str(exc).split(': ', 2)[-1]})
+            raise ZoneImportError(errors[:MAX_IMPORT_ERRORS])
+        if chunk:
+            flush()
+        if errors:
+            raise ZoneImportError(errors)
+
+    return summary
+
+
+def _fqdn(value):
+    return value if value.endswith('.') else f'{value}.'
+
+
+def _rdata_text(tipo, valor, prioridad):
+    if tipo in TXT_TYPES:
+        data = valor.encode()
+        strings = [data[i:i + 255] for i in range(0, len(data), 255)] or [b'']
+        return dns.rdtypes.ANY.TXT.TXT(dns.rdataclass.IN, dns.rdatatype.TXT, strings).to_text()
+    if tipo == 'MX':
+        return f'{prioridad or 0} {_fqdn(valor)}'
+    if tipo == 'CNAME':
+        return _fqdn(valor)
+    return valor
+
+
+def export_zone(dominio, chunk_size=2000):
+    """
+    Stream the records of ``dominio`` as a zone file (bytes), reading them from the
+    database in chunks. SPF, DKIM and DMARC records are written as TXT.
+    """
+    def lines():
+        yield f'$ORIGIN {_fqdn(dominio.nombre)}\n'.encode()
+        rows = (
+            DNSRecord.objects.filter(dominio=dominio)
+            .order_by('nombre', 'tipo')
+            .values_list('nombre', 'tipo', 'valor', 'ttl', 'prioridad')
+            .iterator(chunk_size=chunk_size)
+        )
+        for nombre, tipo, valor, ttl, prioridad in rows:
+            rdtype = 'TXT' if tipo in TXT_TYPES else tipo
+            yield f'{nombre or "@"}\t{ttl}\tIN\t{rdtype}\t{_rdata_text(tipo, valor, prioridad)}\n'.encode()
+
+    return _buffered(lines())